@@ -17,9 +17,13 @@
 #
 
 from .           import draw    # so that draw can be made accessible as 'from pytoon import draw'
+from .           import encoders    # frame-sequence animations (see entity.frames)
 from .util       import struct, colordef, color_wheel, linestyle, fillstyle
-from .transforms import uniform_transform, positional_transform, translate, rotate, scale, zoom, stretch, parametric
+from .transforms import uniform_transform, affine_transform, positional_transform, translate, rotate, scale, zoom, stretch, parametric
 from .composite  import composite
-from .line_art   import line, path, polygon, circle
+from .line_art   import line, path, polygon, circle, bitmap
 from .animation  import animated
+from .profiling  import profiler
+from .caching    import fragment_cache
+from .renderers  import conversion_batch    # pdf conversions deferred and run together (see renderers/jpg_pdf.py)
 from .library    import rasterize
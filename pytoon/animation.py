@@ -25,9 +25,10 @@ class animated(object):
         self._Dt          = Dt
         self._clock       = _clock
         self._postprocess = _postprocess
+        self._plan        = util.substitution_plan(f)
     def __call__(self, _t_):
         varval = util.variable_evaluator({"_t_": self._clock(_t_)})    # will fail if clock has not been installed (by wrapper below)
-        value = varval(self._f)
+        value = self._plan(varval)
         if self._postprocess:  value = self._postprocess(value)
         return value
     def n_intervals(self, ta, tz, n_min=0):
@@ -43,7 +44,9 @@ def wrapper(obj, *, clock=None, postprocess=None):
     if isinstance(obj, animated):
         if not clock:        clock       = obj._clock
         if not postprocess:  postprocess = obj._postprocess
-        return animated(obj._f, Dt=obj._Dt, _clock=clock, _postprocess=postprocess)
+        wrapped = animated(obj._f, Dt=obj._Dt, _clock=clock, _postprocess=postprocess)
+        wrapped._plan = obj._plan    # same function, so same plan
+        return wrapped
     else:
         return animated(obj, Dt=None, _clock=clock, _postprocess=postprocess)
 
@@ -16,11 +16,47 @@
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import os
+import multiprocessing
 from . import util
 from . import draw
+from . import encoders
 from . import transforms
+from . import caching
 from . import animation
 from .renderers import parse_svg_animation_controls    # this likely does not belong here.  see note above where it is used
+from .renderers import svg_document_output
+
+
+
+# Frames of global-frame animations can be rendered in worker processes.  Entities hold closures, so they cannot be pickled,
+# but forked workers inherit the entity to be drawn through this module-level variable (only times and svg code are passed).
+
+_frame_job = None
+
+def _render_frame(t):
+    entity, grayscale, aux_dir, encoding, viewport, simplify, cache, profile = _frame_job
+    return entity.svg_raw(time=t, grayscale=grayscale, aux_dir=aux_dir, encoding=encoding, viewport=viewport, simplify=simplify, cache=cache, profile=profile)
+
+def _render_frames(entity, times, grayscale, aux_dir, workers, encoding, viewport, simplify, cache, profile):
+    global _frame_job
+    _frame_job = entity, grayscale, aux_dir, encoding, viewport, simplify, cache, profile
+    try:
+        if (workers is None) or (workers<=1) or ("fork" not in multiprocessing.get_all_start_methods()):
+            return [_render_frame(t) for t in times]    # same result, just serially
+        else:
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                return pool.map(_render_frame, times)    # results come back in order
+    finally:
+        _frame_job = None
+
+
+
+def _time_key(time):
+    # a hashable version of a time point or interval
+    try:
+        return tuple(time)
+    except TypeError:
+        return time
 
 
 
@@ -37,6 +73,7 @@ class entity(object):
     """ provides the copy-call method, resolves transformations and variable substitutions, and manages interaction with the concrete drawing layer """
     def __init__(self, substitutions, varval, transform, clock, **kwargs):
         self._parameters = kwargs                                                           # parameters that are specific to the derived entity
+        self._plan       = util.substitution_plan(kwargs, fixed=True)                       # replays the resolution of the parameters for a given varval
         self._clock      = util.echo if (clock is None) else clock                          # maps global time to local time
         self._transform  = transforms.no_transform if (transform is None) else transform    # maps internal coordinates to absolute page coordinates (can be nested)
         if (len(substitutions)==0) and (varval is None):                                    # returns substitutions of variables (can be nested)
@@ -47,6 +84,7 @@ class entity(object):
             self._varval = util.variable_evaluator(substitutions)
         else:
             self._varval = util.variable_evaluator(substitutions, inner=varval)
+        self._digest, self._context_digest = None, None                                     # see _fingerprint
     def __call__(self, **kwargs):
         special = ("varval", "transform", "clock")
         new_parameters = dict(self._parameters)    # shallow copy of dict (stores references to original parameter objects)
@@ -67,14 +105,62 @@ class entity(object):
         clock = self._clock
         if "clock" in kwargs and kwargs["clock"] is not None:
             clock = util.nested(outer=clock, inner=kwargs["clock"])
-        return type(self)(**new_parameters, varval=varval, transform=transform, clock=clock)    # return an object of the derived type initialized with modified parameters
-    def _resolve_parameters(self):
+        new = type(self)(**new_parameters, varval=varval, transform=transform, clock=clock)    # return an object of the derived type initialized with modified parameters
+        if all(new_parameters[k] is v for k,v in self._parameters.items()):
+            new._plan = self._plan    # parameters unchanged, so share the plans (one per varval chain) for resolving them
+        return new
+    def _in_context(self, context):
+        # The varval, transform and clock that self(varval=context.varval, transform=context.transform, clock=context.clock) would have,
+        # but without building that copy.  A composite hands its (resolved) context down to its children this way when drawing, instead
+        # of copy-calling each of them.  The nesting is skipped where one side is trivial, since it would not change the result.
+        if context is None:
+            return self._varval, self._transform, self._clock
+        if   self._varval is util.echo:    varval = context.varval
+        elif context.varval is util.echo:  varval = self._varval
+        else:                              varval = util.nested(outer=context.varval, inner=self._varval)
+        transform = context.transform if (self._transform is transforms.no_transform) else context.transform.nest(self._transform)
+        clock     = context.clock     if (self._clock is util.echo)                   else util.nested(outer=self._clock, inner=context.clock)
+        return varval, transform, clock
+    def _resolve_parameters(self, context=None):
         # called by _draw of child class to provide fully resolved parameters and transform (and "protected" from further attempts at resolution)
-        parameters = util.struct( **self._varval(self._parameters) )
-        clock = self._varval(self._clock)    # clock could have ._value_ defined but does not yet work as intended because clock usually nested
-        transform = self._transform.resolve(self._varval, clock)
+        return self._resolve(*self._in_context(context))
+    def _resolve(self, varval, transform, clock):
+        parameters = util.struct( **self._plan(varval) )
+        clock = varval(clock)    # clock could have ._value_ defined but does not yet work as intended because clock usually nested
+        transform = transform.resolve(varval, clock)
         anim_wrap = lambda obj: animation.wrapper(obj, clock=clock)
         return parameters, transform, clock, anim_wrap
+    def _fingerprint(self):
+        # a digest of everything that determines what this entity draws in a given context (see caching.py), computed once
+        if self._digest is None:
+            self._digest = caching.fingerprint((type(self), self._parameters, self._varval, self._transform, self._clock))
+        return self._digest
+    def _context_fingerprint(self):
+        # a digest of what this entity (a composite) adds to the context of its children
+        if self._context_digest is None:
+            self._context_digest = caching.fingerprint((self._varval, self._transform, self._clock))
+        return self._context_digest
+    def _draw_cached(self, time, canvas, aux_dir, context=None):
+        # The same as _draw, but if the canvas has a cache, the drawing commands are recorded, to be replayed instead the next
+        # time that this entity (or one with the same fingerprint) is drawn at the same time, in the same context, on a canvas
+        # with the same settings.  A context carries the fingerprint of the chain of composites it comes from, and those
+        # composites (see composite._draw).
+        if canvas.cache is None:  return self._draw(time, canvas, aux_dir, context)
+        chain, ancestors = (b"", ()) if (context is None) else (context.chain, context.ancestors)
+        key = canvas.settings, _time_key(time), chain, self._fingerprint()
+        cached = canvas.cache.get(key)
+        if cached is not None:
+            fragment, drawn = cached
+            canvas.replay(fragment)
+            return drawn
+        canvas.record()
+        drawn = self._draw(time, canvas, aux_dir, context)
+        canvas.cache.put(key, canvas.recorded(), drawn, keep=(self, ancestors))
+        return drawn
+    def _bounds(self, time, context=None):
+        # (xmin, ymin, xmax, ymax) on the page of everything drawn, over the sample times, or None if not known (for spatial.index) ...
+        # when the canvas has a viewport, _draw returns the same (or, for a composite, the spatial index of its children)
+        return None
     def S(self, factor):
         return self(transform=transforms.scale(factor))
     def R(self, angle):
@@ -89,57 +175,90 @@ class entity(object):
         else:
             if not duration:  raise RuntimeError("time interval given without specifying duration ... perhaps target format does not support animation")
         os.system("mkdir -p {}".format(aux_dir))
-        self._draw(time, canvas, aux_dir)
-        return canvas.finish()    # usually returns None
-    def py(self, filestem="pytoon_graphic", *, time=None, duration=None, background=None, grayscale=False, aux_dir=None):
+        with canvas.profile.entity(self):
+            self._draw_cached(time, canvas, aux_dir)
+            with canvas.profile.stage("write"):
+                return canvas.finish()    # usually returns None
+    def py(self, filestem="pytoon_graphic", *, time=None, duration=None, background=None, grayscale=False, aux_dir=None, cache=None, profile=None):
         return self._draw_it(
             duration   = duration,
             time       = time,
-            canvas     = draw.py(filestem, duration=duration, background=background, grayscale=grayscale),
+            canvas     = draw.py(filestem, duration=duration, background=background, grayscale=grayscale, cache=cache, profile=profile),
             aux_dir    = "{}_aux".format(filestem) if (aux_dir is None) else aux_dir
         )
-    def jpg(self, filestem="pytoon_graphic", *, time=None, dpi=150, background=None, grayscale=False, aux_dir=None):
+    def jpg(self, filestem="pytoon_graphic", *, time=None, dpi=150, quality=90, background=None, grayscale=False, aux_dir=None, viewport=None, simplify=None, cache=None, profile=None):
         return self._draw_it(
             duration   = None,
             time       = time,
-            canvas     = draw.jpg(filestem, dpi=dpi, background=background, grayscale=grayscale),
-            aux_dir    = "{}_aux".format(filestem) if (aux_dir is None) else aux_dir
+            canvas     = draw.jpg(filestem, dpi=dpi, quality=quality, background=background, grayscale=grayscale, viewport=viewport, simplify=simplify, cache=cache, profile=profile),
+            aux_dir    = "{}_aux".format(filestem or "pytoon_graphic") if (aux_dir is None) else aux_dir
         )
-    def pdf(self, filestem="pytoon_graphic", *, time=None, background=None, grayscale=False, aux_dir=None):
+    def png(self, filestem="pytoon_graphic", *, time=None, dpi=150, background=None, grayscale=False, aux_dir=None, viewport=None, simplify=None, cache=None, profile=None):
         return self._draw_it(
             duration   = None,
             time       = time,
-            canvas     = draw.pdf(filestem, background=background, grayscale=grayscale),
-            aux_dir    = "{}_aux".format(filestem) if (aux_dir is None) else aux_dir
+            canvas     = draw.png(filestem, dpi=dpi, background=background, grayscale=grayscale, viewport=viewport, simplify=simplify, cache=cache, profile=profile),
+            aux_dir    = "{}_aux".format(filestem or "pytoon_graphic") if (aux_dir is None) else aux_dir
+        )
+    def pdf(self, filestem="pytoon_graphic", *, time=None, background=None, grayscale=False, aux_dir=None, viewport=None, simplify=None, cache=None, profile=None):
+        return self._draw_it(
+            duration   = None,
+            time       = time,
+            canvas     = draw.pdf(filestem, background=background, grayscale=grayscale, viewport=viewport, simplify=simplify, cache=cache, profile=profile),
+            aux_dir    = "{}_aux".format(filestem or "pytoon_graphic") if (aux_dir is None) else aux_dir
         )
-    def svg_raw(self, *, time=None, duration=None, grayscale=False, aux_dir="pytoon_graphic_aux"):
+    def frames(self, *, time, fps, dpi=150, background=None, grayscale=False, aux_dir="pytoon_graphic_aux", viewport=None, simplify=None, cache=None, profile=None):
+        # a generator of RGBA arrays, rendered one at a time (as they are asked for), at fps frames per unit time
+        ta, tz = time
+        count = max(1, util.int_round((tz-ta)*fps))    # like global frames, the last time point is not rendered, for smooth looping
+        for i in range(count):
+            yield self._draw_it(
+                duration   = None,
+                time       = ta + i/fps,
+                canvas     = draw.pixels(dpi=dpi, background=background, grayscale=grayscale, viewport=viewport, simplify=simplify, cache=cache, profile=profile),
+                aux_dir    = aux_dir
+            )
+    def apng(self, filestem="pytoon_graphic", *, time, fps, loops=0, dpi=150, background=None, grayscale=False, aux_dir=None, viewport=None, simplify=None, cache=None, profile=None):
+        aux_dir = "{}_aux".format(filestem or "pytoon_graphic") if (aux_dir is None) else aux_dir
+        frames = self.frames(time=time, fps=fps, dpi=dpi, background=background, grayscale=grayscale, aux_dir=aux_dir, viewport=viewport, simplify=simplify, cache=cache, profile=profile)
+        return encoders.encode(frames, encoders.apng(filestem, fps=fps, loops=loops))
+    def gif(self, filestem="pytoon_graphic", *, time, fps, loops=0, dpi=150, background=None, grayscale=False, aux_dir=None, viewport=None, simplify=None, cache=None, profile=None):
+        aux_dir = "{}_aux".format(filestem or "pytoon_graphic") if (aux_dir is None) else aux_dir
+        frames = self.frames(time=time, fps=fps, dpi=dpi, background=background, grayscale=grayscale, aux_dir=aux_dir, viewport=viewport, simplify=simplify, cache=cache, profile=profile)
+        return encoders.encode(frames, encoders.gif(filestem, fps=fps, loops=loops))
+    def svg_raw(self, *, time=None, duration=None, grayscale=False, aux_dir="pytoon_graphic_aux", encoding=None, tolerance=None, viewport=None, simplify=None, cache=None, profile=None):
         return self._draw_it(    # returns image code as string and viewbox, respectively
             duration   = duration,
             time       = time,
-            canvas     = draw.svg_raw(duration=duration, grayscale=grayscale),
+            canvas     = draw.svg_raw(duration=duration, grayscale=grayscale, encoding=encoding, tolerance=tolerance, viewport=viewport, simplify=simplify, cache=cache, profile=profile),
             aux_dir    = aux_dir
         )
-    def svg(self, filestem="pytoon_graphic", *, title=None, time=None, duration=None, global_frames=None, controls=None, background=None, grayscale=False, aux_dir=None):
+    def svg(self, filestem="pytoon_graphic", *, title=None, time=None, duration=None, global_frames=None, controls=None, background=None, grayscale=False, aux_dir=None, stream=None, workers=None, encoding=None, compress=None, instances=False, tolerance=None, viewport=None, simplify=None, cache=None, profile=None):
         # The code inside the 'else' is still pretty dirty, might be misplaced, and might be deprecated altogether.
         # See the comments at the end of this file.
         if global_frames is None:
+            if workers is not None:
+                raise RuntimeError("worker processes are only used to render the frames of a global-frame animation")
             return self._draw_it(
                 duration   = duration,
                 time       = time,
-                canvas     = draw.svg(filestem, title=title, duration=duration, controls=controls, background=background, grayscale=grayscale),
-                aux_dir    = "{}_aux".format(filestem) if (aux_dir is None) else aux_dir
+                canvas     = draw.svg(filestem, title=title, duration=duration, controls=controls, background=background, grayscale=grayscale, stream=stream, encoding=encoding, compress=compress, instances=instances, tolerance=tolerance, viewport=viewport, simplify=simplify, cache=cache, profile=profile),
+                aux_dir    = "{}_aux".format(filestem or "pytoon_graphic") if (aux_dir is None) else aux_dir
             )
         else:
             if not duration:
                 raise RuntimeError("global-frame animation requested for non-animated image")
-            aux_dir = "{}_aux".format(filestem) if (aux_dir is None) else aux_dir
+            if (profile is not None) and (workers is not None) and (workers>1):
+                raise RuntimeError("profiling does not work across worker processes")    # each would record into its own copy of the profiler
+            aux_dir = "{}_aux".format(filestem or "pytoon_graphic") if (aux_dir is None) else aux_dir
+            output = svg_document_output(filestem, stream=stream, compress=compress)    # checks compress before the frames are rendered
             global_frames += 1    # because the last frame does not get rendered to give smooth looping behavior (make this adjustable?)
             ta, tz = time
             Dt = (tz-ta) / global_frames
+            frames = _render_frames(self, [ta + i*Dt for i in range(global_frames)], grayscale, aux_dir, workers, encoding, viewport, simplify, cache, profile)
             frames_code = ""
             for i in range(global_frames):
-                t = ta + i*Dt
-                image, viewbox = self.svg_raw(time=t, grayscale=grayscale, aux_dir=aux_dir)
+                image, viewbox = frames[i]
                 frames_code += util.svg_code.frame(image_code=image, duration=duration, index=i, count=global_frames)
                 if i!=0:
                     if viewbox!=previous_viewbox:  raise RuntimeError("for now, all the frame viewboxes need to be the same (easy to fix!!)")
@@ -153,16 +272,16 @@ class entity(object):
                     image    = frames_code,
                     controls = util.svg_code.animation_controls(duration=duration, control_location=location)
                 )
-            open(filestem+".svg", "w").write(
-                util.svg_code.file_format(
-                    background      = background,
-                    viewbox         = viewbox,
-                    documentation   = util.svg_code.title_description(title=title, description=description),
-                    javascript      = util.js_code.script_in_svg(animate=util.struct(delta=step, controls=key_controls)),
-                    definitions     = util.svg_code.defintions(""),    # for now there is a bug here; fill effects not supported.  composite.svg_raw() will raise exception
-                    image_code      = frames_code
-                )
-            )    # file object immediately falls out of scope
+            document = util.svg_code.file_format(
+                background      = background,
+                viewbox         = viewbox,
+                documentation   = util.svg_code.title_description(title=title, description=description),
+                javascript      = util.js_code.script_in_svg(animate=util.struct(delta=step, controls=key_controls)),
+                definitions     = util.svg_code.defintions(""),    # for now there is a bug here; fill effects not supported.  composite.svg_raw() will raise exception
+                image_code      = frames_code
+            )
+            output.open().write(document)
+            return output.close()
 
 
 
@@ -176,6 +295,9 @@ class entity(object):
 # as we have done with the .pdf and .jpg "renderers".  Should I not even try to use .svg_raw and then just parse the .svg
 # files on disk, as I would for the others?
 #
+#   Update:  full-frame raster animations now exist in the form of entity.frames(), which yields frames one at a time, to be
+# consumed by the encoders in encoders.py (animated png or gif, or raw frames piped to an external video encoder, like ffmpeg).
+#
 #   Below, we have remnants of code from a different overall structure that would make avi or mp4 videos.
 #   The important thing to realize is that the line:
 #     framesPy,background,foreground = make_frames(filestem,func,count,None,ext=('jpg',dpi),texlabels=texlabels)
@@ -0,0 +1,97 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   This is not used by the drawing code.  It times the building and rendering of some parameterized scenes (see scenes.py),
+# so that the speed of different versions can be compared, and writes the results to a JSON file.  The rendering time is
+# broken down into the stages recorded by a profiler (see profiling.py), totaled over all entities, with "other" being
+# whatever is not covered (like the traversal itself, or the assembly of global-frame animations).  The points and
+# keyframes counted by the profiler are reported too.  Peak memory is measured in a separate pass (tracemalloc would
+# otherwise distort the timings), and the output size is the total size of the files written.
+#
+#   From the command line:  python -m pytoon.benchmarks [-o results.json] [-r repeat] [scene ...]
+#
+import os
+import json
+import time
+import platform
+import tempfile
+import tracemalloc
+import numpy
+from ..profiling import profiler
+from .scenes import scenes
+
+
+
+_stages = ("resolve", "wrap", "sample", "index", "validate", "simplify", "reduce", "codegen", "write")
+
+def _timed_render(render, entity, filestem):
+    profile = profiler()
+    start = time.perf_counter()
+    render(entity, filestem, profile)
+    total = time.perf_counter() - start
+    times, counts = profile.totals()
+    times = {stage: times.get(stage, 0.) for stage in _stages}
+    times["other"] = total - sum(times.values())
+    return total, times, counts
+
+def _output_bytes(directory):
+    return sum(os.path.getsize(os.path.join(path, name)) for path,_,names in os.walk(directory) for name in names)
+
+
+
+def measure(name, *, repeat=1, memory=True, **params):
+    """ builds and renders the named scene (repeat times, keeping the fastest run), returning a dict of the timings, peak memory and output size """
+    build = scenes[name]
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            entity, render = build(**params)
+            built = time.perf_counter() - start
+            total, stages, counts = _timed_render(render, entity, os.path.join(directory, name))
+            runs += [(built+total, dict(build=built, **stages), counts, _output_bytes(directory))]
+    total, stages, counts, output_bytes = min(runs, key=lambda run: run[0])
+    peak = None
+    if memory:
+        with tempfile.TemporaryDirectory() as directory:
+            tracemalloc.start()
+            try:
+                entity, render = build(**params)
+                render(entity, os.path.join(directory, name), None)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+    return dict(params=params, total=total, stages=stages, counts=counts, peak_memory=peak, output_bytes=output_bytes)
+
+def run(names=None, *, output="pytoon_benchmarks.json", repeat=1, memory=True, label=None, params=None):
+    """ measures the named scenes (all by default), with optional parameters given per scene as {name: {param: value}}, and writes the results as JSON to output (if not None); returns the results """
+    names  = list(scenes) if (names is None) else names
+    params = {} if (params is None) else params
+    results = dict(
+        label    = label,    # for the caller to identify the version being tested
+        date     = time.strftime("%Y-%m-%dT%H:%M:%S"),
+        python   = platform.python_version(),
+        numpy    = numpy.__version__,
+        platform = platform.platform(),
+        scenes   = {name: measure(name, repeat=repeat, memory=memory, **params.get(name, {})) for name in names}
+    )
+    if output is not None:
+        with open(output, "w") as stream:
+            json.dump(results, stream, indent=2)
+    return results
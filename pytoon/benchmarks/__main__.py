@@ -0,0 +1,34 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import argparse
+from . import run, scenes
+
+parser = argparse.ArgumentParser(prog="python -m pytoon.benchmarks", description="times the building and rendering of some pytoon scenes")
+parser.add_argument("scenes", nargs="*", metavar="scene", help="any of: {} (default is all)".format(", ".join(scenes)))
+parser.add_argument("-o", "--output", default="pytoon_benchmarks.json", help="JSON file for the results")
+parser.add_argument("-r", "--repeat", type=int, default=1, help="number of runs per scene (the fastest is kept)")
+parser.add_argument("-l", "--label", default=None, help="to identify the version being tested")
+parser.add_argument("--no-memory", action="store_true", help="skip the (slower) pass that measures peak memory")
+arguments = parser.parse_args()
+unknown = [name for name in arguments.scenes if name not in scenes]
+if unknown:  parser.error("unknown scene(s): {}".format(", ".join(unknown)))
+
+results = run(arguments.scenes or None, output=arguments.output, repeat=arguments.repeat, memory=not arguments.no_memory, label=arguments.label)
+for name,result in results["scenes"].items():
+    stages = "  ".join("{} {:.3f}".format(stage, seconds) for stage,seconds in result["stages"].items())
+    print("{:14s} {:8.3f}s   {}".format(name, result["total"], stages))
@@ -0,0 +1,122 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Each scene is a function of its (keyword) parameters that builds an entity and returns it, along with a function
+# that renders it, given a filestem and a profiler.  Building is timed separately from rendering, so the work of
+# constructing the entities should happen in the scene function itself, and not be deferred to the renderer.
+#
+from math import pi, sin, cos, tan, atan, sqrt, modf
+import random
+from ..util       import int_round
+from ..composite  import composite
+from ..line_art   import circle, polygon, path
+from ..transforms import positional_transform, rotate
+from ..animation  import animated
+from ..library    import rasterize
+
+
+
+def water_wave(*, X=600, Y=200, d=15, T=3, seed=0, encoding=None, tolerance=None):
+    """ the water-wave sample from docs/samples (many animated molecules under a positional transform) """
+    rand = random.Random(seed)
+    def modf_min(x):
+        f, i = modf(x)
+        if   f<-0.5:  return f+1, i-1
+        elif f>=0.5:  return f-1, i+1
+        else:         return f, i
+    def distort(L, T, t):
+        A = 0.1
+        def f(p):
+            x, y = p
+            xP = x/L - t/T
+            y = y * (1 - A*cos(2*pi*xP))
+            xPf, xPi = modf_min(xP)
+            xP = xPi + atan(sqrt((1+A)/(1-A)) * tan(pi*xPf)) / pi
+            x = L * (xP + t/T)
+            return x,y
+        return f, 1
+    Nx, Ny = int_round(X/d), int_round(Y/d)
+    positions = [(i*X/Nx + rand.uniform(-0.35,0.35)*d, j*Y/Ny + rand.uniform(-0.35,0.35)*d) for i in range(Nx+1) for j in range(Ny+1)]
+    special = ((Nx+1)*(Ny+1))//2 - (Ny+1)//4 - 1
+    block     = polygon(lstyle=False, fstyle="#202020")
+    molecule  = circle(radius=4, lstyle=("black",0.25), fstyle="#3bba9c")
+    molecules = [molecule(center=(x,y)) for x,y in positions]
+    surface   = [(i*X/125,Y*1.05) for i in range(125+1)]
+    wavy = [i*X/125 for i in range(63)]
+    wavy = [(x,10) for x in wavy] + [(x,-10) for x in reversed(wavy)]
+    wavy = polygon(points=wavy, lstyle=("black",0.25), fstyle="green").S(0.40).R(60).T(0,-15)
+    image = composite([
+        composite([
+            polygon(points=[(0,-20),*surface,(X,-20)], lstyle=False, fstyle="#233142"),
+            *molecules,
+            wavy.S(1).T(60,0), wavy.S(1.1).T(150,0), wavy.S(1.2).T(195,0), wavy.S(0.7).T(300,0), wavy.S(1.5).T(470,0), wavy.S(1).T(510,0), wavy.S(0.8).T(530,0)
+        ], transform=positional_transform(distort, L=X/2, T="T", t="_t_").animated(Dt=0.1)),
+        molecules[special](radius=2, fstyle="red"),
+        block(points=[(-10,20),(-10,-15),(X+10,-15),(X+10,20)], fstyle="brown").T(0,-30),
+        block(points=[(-15,-46),(-15,Y*1.5),(20,Y*1.5),(20,-46)]),
+        block(points=[(X-20,-46),(X-20,Y*1.5),(X+15,Y*1.5),(X+15,-46)])
+    ])(T=T)
+    return image, lambda entity, filestem, profile: entity.svg(filestem, time=(0,T), duration=T, background="#202020", controls=False, encoding=encoding, tolerance=tolerance, profile=profile)
+
+def raster_grid(*, N=20, T=2, Dt=0.25, bitmap=False):
+    """ an animated color field drawn by the rasterize library function (as overlapping polygons, or as a bitmap) """
+    def rgba_Dt(x, y):
+        def rgba(t):
+            b = 0.5 + 0.5*cos(2*pi*(t/T + x*y))
+            return "#{0:02X}{0:02X}FF".format(int_round(255*b)), 0.5 + 0.5*b
+        return rgba, Dt
+    image = rasterize(rgba_Dt, xdim=(-1,1,N), ydim=(-1,1,N), bitmap=bitmap)
+    return image, lambda entity, filestem, profile: entity.svg(filestem, time=(0,T), duration=T, profile=profile)
+
+def nested(*, depth=10, breadth=2, T=None):
+    """ composites nested depth deep, each holding breadth transformed copies of the one below (breadth**depth circles), optionally spinning """
+    image = circle(radius=10, lstyle=("black",1), fstyle="salmon")
+    for level in range(depth):
+        if T is not None:  image = image(transform=rotate(rad=lambda _t_: 2*pi*_t_/T).animated(Dt=T/8))
+        image = composite([image.T(30*k, 5*level) for k in range(breadth)])
+    if T is None:
+        return image, lambda entity, filestem, profile: entity.svg(filestem, profile=profile)
+    else:
+        return image, lambda entity, filestem, profile: entity.svg(filestem, time=(0,T), duration=T, profile=profile)
+
+def animated_path(*, points=400, T=4, Dt=0.02, tolerance=None):
+    """ a single long path whose points all move (T/Dt keyframes of the full point list) """
+    def wave(_t_):
+        return [(i, 50*sin(2*pi*(i/100 - _t_/T))) for i in range(points)]
+    image = path(points=animated(wave, Dt=Dt), lstyle=("navy",2))
+    return image, lambda entity, filestem, profile: entity.svg(filestem, time=(0,T), duration=T, tolerance=tolerance, profile=profile)
+
+def global_frames(*, frames=24, count=50, T=2, workers=None):
+    """ a ring of count circles orbiting, rendered as a sequence of full frames (global-frame svg animation) """
+    ring = composite([circle(center=(100*cos(2*pi*k/count), 100*sin(2*pi*k/count)), radius=8, fstyle="#3bba9c") for k in range(count)])
+    backdrop = polygon(points=[(-120,-120),(120,-120),(120,120),(-120,120)], lstyle=False, fstyle="#202020")    # keeps the viewbox the same for all frames
+    image = composite([backdrop, ring(transform=rotate(rad=lambda _t_: 2*pi*_t_/T).animated(Dt=T/frames))])
+    return image, lambda entity, filestem, profile: entity.svg(filestem, time=(0,T), duration=T, global_frames=frames, controls=False, workers=workers, profile=None if (workers or 0)>1 else profile)    # stages are not recorded by worker processes
+
+
+
+# names are as used to select scenes from the command line (python -m pytoon.benchmarks)
+scenes = {
+    "water-wave":    water_wave,
+    "raster-grid":   raster_grid,
+    "raster-bitmap": lambda **params: raster_grid(**dict({"bitmap":True}, **params)),
+    "nested":        nested,
+    "animated-path": animated_path,
+    "global-frames": global_frames,
+}
@@ -0,0 +1,125 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   A fragment cache can be handed to the output methods of an entity (eg, image.svg(cache=c)), and it then keeps what each
+# entity drew, so that rendering a scene again after editing part of it only redraws what changed.  What is kept is not the
+# image code, since that depends on what was drawn before it (eg, svg class names are numbered in order of first use, and the
+# rounding of the encodings depends on the size of the image so far), but the drawing commands as they were passed on to the
+# renderer (after validation, simplification and keyframe reduction), which are replayed (see draw._canvas.record), so the
+# output is the same as without a cache.  Along with them is kept what _draw returned (bounds or spatial index).
+#   The entries are keyed by the settings of the canvas, the time and a fingerprint of the entity in its context, which is
+# a digest of its type, parameters, transform, clock and substitutions, and those of the composites it is drawn in.  Numbers,
+# strings, and lists, tuples and dicts of them go into it by value, as do the substitutions of a variable evaluator and the
+# parameters of affine transforms, and composites use the fingerprints of their children, so that a scene built again the
+# same way finds the entries of the old one, where the objects are shared or equal.  Anything else (eg, functions) goes in by
+# identity (the entries keep them alive, so that identities are not reused).  Like everything else, this relies on entities
+# not being modified in place.
+#   The entries that were used least recently are dropped when the total size goes over max_bytes.  That size is estimated
+# from the numbers held by each entry (the entry of a composite refers to those of its children, so it counts for little,
+# but it keeps them in memory for as long as it is held itself).
+#
+import hashlib
+import collections
+import numpy
+from . import util
+
+
+
+_values = (str, bytes, int, float, complex, bool, type(None), numpy.number)    # taken by value
+
+def _feed(digest, value):
+    # adds value to the digest (see fingerprint)
+    if not isinstance(value, type) and hasattr(value, "_fingerprint"):    # entities and transforms (memoized)
+        digest.update(b"F")
+        digest.update(value._fingerprint())
+    elif isinstance(value, (list, tuple)):
+        digest.update("{}{}(".format("L" if isinstance(value, list) else "T", len(value)).encode())
+        for v in value:  _feed(digest, v)
+        digest.update(b")")
+    elif isinstance(value, dict):
+        digest.update("D{}(".format(len(value)).encode())
+        for k,v in sorted(value.items(), key=lambda item: repr(item[0])):
+            _feed(digest, k)
+            _feed(digest, v)
+        digest.update(b")")
+    elif isinstance(value, _values):
+        digest.update("{}:{!r};".format(type(value).__name__, value).encode())
+    elif isinstance(value, type):
+        digest.update("C{}.{};".format(value.__module__, value.__qualname__).encode())
+    elif callable(value) and (getattr(value, "_chain_", None) is not None):    # variable evaluator, as its substitutions
+        digest.update(b"V")
+        _feed(digest, value._chain_)
+    else:
+        digest.update("#{};".format(id(value)).encode())
+
+def fingerprint(value):
+    """ returns a digest (bytes) of value, by value where that is simple, and by identity otherwise (see caching.py) """
+    digest = hashlib.blake2b(digest_size=16)
+    _feed(digest, value)
+    return digest.digest()
+
+
+
+def _size(fragment):
+    # rough size in bytes of the drawing commands of a fragment, not counting those of nested fragments
+    def size(value):
+        if isinstance(value, numpy.ndarray):        return value.nbytes
+        if isinstance(value, (list, tuple)):        return 8*len(value) + sum(size(v) for v in value)
+        if isinstance(value, (str, bytes)):         return len(value)
+        if isinstance(value, (int, float, type(None))):  return 8
+        try:
+            return size(list(util.as_dict(value).values()))    # styles
+        except Exception:
+            return 8
+    return sum(8 if isinstance(item, list) else size(item[1]) for item in fragment)
+
+class fragment_cache(object):
+    """ keeps the drawing commands of entities (see caching.py) for re-rendering, dropping those used least recently beyond max_bytes """
+    def __init__(self, max_bytes=2**26):
+        self.max_bytes = util.valid_real_number((max_bytes, "fragment cache size"), (lambda x: x>=0, "non-negative"))
+        self.bytes     = 0    # current estimated size
+        self.hits      = 0
+        self.misses    = 0
+        self._entries  = collections.OrderedDict()    # least recently used first
+    def __len__(self):
+        return len(self._entries)
+    def clear(self):
+        """ drops all entries """
+        self._entries.clear()
+        self.bytes = 0
+    def get(self, key):
+        """ returns the fragment and the return value of _draw kept for key, or None if there is none """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        fragment, drawn, _, _ = entry
+        return fragment, drawn
+    def put(self, key, fragment, drawn, keep=()):
+        """ keeps the fragment and _draw return value for key, along with the objects in keep (which the key identifies in part) """
+        size = _size(fragment)
+        if size>self.max_bytes:  return
+        if key in self._entries:  self.bytes -= self._entries.pop(key)[2]
+        self._entries[key] = fragment, drawn, size, keep
+        self.bytes += size
+        while self.bytes>self.max_bytes:
+            _, (_, _, size, _) = self._entries.popitem(last=False)
+            self.bytes -= size
@@ -15,14 +15,71 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+from . import util
 from . import base
+from . import spatial
+from . import caching
 
 
 
 class composite(base.entity):
+    _cached_indices = 4    # spatial indices kept (per time point or interval), for reuse across renders
     def __init__(self, entities=[], *, varval=None, transform=None, clock=None, **kwargs):    # mutable type in signature ok b/c never modified in place
         base.entity.__init__(self, kwargs, varval, transform, clock, entities=list(entities))
-    def _draw(self, time, canvas, aux_dir):
-        parameters, transform, clock, _ = self._resolve_parameters()
-        for entity in parameters.entities:
-            entity(varval=self._varval, transform=transform, clock=clock)._draw(time, canvas, aux_dir)
+        self._indices = {}    # spatial indices by time
+    def index(self, time=None):
+        """ returns a spatial.index over the (transformed) bounds of the children, at time (or over an interval), for region and point queries """
+        index = self._indices.get(base._time_key(time))    # possibly left by rendering with a viewport
+        if index is None:
+            index = self._spatial_index(time, None)
+            self._remember(time, index)
+        return index
+    def _remember(self, time, index):
+        if len(self._indices)>=self._cached_indices:  del self._indices[next(iter(self._indices))]    # oldest first
+        self._indices[base._time_key(time)] = index
+    def _spatial_index(self, time, context):
+        varval, transform, clock = self._in_context(context)
+        parameters, transform, clock, _ = self._resolve(varval, transform, clock)
+        context = util.struct(varval=varval, transform=transform, clock=clock, index=None, chain=None, ancestors=None)
+        subindices = [entity._spatial_index(time, context) if isinstance(entity, composite) else None for entity in parameters.entities]
+        boxes = [entity._bounds(time, context) if (subindex is None) else subindex.bounds for entity,subindex in zip(parameters.entities, subindices)]
+        return spatial.index(boxes, subindices)
+    def _bounds(self, time, context=None):
+        return self._spatial_index(time, context).bounds
+    def _draw(self, time, canvas, aux_dir, context=None):
+        # With a viewport, the children report their bounds (see line_art.py), which are kept as a spatial index (handed back
+        # to the parent, or remembered if this is the top level), and later renders at the same time only visit the children
+        # that the index says can meet the viewport.  With a cache, the contexts of the children also carry the fingerprint of
+        # the chain of composites that they are drawn in (see base.entity._draw_cached).
+        with canvas.profile.stage("resolve"):
+            varval, transform, clock = self._in_context(context)
+            parameters, transform, clock, _ = self._resolve(varval, transform, clock)
+            chain, ancestors = None, None
+            if canvas.cache is not None:
+                chain, ancestors = (b"", ()) if (context is None) else (context.chain, context.ancestors)
+                chain, ancestors = caching.fingerprint((chain, self._context_fingerprint())), ancestors + (self,)
+        inner = lambda index: util.struct(varval=varval, transform=transform, clock=clock, index=index, chain=chain, ancestors=ancestors)
+        entities = parameters.entities
+        if   canvas.viewport is None:  index = None
+        elif context is None:          index = self._indices.get(base._time_key(time))
+        else:                          index = context.index    # from the index of the parent (if it has one)
+        if index is not None:
+            with canvas.profile.stage("index"):
+                positions = index.region(*canvas.viewport)
+            for i in positions:
+                with canvas.profile.entity(entities[i]):
+                    entities[i]._draw_cached(time, canvas, aux_dir, inner(index.subindex(i)))
+            return index
+        top = (context is None)
+        context = inner(None)    # children are drawn in this context, rather than as copies made by calling them with it
+        drawn = []
+        for entity in entities:
+            with canvas.profile.entity(entity):
+                drawn += [entity._draw_cached(time, canvas, aux_dir, context)]
+        if canvas.viewport is None:  return None
+        with canvas.profile.stage("index"):
+            subindices = [d if isinstance(entity, composite) else None for entity,d in zip(entities, drawn)]
+            boxes = [d if (subindex is None) else subindex.bounds for d,subindex in zip(drawn, subindices)]
+            index = spatial.index(boxes, subindices)
+        if top:  self._remember(time, index)
+        return index
@@ -27,6 +27,7 @@
 import os
 from . import util
 from . import renderers
+from . import profiling
 
 
 
@@ -38,6 +39,24 @@ from . import renderers
 #   These allow for grayscale option to be given at a low level (globally) to mimic printer that
 # physically cannot do color, in spite of whatever way a user might try to get around it.  Of course,
 # partially grayscaled images can be created at a higher level using the grayscaling primitives.
+#   For animated svg output, a tolerance (in the units of the page) may be given, in which case keyframes that linear
+# interpolation between their neighbors would reproduce to within that distance are dropped (0 drops only those that are
+# redundant at the precision of the output), unless so few would be dropped from evenly spaced ones that writing out the
+# times of the rest costs more.  The svg renderer then also replaces runs of the remaining keyframes by spline easing
+# between fewer of them where that is shorter, each pass using half the tolerance.  By default (None), all are kept.
+#   The svg output can be made smaller with an encoding:  "compact" or "print" round lengths to 1e-4 or 1e-5 of the size
+# of the image, and "exact" writes them losslessly, all with terser path data (see renderers/svg.py).  With instances=True,
+# static paths whose geometry repeats are drawn as uses of shared definitions (see renderer_base._instance in the same file).
+#   A viewport (xmin, ymin, xmax, ymax), in the units of the page, fixes the area of the image (exactly, without the usual
+# margin around what was drawn), and the drawing code can then skip entities that fall entirely outside of it at all
+# times (see _canvas.visible), before they are validated or drawn.
+#   Paths and polygons can be simplified:  given a distance (in the units of the page) as simplify, points are dropped
+# where straight segments between the others pass within that distance of them (in every keyframe, for animated ones),
+# and simplify=True uses a tenth of the size of a pixel, for the raster formats.  By default (None), all points are kept.
+#   The optional cache argument is a caching.fragment_cache, which the canvas only holds for the drawing code.  What it
+# keeps are recordings of the drawing commands (see _canvas.record), which the canvas replays when asked.
+#   The optional profile argument is a profiling.profiler that records the time spent validating the
+# arguments to the drawing commands and generating the image code (see profiling.py).
 #   Here is the philosophy regarding which arguments are passed directly to the __init__ of the renderer:
 # If the argument affects the *definition* of the image (duration, background, etc), then it should
 # not be passed to the renderer __init__, but it should be taken care of by a method called by the
@@ -46,78 +65,227 @@ from . import renderers
 # options that are not relevant to every format.  The reason for not passing all of them directly to
 # the renderer __init__ is that some, like the background color might need to be pre-parsed (eg, grayscaled).
 
-def py(filestem, *, background=None, duration=None, grayscale=False):
+def py(filestem, *, background=None, duration=None, grayscale=False, cache=None, profile=None):
     """ returns an object that essentially echos the input ... useful for debugging higher code levels """
-    return _canvas(renderers.py(filestem), grayscale=grayscale, duration=duration, background=background)    # <-- probably broken (not updated to match calling code)
+    return _canvas(renderers.py(filestem), grayscale=grayscale, duration=duration, background=background, cache=cache, profile=profile)    # <-- probably broken (not updated to match calling code)
 
-def jpg(filestem, *, dpi=150, background=None, grayscale=False):
-    """ returns an object that translates the uniform drawing interface to jpg format """
-    return _canvas(renderers.jpg(filestem, dpi=dpi), grayscale=grayscale, background=background)
+def jpg(filestem, *, dpi=150, quality=90, background=None, grayscale=False, viewport=None, simplify=None, cache=None, profile=None):
+    """ returns an object that translates the uniform drawing interface to jpg format (rasterized in-process; returns the bytes from finish() if filestem is None) """
+    return _canvas(renderers.raster(filestem, dpi=dpi, image_format="jpg", quality=quality), grayscale=grayscale, background=background, viewport=viewport, simplify=simplify, cache=cache, profile=profile)
 
-def pdf(filestem, *, background=None, grayscale=False):
+def png(filestem, *, dpi=150, background=None, grayscale=False, viewport=None, simplify=None, cache=None, profile=None):
+    """ returns an object that translates the uniform drawing interface to png format (rasterized in-process; returns the bytes from finish() if filestem is None) """
+    return _canvas(renderers.raster(filestem, dpi=dpi, image_format="png"), grayscale=grayscale, background=background, viewport=viewport, simplify=simplify, cache=cache, profile=profile)
+
+def pdf(filestem, *, background=None, grayscale=False, viewport=None, simplify=None, cache=None, profile=None):
     """ returns an object that translates the uniform drawing interface to pdf format """
-    return _canvas(renderers.pdf(filestem), grayscale=grayscale, background=background)
+    return _canvas(renderers.pdf(filestem), grayscale=grayscale, background=background, viewport=viewport, simplify=simplify, cache=cache, profile=profile)
+
+def pixels(*, dpi=150, background=None, grayscale=False, viewport=None, simplify=None, cache=None, profile=None):
+    """ returns an object that translates the uniform drawing interface to an RGBA array (NumPy, 8 bits per channel), returned by finish() """
+    return _canvas(renderers.raster(None, dpi=dpi, image_format="rgba"), grayscale=grayscale, background=background, viewport=viewport, simplify=simplify, cache=cache, profile=profile)
 
-def svg(filestem, *, title=None, background=None, controls=None, duration=None, grayscale=False):
-    """ returns an object that translates the uniform drawing interface to svg code """
-    return _canvas(renderers.svg(filestem, title=title, controls=controls), grayscale=grayscale, duration=duration, background=background)
+def svg(filestem, *, title=None, background=None, controls=None, duration=None, grayscale=False, stream=None, encoding=None, compress=None, instances=False, tolerance=None, viewport=None, simplify=None, cache=None, profile=None):
+    """ returns an object that translates the uniform drawing interface to svg code (written to stream instead of filestem.svg, if given, or returned from finish() if filestem is None; gzipped as filestem.svgz if compress is True or a gzip level) """
+    return _canvas(renderers.svg(filestem, title=title, controls=controls, stream=stream, encoding=encoding, compress=compress, instances=instances), grayscale=grayscale, duration=duration, background=background, tolerance=tolerance, viewport=viewport, simplify=simplify, cache=cache, profile=profile)
 
-def svg_raw(*, duration=None, grayscale=False):
+def svg_raw(*, duration=None, grayscale=False, encoding=None, tolerance=None, viewport=None, simplify=None, cache=None, profile=None):
     """ returns an object that translates the uniform drawing interface to snippets of svg code stored in a string """
-    return _canvas(renderers.svg_raw(), grayscale=grayscale, duration=duration)
+    return _canvas(renderers.svg_raw(encoding=encoding), grayscale=grayscale, duration=duration, tolerance=tolerance, viewport=viewport, simplify=simplify, cache=cache, profile=profile)
 
 
 
 # This is the class instantiated by the above functions
 
+def _color_key(value):
+    # color structures are compared by value when deciding if keyframes are redundant
+    try:
+        return value.rgb, value.a
+    except AttributeError:
+        return value
+
+def _numbers(value):
+    # rough count of the numbers written out for a value
+    if isinstance(value, (list, tuple)):  return sum(_numbers(v) for v in value)
+    else:                                 return 1
+
+def _pays_off(animated, reduced):
+    # evenly spaced keyframes need not have their times written out, so dropping a few of them might make the output longer
+    for frames,fewer in zip(animated, reduced):
+        n = len(frames) - 1
+        if all(util.float_eq(t, i/n) for i,(t,_) in enumerate(frames)):
+            if (len(frames)-len(fewer)) * _numbers(frames[0][1]) <= len(fewer):  return False
+    return True
+
+def _valid_viewport(viewport):
+    try:
+        xmin, ymin, xmax, ymax = viewport
+    except (TypeError, ValueError):
+        raise ValueError("viewport must be given as (xmin, ymin, xmax, ymax)")
+    xmin, ymin, xmax, ymax = (util.valid_real_number((v, "viewport bound"), (lambda x: True, "anything")) for v in (xmin, ymin, xmax, ymax))
+    if not (xmin<xmax and ymin<ymax):  raise ValueError("viewport must be given as (xmin, ymin, xmax, ymax), enclosing a non-zero area")
+    return xmin, ymin, xmax, ymax
+
+def _valid_simplify(simplify, renderer):
+    if simplify is True:
+        resolution = getattr(renderer, "resolution", None)    # the size of a pixel, in the units of the page
+        if resolution is None:  raise ValueError("the output has no fixed resolution to simplify to, so give a distance instead of True")
+        return resolution / 10    # (moving edges by more visibly changes their anti-aliasing)
+    return util.valid_real_number((simplify, "path simplification tolerance"), (lambda x: x>=0, "non-negative"))
+
 class _canvas(object):
     """ this class checks user input and manages file creation, given an engine that creates the actual format-specific image-code """
-    def __init__(self, renderer, grayscale, *, duration=None, background=None):
+    def __init__(self, renderer, grayscale, *, duration=None, background=None, tolerance=None, viewport=None, simplify=None, cache=None, profile=None):
+        self.profile      = profiling.no_profiler if (profile is None) else profile    # public, so that drawing code can report its own stages
         self._renderer    = renderer
         self._parsers     = util.style_parsers(grayscale=grayscale)
         self._animated    = (duration is not None)
+        self._grayscale   = grayscale
+        self._tolerance   = None if (tolerance is None) else util.valid_real_number((tolerance, "keyframe tolerance"), (lambda x: x>=0, "non-negative"))
+        self.viewport     = None if (viewport  is None) else _valid_viewport(viewport)    # public, so that drawing code can cull what falls outside
+        self._simplify    = None if (simplify  is None) else _valid_simplify(simplify, renderer)
+        self.cache        = cache    # public, for the drawing code (see caching.py)
+        self.settings     = (type(renderer), getattr(renderer, "precision", None), grayscale, self._animated, tolerance, self.viewport, self._simplify)    # all that changes the recorded commands
+        self._recordings  = []    # fragments being recorded, innermost last
         if duration:    self._renderer.duration(duration)
         if background:  self._renderer.background(self._parsers.color(background))
+        if viewport:    self._renderer.viewport(self.viewport)
+        if duration and (tolerance is not None) and hasattr(self._renderer, "tolerance"):
+            self._tolerance /= 2                         # the errors of the two passes add up
+            self._renderer.tolerance(self._tolerance)    # for the renderer to fit spline easing
     def line(self, begin, end, lstyle=tuple(), toggle=None):
-        begin  = self._valid_point(begin)
-        end    = self._valid_point(end)
-        lstyle = self._valid_lstyle(lstyle)
-        self._renderer.line(lstyle, begin, end, toggle)
+        with self.profile.stage("validate"):
+            begin  = self._valid_point(begin)
+            end    = self._valid_point(end)
+            lstyle = self._valid_lstyle(lstyle)
+            begin, end = self._reduced(begin, end)    # jointly, since the renderer may need the same times for both
+            lstyle = self._reduced_style(lstyle)
+            self._tally(positions=(begin, end), styles=(lstyle,))
+        with self.profile.stage("codegen"):
+            self._render("line", lstyle, begin, end, toggle)
     def path(self, points, lstyle=tuple(), fstyle=None, toggle=None):
-        points = self._valid_points(points)
-        lstyle = self._valid_lstyle(lstyle)
-        fstyle = self._valid_fstyle(fstyle)
-        self._renderer.path(lstyle, fstyle, points, toggle)
+        with self.profile.stage("validate"):
+            points = self._simplified(self._valid_points(points), closed=False)
+            lstyle = self._valid_lstyle(lstyle)
+            fstyle = self._valid_fstyle(fstyle)
+            points, = self._reduced(points)
+            lstyle, fstyle = self._reduced_style(lstyle), self._reduced_style(fstyle)
+            self._tally(points=points, styles=(lstyle, fstyle))
+        with self.profile.stage("codegen"):
+            self._render("path", lstyle, fstyle, points, toggle)
     def polygon(self, points, lstyle=tuple(), fstyle=None, toggle=None):
-        points = self._valid_points(points)
-        lstyle = self._valid_lstyle(lstyle)
-        fstyle = self._valid_fstyle(fstyle)
-        self._renderer.polygon(lstyle, fstyle, points, toggle)
+        with self.profile.stage("validate"):
+            points = self._simplified(self._valid_points(points), closed=True)
+            lstyle = self._valid_lstyle(lstyle)
+            fstyle = self._valid_fstyle(fstyle)
+            points, = self._reduced(points)
+            lstyle, fstyle = self._reduced_style(lstyle), self._reduced_style(fstyle)
+            self._tally(points=points, styles=(lstyle, fstyle))
+        with self.profile.stage("codegen"):
+            self._render("polygon", lstyle, fstyle, points, toggle)
     def arc(self, begin, end, radius, skew=0, lstyle=tuple(), fstyle=None, toggle=None):
-        rx, ry = radius
-        end_arc = *end, util.struct(curve="arc", rx=rx, ry=ry, skew=skew)
-        begin   = self._valid_point(begin)
-        end_arc = self._valid_point(end_arc)
-        x, y, p = end_arc
-        end, radius, skew = ((x, y), (p.rx, p.ry), p.skew)
-        lstyle = self._valid_lstyle(lstyle)
-        fstyle = self._valid_fstyle(fstyle)
-        self._renderer.arc(lstyle, fstyle, begin, end, radius, skew, toggle)
+        with self.profile.stage("validate"):
+            rx, ry = radius
+            end_arc = *end, util.struct(curve="arc", rx=rx, ry=ry, skew=skew)
+            begin   = self._valid_point(begin)
+            end_arc = self._valid_point(end_arc)
+            x, y, p = end_arc
+            end, radius, skew = ((x, y), (p.rx, p.ry), p.skew)
+            lstyle = self._valid_lstyle(lstyle)
+            fstyle = self._valid_fstyle(fstyle)
+            self._tally(positions=(begin, end), styles=(lstyle, fstyle))
+        with self.profile.stage("codegen"):
+            self._render("arc", lstyle, fstyle, begin, end, radius, skew, toggle)
     def circle(self, center, radius, lstyle=tuple(), fstyle=None, toggle=None):
-        center = self._valid_point(center)
-        radius = self._valid_number(radius, "circle radius", (lambda x: x>0, "positive"))
-        lstyle = self._valid_lstyle(lstyle)
-        fstyle = self._valid_fstyle(fstyle)
-        self._renderer.circle(lstyle, fstyle, center, radius, toggle)
+        with self.profile.stage("validate"):
+            center = self._valid_point(center)
+            radius = self._valid_number(radius, "circle radius", (lambda x: x>0, "positive"))
+            lstyle = self._valid_lstyle(lstyle)
+            fstyle = self._valid_fstyle(fstyle)
+            center, radius = self._reduced(center, radius)
+            lstyle, fstyle = self._reduced_style(lstyle), self._reduced_style(fstyle)
+            self._tally(positions=(center,), scalars=(radius,), styles=(lstyle, fstyle))
+        with self.profile.stage("codegen"):
+            self._render("circle", lstyle, fstyle, center, radius, toggle)
     def image(self, imgfile, size, position, rotate=0, toggle=None):
-        if not os.path.isfile(filname):
-            raise FileNotFoundError(imgfile)    # No guarantee it is an image file, but oh well
-        size     = self._valid_point(size)
-        position = self._valid_point(position)
-        rotate = util.valid_real_number((rotate, "image rotation"), (lambda x: True, "anything"))
-        self._renderer.image(imgfile, size, position, rotate, toggle)
+        with self.profile.stage("validate"):
+            if not os.path.isfile(filname):
+                raise FileNotFoundError(imgfile)    # No guarantee it is an image file, but oh well
+            size     = self._valid_point(size)
+            position = self._valid_point(position)
+            rotate = util.valid_real_number((rotate, "image rotation"), (lambda x: True, "anything"))
+        with self.profile.stage("codegen"):
+            self._render("image", imgfile, size, position, rotate, toggle)
+    def bitmap(self, pixels, corners, toggle=None):
+        # corners are the top-left, top-right and bottom-left corners of the image on the page (so any affine placement)
+        with self.profile.stage("validate"):
+            pixels  = self._valid_pixels(pixels)
+            corners = self._valid_corners(corners)
+            self._tally(points=corners, scalars=(pixels,))
+        with self.profile.stage("codegen"):
+            self._render("bitmap", pixels, corners, toggle)
+    def visible(self, box):
+        # whether a bounding box (xmin, ymin, xmax, ymax) meets the viewport, if any ... for drawing code to skip what cannot show (None if unknown)
+        return (self.viewport is None) or (box is None) or util.boxes_meet(box, self.viewport)
+    def record(self):
+        # starts recording the (validated) drawing commands passed to the renderer, as a fragment that can be replayed ... recordings can be nested
+        self._recordings += [[]]
+    def recorded(self):
+        # ends the innermost recording and returns its fragment, which becomes part of the enclosing recording (if any)
+        fragment = self._recordings.pop()
+        if self._recordings:  self._recordings[-1] += [fragment]
+        return fragment
+    def replay(self, fragment):
+        # passes the recorded drawing commands to the renderer again (and into any recording in progress)
+        if self._recordings:  self._recordings[-1] += [fragment]
+        with self.profile.stage("codegen"):
+            self._replay(fragment)
     def finish(self):
         return self._renderer.finish()    # return value is specific to renderer (often None)
+    def _render(self, method, *arguments):
+        if self._recordings:  self._recordings[-1] += [(method, arguments)]
+        getattr(self._renderer, method)(*arguments)
+    def _replay(self, fragment):
+        for item in fragment:
+            if isinstance(item, list):  self._replay(item)
+            else:                       getattr(self._renderer, item[0])(*item[1])
+    def _tally(self, *, points=(), positions=(), scalars=(), styles=()):
+        # for profiling, counts the (validated) points drawn, summed over keyframes, and the keyframes of the animated properties among
+        # points (a list of points), positions (single points), scalars (numbers, or anything else that is not a point), and styles
+        if self.profile is profiling.no_profiler:  return
+        if self._animated:
+            properties = [points, *positions, *scalars] if len(points) else [*positions, *scalars]
+            properties += [frames for style in styles for frames in util.as_dict(style).values() if isinstance(frames, list)]
+            keyframes = sum(len(frames) for frames in properties if len(frames)>1)
+            points = sum(len(pts) for _,pts in points) + sum(len(frames) for frames in positions)
+        else:
+            keyframes, points = 0, len(points) + len(positions)
+        self.profile.count(points=points, keyframes=keyframes)
+    def _simplified(self, points, closed):
+        # drops the points of a validated path or polygon not needed to meet the simplification tolerance (if given), in all keyframes alike
+        if self._simplify is None:  return points
+        with self.profile.stage("simplify"):
+            if self._animated:
+                frames = util.simplified_points([pts for _,pts in points], self._simplify, closed)
+                return [(t, pts) for (t,_),pts in zip(points, frames)]
+            else:
+                return util.simplified_points([points], self._simplify, closed)[0]
+    def _reduced(self, *properties):
+        # drops the keyframes of validated animated properties that are not needed to meet the tolerance (if given), jointly among those sharing times
+        if (self._tolerance is None) or not self._animated:  return properties
+        with self.profile.stage("reduce"):
+            indices = [i for i,frames in enumerate(properties) if len(frames)>1]
+            properties = list(properties)
+            animated = [properties[i] for i in indices]
+            reduced = util.reduced_keyframes(animated, self._tolerance, self._renderer.precision, key=_color_key)
+            if _pays_off(animated, reduced):
+                for i,frames in zip(indices, reduced):  properties[i] = frames
+            return properties
+    def _reduced_style(self, style):
+        # reduces the animated components of a validated style separately (colors only in runs of identical ones)
+        if (self._tolerance is None) or not self._animated:  return style
+        descriptors = {k:self._reduced(v)[0] for k,v in util.as_dict(style).items() if k not in style._exclude}
+        return type(style)(style, **descriptors)    # copy with updates
     def _valid_lstyle(self, lstyle):
         lstyle = self._parsers.linestyle(lstyle)
         if self._animated:
@@ -132,6 +300,30 @@ class _canvas(object):
         elif fstyle.has_animated():
             raise RuntimeError("animated property given to resolve single time point")
         return fstyle
+    def _valid_pixels(self, pixels):
+        try:
+            frames = [(t, util.raster_code.valid_pixels(p, self._grayscale)) for t,p in pixels] if isinstance(pixels, (list, tuple)) else None
+        except (TypeError, ValueError):
+            frames = None
+        if frames is None or not util.is_animated(frames):
+            pixels = util.raster_code.valid_pixels(pixels, self._grayscale)
+            return [(None, pixels)] if self._animated else pixels    # (util.animated would have to guess at the nature of an array)
+        elif self._animated:
+            return frames
+        else:
+            raise RuntimeError("animated bitmap given to resolve single time point")
+    def _valid_corners(self, corners):
+        def valid(corners):
+            top_left, top_right, bottom_left = corners
+            return tuple(util.valid_point(p) for p in (top_left, top_right, bottom_left))
+        try:
+            frames = [(t, valid(c)) for t,c in corners]
+        except (TypeError, ValueError):
+            corners = valid(corners)
+            return [(None, corners)] if self._animated else corners
+        else:
+            if not self._animated:  raise RuntimeError("animated bitmap placement given to resolve single time point")
+            return frames
     def _valid_number(self, number, name, conditional):
         if self._animated:
             if util.is_animated(number):
@@ -0,0 +1,155 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   This is the home of animations that are sequences of full raster frames (as opposed to svg animations, which
+# describe how each object moves).  Frames come from entity.frames(), which renders them one at a time, and an encoder
+# takes them one at a time, so that only a few frames are held in memory at once.
+#   An encoder is any object with the methods frame(pixels) and finish(), where pixels is an (H,W,4) RGBA array (NumPy,
+# 8 bits per channel, rows from the top).  The return value of finish() is specific to the encoder (often None).  All
+# frames are expected to be the same size.
+#
+import io
+import threading
+import queue
+from fractions import Fraction
+from . import util
+
+
+
+def encode(frames, encoder, *, queued=2):
+    """ feeds an iterable of RGBA arrays to an encoder working in a separate thread, so that encoding overlaps with the rendering of the frames that follow; returns the result of encoder.finish() """
+    waiting  = queue.Queue(maxsize=queued)    # rendering blocks when the encoder falls this far behind
+    done     = object()                       # sentinels for normal completion ...
+    abort    = object()                       # ... and for failure while rendering
+    outcome  = {}
+    def consume():
+        pixels = None
+        try:
+            pixels = waiting.get()
+            while (pixels is not done) and (pixels is not abort):
+                encoder.frame(pixels)
+                pixels = waiting.get()
+            if pixels is done:  outcome["result"] = encoder.finish()
+        except BaseException as error:
+            outcome["error"] = error
+            while (pixels is not done) and (pixels is not abort):    # so that the rendering side does not block
+                pixels = waiting.get()
+    thread = threading.Thread(target=consume)
+    thread.start()
+    finished = abort
+    try:
+        for pixels in frames:
+            if "error" in outcome:  break
+            waiting.put(pixels)
+        finished = done
+    finally:
+        waiting.put(finished)
+        thread.join()
+    if "error" in outcome:  raise outcome["error"]
+    return outcome["result"]
+
+
+
+def _frame_size(encoder, pixels):
+    height, width, _ = pixels.shape
+    if encoder._size is None:
+        encoder._size = width, height
+    elif encoder._size!=(width, height):
+        raise RuntimeError("for now, all the frames need to be the same size (ie, the same viewbox)")
+    return width, height
+
+def _open(filestem, extension):
+    if filestem is None:
+        return io.BytesIO()
+    else:
+        return open("{}.{}".format(filestem, extension), "wb")
+
+def _close(stream):
+    if isinstance(stream, io.BytesIO):
+        return stream.getvalue()
+    else:
+        stream.close()
+
+
+
+class apng(object):
+    """ writes frames to an animated png file as they come (or returns the file contents from finish(), if filestem is None) """
+    def __init__(self, filestem, *, fps, loops=0, level=6):
+        self._stream   = _open(filestem, "png")
+        rate = Fraction(fps).limit_denominator(65535)
+        self._delay    = rate.denominator, rate.numerator    # seconds per frame, as a fraction
+        self._loops    = loops                               # 0 means forever
+        self._level    = level
+        self._size     = None
+        self._count    = 0
+        self._sequence = 0
+    def frame(self, pixels):
+        width, height = _frame_size(self, pixels)
+        if self._count==0:
+            self._stream.write(util.raster_code.png_signature + util.raster_code.png_header(width, height))
+            self._control = self._stream.tell()    # the number of frames is only known at the end, so this chunk is rewritten then
+            self._stream.write(util.raster_code.apng_control(0, self._loops))
+        data = util.raster_code.png_data(pixels, self._level)
+        self._stream.write(util.raster_code.apng_frame(self._sequence, width, height, self._delay))
+        if self._count==0:
+            self._stream.write(util.raster_code.png_chunk("IDAT", data))
+            self._sequence += 1
+        else:
+            self._stream.write(util.raster_code.apng_data(self._sequence+1, data))
+            self._sequence += 2
+        self._count += 1
+    def finish(self):
+        if self._count==0:  raise RuntimeError("animation has no frames")
+        self._stream.write(util.raster_code.png_chunk("IEND", b""))
+        self._stream.seek(self._control)
+        self._stream.write(util.raster_code.apng_control(self._count, self._loops))
+        self._stream.seek(0, io.SEEK_END)
+        return _close(self._stream)
+
+class gif(object):
+    """ writes frames to an animated gif file as they come (or returns the file contents from finish(), if filestem is None) """
+    def __init__(self, filestem, *, fps, loops=0):
+        self._stream = _open(filestem, "gif")
+        self._fps    = fps
+        self._loops  = loops    # 0 means forever
+        self._size   = None
+        self._count  = 0
+    def frame(self, pixels):
+        width, height = _frame_size(self, pixels)
+        if self._count==0:
+            self._stream.write(util.raster_code.gif_header(width, height, self._loops))
+        centiseconds = lambda i: util.int_round(100*i/self._fps)    # delays are whole centiseconds, so do not let rounding errors accumulate
+        delay = centiseconds(self._count+1) - centiseconds(self._count)
+        self._stream.write(util.raster_code.gif_frame(pixels, delay))
+        self._count += 1
+    def finish(self):
+        if self._count==0:  raise RuntimeError("animation has no frames")
+        self._stream.write(util.raster_code.gif_trailer)
+        return _close(self._stream)
+
+class pipe(object):
+    """ writes raw frames (RGBA bytes, rows from the top) to a binary stream, such as the stdin of a subprocess running a video encoder """
+    def __init__(self, stream):
+        self._stream = stream
+        self._size   = None
+    def frame(self, pixels):
+        _frame_size(self, pixels)
+        self._stream.write(pixels.tobytes())
+    def finish(self):
+        self._stream.flush()    # closing the stream is left to the owner
@@ -15,21 +15,27 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
-from ..util      import colordef
+import numpy
+from ..util      import colordef, color_parser
 from ..composite import composite
-from ..line_art  import polygon
+from ..line_art  import polygon, bitmap as bitmap_entity
 from ..animation import animated
 
 
 # derivations of some formulas found in ./notes/raster.pdf
 
-def rasterize(rgba_Dt, xdim=(-1,1,20), ydim=(-1,1,20), pixel_aspect_ratio=1, width=100):
+def rasterize(rgba_Dt, xdim=(-1,1,20), ydim=(-1,1,20), pixel_aspect_ratio=1, width=100, bitmap=False):
     # rgba_Dt should be a function of x and y that returns a 2-tuple of rgbs and Dt, where
     # where Dt is the time resolution to use at that point in space and
     # rgba is a function of time (and it can ignore the time argument), returning a 2-tuple
     # which is the rgb code (in #RRGGBB form) and alpha value at that x,y point (at that time);
     # the code can recover if the alpha value is omitted (a value instead of a tuple is returned)
     # by omitting the alpha channel (no transparency).
+    #   If bitmap is True, the field is instead evaluated once per frame at the (Nx+1)*(Ny+1) lattice points
+    # into a single embedded image (one pixel per point), which is far lighter than thousands of polygons,
+    # though the pixels are interpolated by the viewer rather than blended by overlapping diamonds.
+    #
+    if bitmap:  return _bitmap(rgba_Dt, xdim, ydim, pixel_aspect_ratio, width)
     #
     Py = pixel_aspect_ratio
     Px = 1 / Py            # hard-coded:  pixel area is 1
@@ -71,3 +77,34 @@ def rasterize(rgba_Dt, xdim=(-1,1,20), ydim=(-1,1,20), pixel_aspect_ratio=1, wid
             upper += [pixel(fstyle=color(x,y,"upper")).T((i+1/2)*Px, (j+1/2)*Py)]
     #
     return composite([*lower, *upper]).S(width/(Px*Nx))
+
+
+
+def _bitmap(rgba_Dt, xdim, ydim, pixel_aspect_ratio, width):
+    Py = pixel_aspect_ratio
+    Px = 1 / Py
+    xmin, xmax, Nx = xdim
+    ymin, ymax, Ny = ydim
+    Dx = (xmax-xmin) / Nx
+    Dy = (ymax-ymin) / Ny
+    samples = [[rgba_Dt(xmin + i*Dx, ymin + j*Dy) for i in range(Nx+1)] for j in reversed(range(Ny+1))]    # rows from the top
+    Dts = [Dt for row in samples for rgba,Dt in row if Dt is not None]
+    parse = color_parser(grayscale=False)
+    codes = {}    # fields typically reuse a limited palette, so parse each color string once
+    def channels(rgb_a):
+        try:
+            rgb, a = rgb_a
+        except (TypeError, ValueError):
+            rgb, a = rgb_a, 1
+        a = 1 if (a is None) else a
+        if rgb not in codes:
+            color = parse(colordef(rgb=rgb, a=1))
+            codes[rgb] = (0,0,0,0) if (color.rgb=="none") else tuple(int(color.rgb[k:k+2], base=16) for k in (1,3,5)) + (255,)
+        r, g, b, alpha = codes[rgb]
+        return r, g, b, alpha*a
+    def pixels(_t_):
+        rgba = numpy.array([[channels(rgba(_t_)) for rgba,Dt in row] for row in samples], dtype=float)
+        return numpy.rint(rgba).astype(numpy.uint8)
+    pixels = animated(pixels, Dt=min(Dts) if Dts else None)
+    image = bitmap_entity(pixels=pixels, corner=(-Px/2,-Py/2), size=((Nx+1)*Px, (Ny+1)*Py))
+    return image.S(width/(Px*Nx))
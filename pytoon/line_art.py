@@ -17,9 +17,12 @@
 #
 import operator
 import math
+import numpy
 from . import util
 from . import animation
+from . import transforms
 from . import base
+from . import profiling
 
 assert_different = lambda a,b:  False    # comparison function to use when you want to just assume two things are never equal (maybe just easier than writing a real comparison)
 
@@ -70,69 +73,124 @@ def _wrap_fillstyle(fstyle, anim_wrap):
 
 # simultaneously handle transformations and animation (because the transformation might be animated)
 
+class _sampled_transform(object):
+    """ evaluates a transform (about the animated origin of an entity) at most once per sample time, for sharing among all properties of that entity """
+    def __init__(self, transform, origin):
+        self.origin     = origin
+        self._transform = transform
+        self._matrices  = {}    # memoized by sample time
+        self._mappings  = {}    # memoized by sample time
+    def n_intervals(self, ta, tz):
+        return self._transform.n_intervals(ta, tz)
+    def matrix(self, t):
+        try:
+            return self._matrices[t]
+        except KeyError:
+            matrix = self._matrices[t] = self._transform.matrix(t)
+            return matrix
+    def mappings(self, t):
+        try:
+            return self._mappings[t]
+        except KeyError:
+            if self._transform._all_affine:
+                mappings = self._transform._affine_mappings(*self.matrix(t))    # does not need the origin
+            else:
+                mappings = self._transform.mappings(t, self.origin(t))           # absolute mapping is independent of origin, so shared with points
+            self._mappings[t] = mappings
+            return mappings
+    def map_points(self, points, t):
+        """ maps a list of points sampled at time t, in one pass (with a single matrix) for an affine chain """
+        if self._transform._all_affine:
+            return transforms._affine_map(self.matrix(t)[0], points)
+        absolute, relative, linescale = self.mappings(t)
+        return [absolute(point) for point in points]
+    def map_frames(self, frames, times, relative=False):
+        """ maps the lists of points sampled at each time, returning a (T,P,2) array, when possible, or a list of point lists """
+        if self._transform._all_affine:
+            matrices = [self.matrix(t)[0] for t in times]
+            if all(matrix==transforms._identity for matrix in matrices):
+                return frames    # leaves points (and any curve information they carry) untouched
+            try:
+                points = numpy.array(frames, dtype=float)
+            except (TypeError, ValueError):
+                points = None    # ragged, or points carry curve information
+            if (points is not None) and (points.ndim==3) and (points.shape[2]==2):
+                matrices = numpy.array(matrices, dtype=float)[:,:,:,numpy.newaxis]    # shape (T,2,3,1) broadcasts over points
+                (a, b, e), (c, d, f) = matrices[:,0].transpose(1,0,2), matrices[:,1].transpose(1,0,2)
+                x, y = points[:,:,0], points[:,:,1]
+                return numpy.stack((a*x + b*y + e, c*x + d*y + f), axis=-1)
+        which = 1 if relative else 0    # relative and absolute mappings coincide for affine transforms
+        return [[self.mappings(t)[which](point) for point in points] for t,points in zip(times,frames)]
+
+def _sample_times(ta, tz, N):
+    # returns the N+1 sample times between ta and tz and the fractions of the interval they represent (t=None means "not animated")
+    if N>0:
+        Dt = (tz-ta)/N
+        times = ta + Dt*numpy.arange(N+1)
+        return times.tolist(), numpy.clip((times-ta)/(tz-ta), 0, 1).tolist()
+    else:
+        return [None], [None]    # if Dt is "infinity" property must be truly time independent, or will fail later
+
+def _keyframes(fracs, values, same):
+    # collapses the values sampled at the given time fractions to a single value, if they are all the same
+    homogeneous = all(same(v,value) for value,v in zip(values, values[1:]))
+    if homogeneous:  return values[-1]
+    else:            return list(zip(fracs, values))
+
 def _anim_loop(generate_value, same, ta, tz, N):
-    def t_frac(t,ta,tz):
-        if t is None:
-            return None
-        else:
-            return max(0, min(1, (t-ta)/(tz-ta) ))
-    Dt = (tz-ta)/N if N>0 else None    # None essentially means "infinity" or "not animated"
-    homogeneous = True
-    value  = None
-    values = []
-    for i in range(N+1):
-        t = (ta + i*Dt) if (Dt is not None) else None    # if Dt is None (ie "infinity") property must be truly time independent, or will fail later
-        v = generate_value(t)
-        values += [( t_frac(t,ta,tz), v )]
-        if (value is not None) and not same(v,value):  homogeneous = False
-        value = v
-    if homogeneous:  return value
-    else:            return values
+    times, fracs = _sample_times(ta, tz, N)
+    return _keyframes(fracs, [generate_value(t) for t in times], same)
 
 def _static_point(point, transform, t):
     absolute, relative, linescale = transform.mappings(t)
     return absolute(point(t))
 
 def _static_points(points, transform, t):
-    absolute, relative, linescale = transform.mappings(t)
-    return [absolute(point) for point in points(t)]
-
-def _animated_point(point, transform, ta, tz):
-    N = transform.n_intervals(ta, tz)
-    N = point.n_intervals(ta, tz, n_min=N)
-    generate_value = lambda t: _static_point(point, transform, t)
-    return _anim_loop(generate_value, assert_different, ta, tz, N)
+    return transform.map_points(points(t), t)
 
 def _animated_points(points, transform, ta, tz):
     N = transform.n_intervals(ta, tz)
     N = points.n_intervals(ta, tz, n_min=N)
-    generate_value = lambda t: _static_points(points, transform, t)
-    return _anim_loop(generate_value, assert_different, ta, tz, N)
+    times, fracs = _sample_times(ta, tz, N)
+    frames = transform.map_frames([points(t) for t in times], times)
+    if isinstance(frames, numpy.ndarray):  frames = frames.tolist()    # keyframes in bulk
+    return _keyframes(fracs, frames, assert_different)
 
-def _static_radius(radius, transform, origin, t):
-    x0, y0 = origin(t)
-    absolute, relative, linescale = transform.mappings(t, (x0,y0))
+def _animated_point(point, transform, ta, tz):
+    N = transform.n_intervals(ta, tz)
+    N = point.n_intervals(ta, tz, n_min=N)
+    times, fracs = _sample_times(ta, tz, N)
+    frames = transform.map_frames([[point(t)] for t in times], times)
+    if isinstance(frames, numpy.ndarray):  frames = frames.tolist()
+    return _keyframes(fracs, [p for p, in frames], assert_different)
+
+def _static_radius(radius, transform, t):
+    x0, y0 = transform.origin(t)
+    absolute, relative, linescale = transform.mappings(t)
     (x0,y0), (x1,y1), (x2,y2) = relative((x0,y0)), relative((x0+1,y0)), relative((x0,y0+1))
     return radius(t) * math.sqrt( ((x1-x0)**2 + (y1-y0)**2 + (x2-x0)**2 + (y2-y0)**2) / 2 )    # always defined, =sqrt(Trace( A.T A )/2) for linear transformations
 
-def _animated_radius(radius, transform, origin, ta, tz):
+def _animated_radius(radius, transform, ta, tz):
     N = transform.n_intervals(ta, tz)
-    N = origin.n_intervals(ta, tz, n_min=N)
+    N = transform.origin.n_intervals(ta, tz, n_min=N)
     N = radius.n_intervals(ta, tz, n_min=N)
-    generate_value = lambda t: _static_radius(radius, transform, origin, t)
-    return _anim_loop(generate_value, util.float_eq, ta, tz, N)
+    times, fracs = _sample_times(ta, tz, N)
+    probes = [[(x0,y0), (x0+1,y0), (x0,y0+1)] for x0,y0 in (transform.origin(t) for t in times)]
+    (x0,x1,x2), (y0,y1,y2) = numpy.array(transform.map_frames(probes, times, relative=True), dtype=float).transpose(2,1,0)
+    radii = numpy.array([radius(t) for t in times], dtype=float) * numpy.sqrt( ((x1-x0)**2 + (y1-y0)**2 + (x2-x0)**2 + (y2-y0)**2) / 2 )
+    return _keyframes(fracs, radii.tolist(), util.float_eq)
 
-def _static_weight(lstyle, transform, origin, t):
-    absolute, relative, linescale = transform.mappings(t, origin(t))
+def _static_weight(lstyle, transform, t):
+    absolute, relative, linescale = transform.mappings(t)
     return lstyle.weight(t) * linescale
 
-def _static_lstyle(lstyle, transform, origin, t):
+def _static_lstyle(lstyle, transform, t):
     color  = lstyle.color(t)
     dash   = lstyle.dash(t)
-    weight = _static_weight(lstyle, transform, origin, t)
+    weight = _static_weight(lstyle, transform, t)
     return util.linestyle(color=color, weight=weight, dash=dash)
 
-def _animated_lstyle(lstyle, transform, origin, ta, tz):
+def _animated_lstyle(lstyle, transform, ta, tz):
     N = lstyle.color.n_intervals(ta, tz)    # no n_min because color not (yet) affected by transform
     color = _anim_loop(lstyle.color, operator.eq, ta, tz, N)
     #
@@ -140,9 +198,9 @@ def _animated_lstyle(lstyle, transform, origin, ta, tz):
     dash = _anim_loop(lstyle.dash, operator.eq, ta, tz, N)
     #
     N = transform.n_intervals(ta, tz)
-    N = origin.n_intervals(ta, tz, n_min=N)
+    N = transform.origin.n_intervals(ta, tz, n_min=N)
     N = lstyle.weight.n_intervals(ta, tz, n_min=N)
-    generate_value = lambda t: _static_weight(lstyle, transform, origin, t)
+    generate_value = lambda t: _static_weight(lstyle, transform, t)
     weight = _anim_loop(generate_value, util.float_eq, ta, tz, N)
     return util.linestyle(color=color, weight=weight, dash=dash)
 
@@ -171,6 +229,19 @@ def _animated_fstyle(fstyle, ta, tz):
     else:
         raise NotImplementedError("specified fill type is not presently implemented: {}".format(fill))
 
+def _static_bitmap(pixels, corners, transform, t):
+    return pixels(t), tuple(_static_points(corners, transform, t))
+
+def _animated_bitmap(pixels, corners, transform, ta, tz):
+    N = transform.n_intervals(ta, tz)
+    N = corners.n_intervals(ta, tz, n_min=N)
+    N = pixels.n_intervals(ta, tz, n_min=N)    # pixels and placement are sampled at common times, so that frames line up
+    times, fracs = _sample_times(ta, tz, N)
+    frames = transform.map_frames([corners(t) for t in times], times)
+    if isinstance(frames, numpy.ndarray):  frames = frames.tolist()
+    frames = [tuple(tuple(point) for point in frame) for frame in frames]
+    return _keyframes(fracs, [pixels(t) for t in times], operator.is_), _keyframes(fracs, frames, operator.eq)    # unchanging arrays are the same object
+
 def _static_anim(static, anim, time, **kwargs):
         try:
             ta, tz = time
@@ -185,15 +256,70 @@ def _render_point(point, transform, time):
 def _render_points(points, transform, time):
     return _static_anim(_static_points, _animated_points, time, points=points, transform=transform)
 
-def _render_radius(radius, transform, origin, time):
-    return _static_anim(_static_radius, _animated_radius, time, radius=radius, transform=transform, origin=origin)
+def _render_radius(radius, transform, time):
+    return _static_anim(_static_radius, _animated_radius, time, radius=radius, transform=transform)
 
-def _render_lstyle(lstyle, transform, origin, time):
-    return _static_anim(_static_lstyle, _animated_lstyle, time, lstyle=lstyle, transform=transform, origin=origin)
+def _render_lstyle(lstyle, transform, time):
+    return _static_anim(_static_lstyle, _animated_lstyle, time, lstyle=lstyle, transform=transform)
 
 def _render_fstyle(fstyle, time):
     return _static_anim(_static_fstyle, _animated_fstyle, time, fstyle=fstyle)
 
+def _render_bitmap(pixels, corners, transform, time):
+    return _static_anim(_static_bitmap, _animated_bitmap, time, pixels=pixels, corners=corners, transform=transform)
+
+def _sampled_lstyle(lstyle, anim_wrap, transform, time, profile):
+    with profile.stage("wrap"):
+        lstyle = _wrap_linestyle(lstyle, anim_wrap)
+    with profile.stage("sample"):
+        return _render_lstyle(lstyle, transform, time)
+
+def _sampled_fstyle(fstyle, anim_wrap, time, profile):
+    with profile.stage("wrap"):
+        fstyle = _wrap_fillstyle(fstyle, anim_wrap)
+    with profile.stage("sample"):
+        return _render_fstyle(fstyle, time)
+
+def _points_geometry(parameters, transform, anim_wrap, time, profile):
+    # the sampled points of a polygon or path, and the transform about their animated origin
+    with profile.stage("wrap"):
+        points = anim_wrap([(0,0),(50,100),(100,0)] if (parameters.points is None) else parameters.points)
+        transform = _sampled_transform(transform, animation.wrapper(points, postprocess=lambda pts: pts[0]))
+    with profile.stage("sample"):
+        return _render_points(points, transform, time), transform
+
+
+
+# for skipping entities that cannot show in the viewport of the canvas (if any), and for finding their bounds (see spatial.py),
+# from their sampled geometry
+
+def _largest(value):
+    # the largest of the keyframes of a sampled number (or just the number, if static)
+    if isinstance(value, list):  return max(v for _,v in value)
+    else:                        return value
+
+def _reach(lstyle):
+    # how far the stroke of a sampled line style can reach beyond the geometry (miter joins, at the default limit of 4)
+    return 2 * _largest(lstyle.weight)
+
+def _box(canvas, geometry, pad=0):
+    # the bounds of sampled geometry, which are only worth finding if the canvas has a viewport (returned from _draw, for spatial.py)
+    return None if (canvas.viewport is None) else util.bounding_box(geometry, pad)
+
+def _points_bounds(entity, time, context):
+    parameters, transform, clock, anim_wrap = entity._resolve_parameters(context)
+    points, transform = _points_geometry(parameters, transform, anim_wrap, time, profiling.no_profiler)
+    lstyle = _sampled_lstyle(parameters.lstyle, anim_wrap, transform, time, profiling.no_profiler)
+    return util.bounding_box(points, pad=_reach(lstyle))
+
+def _four_corners(corners):
+    # the sampled placement of a bitmap is given by three corners of a parallelogram
+    def four(corners):
+        (x0,y0), (x1,y1), (x2,y2) = corners
+        return [(x0,y0), (x1,y1), (x2,y2), (x1+x2-x0, y1+y2-y0)]
+    if isinstance(corners, list):  return [four(c) for _,c in corners]
+    else:                          return four(corners)
+
 
 
 # make sense of a (possibly) incomplete description of endpoints by using defaults judiciously
@@ -245,59 +371,129 @@ class line(base.entity):
     """ describes a pytoon line entity """
     def __init__(self, *, begin=None, displacement=None, end=None, lstyle=None, varval=None, transform=None, clock=None, **kwargs):
         base.entity.__init__(self, kwargs, varval, transform, clock, begin=begin, displacement=displacement, end=end, lstyle=lstyle)
-    def _draw(self, time, canvas, aux_dir):
-        parameters, transform, clock, anim_wrap = self._resolve_parameters()
-        lstyle     = _wrap_linestyle(parameters.lstyle, anim_wrap)
-        begin, end = _segment(parameters.begin, parameters.displacement, parameters.end, anim_wrap)
-        lstyle = _render_lstyle(lstyle, transform, begin, time)
-        begin  = _render_point(begin, transform, time)
-        end    = _render_point(end, transform, time)
+    def _geometry(self, parameters, transform, anim_wrap, time, profile):
+        with profile.stage("wrap"):
+            begin, end = _segment(parameters.begin, parameters.displacement, parameters.end, anim_wrap)
+            transform  = _sampled_transform(transform, begin)
+        with profile.stage("sample"):
+            begin = _render_point(begin, transform, time)
+            end   = _render_point(end, transform, time)
+        return (begin, end), transform
+    def _bounds(self, time, context=None):
+        parameters, transform, clock, anim_wrap = self._resolve_parameters(context)
+        (begin, end), transform = self._geometry(parameters, transform, anim_wrap, time, profiling.no_profiler)
+        lstyle = _sampled_lstyle(parameters.lstyle, anim_wrap, transform, time, profiling.no_profiler)
+        return util.bounding_box((begin, end), pad=_reach(lstyle))
+    def _draw(self, time, canvas, aux_dir, context=None):
+        with canvas.profile.stage("resolve"):
+            parameters, transform, clock, anim_wrap = self._resolve_parameters(context)
+        (begin, end), transform = self._geometry(parameters, transform, anim_wrap, time, canvas.profile)
+        lstyle = _sampled_lstyle(parameters.lstyle, anim_wrap, transform, time, canvas.profile)
+        box = _box(canvas, (begin, end), pad=_reach(lstyle))
+        if not canvas.visible(box):  return box
         canvas.line(begin=begin, end=end, lstyle=lstyle)
+        return box
 
 class circle(base.entity):
     """ describes a pytoon circle entity """
     def __init__(self, *, center=None, radius=None, lstyle=None, fstyle=None, varval=None, transform=None, clock=None, **kwargs):
         base.entity.__init__(self, kwargs, varval, transform, clock, center=center, radius=radius, lstyle=lstyle, fstyle=fstyle)
-    def _draw(self, time, canvas, aux_dir):
-        parameters, transform, clock, anim_wrap = self._resolve_parameters()
-        lstyle = _wrap_linestyle(parameters.lstyle, anim_wrap)
-        fstyle = _wrap_fillstyle(parameters.fstyle, anim_wrap)
-        radius = anim_wrap( 100  if (parameters.radius is None) else parameters.radius)
-        center = anim_wrap((0,0) if (parameters.center is None) else parameters.center)
-        lstyle = _render_lstyle(lstyle, transform, center, time)
-        fstyle = _render_fstyle(fstyle, time)
-        radius = _render_radius(radius, transform, center, time)
-        center = _render_point(center, transform, time)
+    def _geometry(self, parameters, transform, anim_wrap, time, profile):
+        with profile.stage("wrap"):
+            radius = anim_wrap( 100  if (parameters.radius is None) else parameters.radius)
+            center = anim_wrap((0,0) if (parameters.center is None) else parameters.center)
+            transform = _sampled_transform(transform, center)
+        with profile.stage("sample"):
+            radius = _render_radius(radius, transform, time)
+            center = _render_point(center, transform, time)
+        return (center, radius), transform
+    def _bounds(self, time, context=None):
+        parameters, transform, clock, anim_wrap = self._resolve_parameters(context)
+        (center, radius), transform = self._geometry(parameters, transform, anim_wrap, time, profiling.no_profiler)
+        lstyle = _sampled_lstyle(parameters.lstyle, anim_wrap, transform, time, profiling.no_profiler)
+        return util.bounding_box(center, pad=_largest(radius)+_reach(lstyle))
+    def _draw(self, time, canvas, aux_dir, context=None):
+        with canvas.profile.stage("resolve"):
+            parameters, transform, clock, anim_wrap = self._resolve_parameters(context)
+        (center, radius), transform = self._geometry(parameters, transform, anim_wrap, time, canvas.profile)
+        lstyle = _sampled_lstyle(parameters.lstyle, anim_wrap, transform, time, canvas.profile)
+        box = _box(canvas, center, pad=_largest(radius)+_reach(lstyle))
+        if not canvas.visible(box):  return box
+        fstyle = _sampled_fstyle(parameters.fstyle, anim_wrap, time, canvas.profile)
         canvas.circle(center=center, radius=radius, lstyle=lstyle, fstyle=fstyle)
+        return box
 
 class polygon(base.entity):
     """ describes a pytoon polygon entity """
     def __init__(self, *, points=None, lstyle=None, fstyle=None, varval=None, transform=None, clock=None, **kwargs):
         base.entity.__init__(self, kwargs, varval, transform, clock, points=points, lstyle=lstyle, fstyle=fstyle)
-    def _draw(self, time, canvas, aux_dir):
-        parameters, transform, clock, anim_wrap = self._resolve_parameters()
-        lstyle = _wrap_linestyle(parameters.lstyle, anim_wrap)
-        fstyle = _wrap_fillstyle(parameters.fstyle, anim_wrap)
-        points = anim_wrap([(0,0),(50,100),(100,0)] if (parameters.points is None) else parameters.points)
-        lstyle = _render_lstyle(lstyle, transform, animation.wrapper(points, postprocess=lambda pts: pts[0]), time)
-        fstyle = _render_fstyle(fstyle, time)
-        points = _render_points(points, transform, time)
+    def _geometry(self, parameters, transform, anim_wrap, time, profile):
+        return _points_geometry(parameters, transform, anim_wrap, time, profile)
+    def _bounds(self, time, context=None):
+        return _points_bounds(self, time, context)
+    def _draw(self, time, canvas, aux_dir, context=None):
+        with canvas.profile.stage("resolve"):
+            parameters, transform, clock, anim_wrap = self._resolve_parameters(context)
+        points, transform = self._geometry(parameters, transform, anim_wrap, time, canvas.profile)
+        lstyle = _sampled_lstyle(parameters.lstyle, anim_wrap, transform, time, canvas.profile)
+        box = _box(canvas, points, pad=_reach(lstyle))
+        if not canvas.visible(box):  return box
+        fstyle = _sampled_fstyle(parameters.fstyle, anim_wrap, time, canvas.profile)
         canvas.polygon(points=points, lstyle=lstyle, fstyle=fstyle)
+        return box
 
 class path(base.entity):
     """ describes a pytoon path entity """
     def __init__(self, *, points=None, lstyle=None, fstyle=None, varval=None, transform=None, clock=None, **kwargs):
         base.entity.__init__(self, kwargs, varval, transform, clock, points=points, lstyle=lstyle, fstyle=fstyle)
-    def _draw(self, time, canvas, aux_dir):
-        parameters, transform, clock, anim_wrap = self._resolve_parameters()
-        lstyle = _wrap_linestyle(parameters.lstyle, anim_wrap)
-        fstyle = _wrap_fillstyle(parameters.fstyle, anim_wrap)
-        points = anim_wrap([(0,0),(50,100),(100,0)] if (parameters.points is None) else parameters.points)
-        lstyle = _render_lstyle(lstyle, transform, animation.wrapper(points, postprocess=lambda pts: pts[0]), time)
-        fstyle = _render_fstyle(fstyle, time)
-        points = _render_points(points, transform, time)
+    def _geometry(self, parameters, transform, anim_wrap, time, profile):
+        return _points_geometry(parameters, transform, anim_wrap, time, profile)
+    def _bounds(self, time, context=None):
+        return _points_bounds(self, time, context)
+    def _draw(self, time, canvas, aux_dir, context=None):
+        with canvas.profile.stage("resolve"):
+            parameters, transform, clock, anim_wrap = self._resolve_parameters(context)
+        points, transform = self._geometry(parameters, transform, anim_wrap, time, canvas.profile)
+        lstyle = _sampled_lstyle(parameters.lstyle, anim_wrap, transform, time, canvas.profile)
+        box = _box(canvas, points, pad=_reach(lstyle))
+        if not canvas.visible(box):  return box
+        fstyle = _sampled_fstyle(parameters.fstyle, anim_wrap, time, canvas.profile)
         canvas.path(points=points, lstyle=lstyle, fstyle=fstyle)
-
+        return box
+
+class bitmap(base.entity):
+    """ describes a pytoon bitmap entity (an RGB(A) array, rows from the top, stretched over a rectangle with its lower-left at corner; size defaults to one unit per pixel) """
+    def __init__(self, *, pixels=None, corner=None, size=None, varval=None, transform=None, clock=None, **kwargs):
+        base.entity.__init__(self, kwargs, varval, transform, clock, pixels=pixels, corner=corner, size=size)
+    def _geometry(self, parameters, transform, anim_wrap, time, profile):
+        with profile.stage("wrap"):
+            if parameters.pixels is None:
+                raise ValueError("a bitmap entity needs pixels to draw")
+            pixels = anim_wrap(parameters.pixels)
+            corner = anim_wrap((0,0) if (parameters.corner is None) else parameters.corner)
+            def rectangle(corner, size):
+                (x, y), (w, h) = corner, size
+                return [(x, y+h), (x+w, y+h), (x, y)]    # top-left, top-right, bottom-left
+            if parameters.size is None:
+                corners = animation.combine(lambda c,p: rectangle(c, numpy.shape(p)[1::-1]), corner, pixels)
+            else:
+                corners = animation.combine(rectangle, corner, anim_wrap(parameters.size))
+            transform = _sampled_transform(transform, corner)
+        with profile.stage("sample"):
+            pixels, corners = _render_bitmap(pixels, corners, transform, time)
+        return (pixels, corners), transform
+    def _bounds(self, time, context=None):
+        parameters, transform, clock, anim_wrap = self._resolve_parameters(context)
+        (pixels, corners), transform = self._geometry(parameters, transform, anim_wrap, time, profiling.no_profiler)
+        return util.bounding_box(_four_corners(corners))
+    def _draw(self, time, canvas, aux_dir, context=None):
+        with canvas.profile.stage("resolve"):
+            parameters, transform, clock, anim_wrap = self._resolve_parameters(context)
+        (pixels, corners), transform = self._geometry(parameters, transform, anim_wrap, time, canvas.profile)
+        box = _box(canvas, _four_corners(corners))
+        if not canvas.visible(box):  return box
+        canvas.bitmap(pixels=pixels, corners=corners)
+        return box
 
 #
 # arc, arrow, star, square, rectangle
@@ -1,2 +1,5 @@
 inkscape = "inkscape"
-convert  = "convert"
+
+conversion_cache       = None     # directory in which to keep pdf conversions for reuse (None to not keep them)
+conversion_cache_bytes = 2**30    # beyond which those used least recently are deleted
+inkscape_workers       = 0        # Inkscape processes kept running for conversions (0 to start one per conversion instead)
@@ -0,0 +1,138 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   A profiler can be handed to the output methods of an entity (eg, image.svg(profile=p)), and it then records where the
+# time goes while drawing, as a tree of nodes that mirrors the composite hierarchy (one child of the root per rendering).
+# Each node holds the total time spent on that entity (including its children) and the time spent in each stage of
+# drawing it (excluding its children), which are:
+#     resolve   entity._resolve_parameters (variable substitution and transform resolution)
+#     wrap      the promotion of parameters and styles to animated properties with the clock installed
+#     sample    evaluation of the properties at the sample times (_anim_loop, etc), mapped through the transforms
+#     index     building the spatial index of a composite, or querying it for the children that meet the viewport (see spatial.py)
+#     validate  checking and normalization of the arguments to the canvas
+#     simplify  dropping the points of paths and polygons to within a distance (only if one is given to the canvas)
+#     reduce    dropping keyframes to within a tolerance (only if one is given to the canvas)
+#     codegen   the generation of image code by the renderer (including the replay of cached drawing commands, see caching.py)
+#     write     canvas.finish (assembly and writing of the file), charged to the entity being rendered
+# as well as counts of the points and keyframes passed to the canvas.  By default, drawing uses no_profiler, which does
+# nothing (quickly).
+#
+import time
+
+
+
+class _null_context(object):
+    """ a context manager that does nothing """
+    def __enter__(self):
+        return None
+    def __exit__(self, *exception):
+        return False
+
+class _no_profiler(object):
+    """ the same interface as profiler, but records nothing """
+    _null = _null_context()
+    def entity(self, entity):
+        return self._null
+    def stage(self, name):
+        return self._null
+    def count(self, **counts):
+        pass
+
+no_profiler = _no_profiler()
+
+
+
+class node(object):
+    """ the profile of one entity:  its total time (children included), time per stage (children excluded), counts, and child nodes """
+    def __init__(self, name, path):
+        self.name     = name     # eg, "circle[3]", for the 4th child of its parent
+        self.path     = path     # names of all ancestors and this node, joined by /
+        self.time     = 0.
+        self.stages   = {}
+        self.counts   = {}
+        self.children = []
+    @property
+    def self_time(self):
+        return self.time - sum(child.time for child in self.children)
+    def walk(self):
+        """ iterates over this node and all of its descendants, depth first """
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+class _timed(object):
+    """ a context manager that adds the time spent in its block, less that spent in nested blocks, to the given record """
+    def __init__(self, profiler, record):
+        self._profiler = profiler
+        self._record   = record    # function taking the (inclusive and exclusive) time
+    def __enter__(self):
+        self._profiler._nested += [0.]
+        self._start = time.perf_counter()
+    def __exit__(self, *exception):
+        elapsed = time.perf_counter() - self._start
+        nested  = self._profiler._nested.pop()
+        if self._profiler._nested:  self._profiler._nested[-1] += elapsed
+        self._record(elapsed, elapsed-nested)
+        return False
+
+class profiler(object):
+    """ records the time spent per entity and per stage of drawing, for all renderings it is handed to (see profiling.py for stages) """
+    def __init__(self):
+        self.root    = node("", "")
+        self._nodes  = [self.root]    # the entities currently being drawn, outermost first
+        self._nested = []             # time spent in the nested blocks of each block currently being timed
+    def entity(self, entity):
+        parent = self._nodes[-1]
+        name = "{}[{}]".format(type(entity).__name__, len(parent.children))
+        child = node(name, name if (parent is self.root) else "{}/{}".format(parent.path, name))
+        parent.children += [child]
+        self._nodes += [child]
+        def record(inclusive, exclusive):
+            child.time += inclusive
+            if parent is self.root:  parent.time += inclusive
+            self._nodes.pop()
+        return _timed(self, record)
+    def stage(self, name):
+        current = self._nodes[-1]
+        def record(inclusive, exclusive):
+            current.stages[name] = current.stages.get(name, 0.) + exclusive
+        return _timed(self, record)
+    def count(self, **counts):
+        current = self._nodes[-1]
+        for name,n in counts.items():
+            current.counts[name] = current.counts.get(name, 0) + n
+    def totals(self):
+        """ returns the total time for each stage and the total counts, over all entities """
+        stages, counts = {}, {}
+        for n in self.root.walk():
+            for name,t in n.stages.items():  stages[name] = stages.get(name, 0.) + t
+            for name,c in n.counts.items():  counts[name] = counts.get(name, 0)  + c
+        return stages, counts
+    def hottest(self, top=10):
+        """ returns the top nodes by time spent on the entity itself (not its children) """
+        nodes = [n for child in self.root.children for n in child.walk()]
+        return sorted(nodes, key=lambda n: n.self_time, reverse=True)[:top]
+    def report(self, top=10):
+        """ returns a table (as a string) of the top entities by time spent on the entity itself, with their stage times in ms """
+        stages = sorted({name for n in self.root.walk() for name in n.stages})
+        lines = ["{:>9s} {:>9s} {}  {:>7s} {:>9s}  {}".format("self ms", "total ms", " ".join("{:>8s}".format(s) for s in stages), "points", "keyframes", "entity")]
+        for n in self.hottest(top):
+            times = " ".join("{:8.2f}".format(1000*n.stages.get(s, 0.)) for s in stages)
+            lines += ["{:9.2f} {:9.2f} {}  {:7d} {:9d}  {}".format(1000*n.self_time, 1000*n.time, times, n.counts.get("points", 0), n.counts.get("keyframes", 0), n.path)]
+        return "\n".join(lines)
@@ -20,4 +20,7 @@ from .py      import renderer       as py
 from .svg     import renderer_full  as svg
 from .svg     import renderer_raw   as svg_raw
 from .svg     import parse_controls as parse_svg_animation_controls
-from .jpg_pdf import jpg, pdf
+from .svg     import document_output as svg_document_output
+from .jpg_pdf import pdf
+from .jpg_pdf import conversion_batch
+from .raster  import renderer       as raster
@@ -15,6 +15,8 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import math
+import numpy
 from .. import util
 
 
@@ -40,8 +42,82 @@ from .. import util
 # API (they should be both frequently used and have descriptions that are significantly more compact than what
 # is available using the present options).
 
+# Geometry of svg elliptical arcs (the way arcs are described in paths), for renderers that need more than the endpoints
+
+def arc_center(begin, end, rx, ry, phi, large, sweep):
+    """ returns the center, radii (scaled up if too small), cos and sin of phi, start angle and angle swept by an svg arc (endpoint parameterization, per the svg specification), or None if it is only a point or a line """
+    (x1, y1), (x2, y2) = begin, end
+    if (x1,y1)==(x2,y2):  return None
+    rx, ry = abs(rx), abs(ry)
+    if rx==0 or ry==0:  return None
+    cos, sin = math.cos(math.radians(phi)), math.sin(math.radians(phi))
+    dx, dy = (x1-x2)/2, (y1-y2)/2
+    x1p, y1p =  cos*dx + sin*dy, -sin*dx + cos*dy
+    lam = (x1p/rx)**2 + (y1p/ry)**2
+    if lam>1:    # radii too small to connect the points, so scale up
+        rx, ry = rx*math.sqrt(lam), ry*math.sqrt(lam)
+    num = (rx*ry)**2 - (rx*y1p)**2 - (ry*x1p)**2
+    den = (rx*y1p)**2 + (ry*x1p)**2
+    coef = math.sqrt(max(num,0)/den)
+    if large==sweep:  coef = -coef
+    cxp, cyp = coef*rx*y1p/ry, -coef*ry*x1p/rx
+    cx, cy = cos*cxp - sin*cyp + (x1+x2)/2, sin*cxp + cos*cyp + (y1+y2)/2
+    theta1 = math.atan2(( y1p-cyp)/ry, ( x1p-cxp)/rx)
+    theta2 = math.atan2((-y1p-cyp)/ry, (-x1p-cxp)/rx)
+    dtheta = theta2 - theta1
+    if   sweep and dtheta<0:      dtheta += 2*math.pi
+    elif not sweep and dtheta>0:  dtheta -= 2*math.pi
+    return (cx, cy), (rx, ry), (cos, sin), theta1, dtheta
+
+def arc_extents(begin, end, rx, ry, phi, large, sweep):
+    """ returns arrays of the x and y coordinates of the points of an svg arc that bound it (the endpoints and any extremes in x or y between them) """
+    (x1, y1), (x2, y2) = begin, end
+    x, y = [x1, x2], [y1, y2]
+    center = arc_center(begin, end, rx, ry, phi, large, sweep)
+    if center is not None:
+        (cx, cy), (rx, ry), (cos, sin), theta1, dtheta = center
+        tx = math.atan2(-ry*sin, rx*cos)    # where dx/dt = 0 (and opposite)
+        ty = math.atan2( ry*cos, rx*sin)    # where dy/dt = 0 (and opposite)
+        t = numpy.array([tx, tx+math.pi, ty, ty+math.pi])
+        t = t[numpy.mod(math.copysign(1,dtheta)*(t-theta1), 2*math.pi) <= abs(dtheta)]    # those on the arc
+        x += (cx + rx*numpy.cos(t)*cos - ry*numpy.sin(t)*sin).tolist()
+        y += (cy + rx*numpy.cos(t)*sin + ry*numpy.sin(t)*cos).tolist()
+    return numpy.array(x), numpy.array(y)
+
+
+
 class renderer(object):
     """ optional base class for image-format-specific renderers, providing some entity implementations in terms others, for convenience """
+    precision = None    # significant digits of the numbers written (None if not limited), so that the canvas can reduce keyframes accordingly
+    resolution = None    # the size of a pixel, in the units of the page (None if not fixed), so that the canvas can simplify paths accordingly
+    _fixed_viewbox = None    # set by viewport(), overriding the area found from what was drawn
+    def _adjust_boundaries(self, x, y):
+        # expects self._dims to be initialized to (xmin, xmax, ymin, ymax), in screen coordinates, by the derived class
+        xmin, xmax, ymin, ymax = self._dims
+        xmin = min(xmin, x)
+        xmax = max(xmax, x)
+        ymin = min(ymin, y)
+        ymax = max(ymax, y)
+        self._dims = xmin, xmax, ymin, ymax
+    def _extend_boundaries(self, x, y):
+        # the same as _adjust_boundaries, for arrays of x and y coordinates (eg, of all points of a primitive, over all keyframes)
+        if len(x)==0:  return
+        xmin, xmax, ymin, ymax = self._dims
+        self._dims = min(xmin, float(x.min())), max(xmax, float(x.max())), min(ymin, float(y.min())), max(ymax, float(y.max()))
+    def viewport(self, viewport):
+        # fixes the area displayed to xmin, ymin, xmax, ymax, in page coordinates (exactly, with no margin)
+        xmin, ymin, xmax, ymax = viewport
+        self._fixed_viewbox = xmin, -ymax, xmax-xmin, ymax-ymin
+    def _viewbox(self):
+        # returns min-x, min-y, width and height of the area to be displayed, given the boundaries of what was drawn
+        if self._fixed_viewbox is not None:  return self._fixed_viewbox
+        xmin, xmax, ymin, ymax = self._dims
+        Dx = xmax-xmin        #        vv- Hardcoded things should always be adjustable ... maybe in config file
+        Dy = ymax-ymin        # clean this up and the line of code below ... takes care of skinny images and adds margin
+        Dx = max(Dx, 0.05*Dy) # from https://developer.mozilla.org/en-US/docs/Web/SVG/Attribute/viewBox
+        Dy = max(Dy, 0.05*Dx) # The value of the viewBox attribute is a list of four numbers: min-x, min-y, width and height.
+        margin = 0.1          #
+        return xmin-margin*Dx, ymin-margin*Dy, Dx*(1+2*margin), Dy*(1+2*margin)
     def _line_as_path(self, lstyle, begin, end, toggle):
         fill = util.fillstyle.none()
         if self._duration is None:
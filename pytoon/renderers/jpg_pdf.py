@@ -15,13 +15,25 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import os
+import re
+import queue
+import shlex
+import atexit
+import shutil
+import hashlib
+import threading
+import subprocess
+import concurrent.futures
 from .. import util
 from .. import local  # should this move into util?
-from .  import svg
+from .svg import renderer_full    # (not "from . import svg", which finds the renderer that __init__ exports under that name)
 
 
 
-# Right now, I do not have independent renderers for pdf and jpg (or anything other than py and svg).
+# Right now, I do not have an independent renderer for pdf.  Raster formats (jpg and png) are now drawn in-process by
+# raster.py, so the jpg pseudo-renderer that was here (converting the pdf with ImageMagick) is gone, and the discussion
+# below of the jpg->pdf->svg chain is kept for the record.
 #
 # On the one hand, having them all ultimately call the svg driver is a good way to make sure we always
 # get the same output.  But, on the other hand, we have to assume that inkscape and ImageMagick are
@@ -61,16 +73,184 @@ from .  import svg
 #  script("{inkscape} -D -z --file={tmp} --export-pdf=$here/{filestem}.pdf".format(inkscape=local.inkscape, tmp=stream.name, filestem=filestem))
 #  script("rm {tmp}".format(tmp=stream.name))
 
+# The conversions are slow, so if local.conversion_cache names a directory, their outputs are kept there, in files named by
+# a hash of the svg code and of everything else that goes into the conversion (the export area and the version of Inkscape).
+# When the same svg is converted the same way again, the kept file is linked (or copied) into place instead, and its time
+# stamp is updated, so that, when the directory grows beyond local.conversion_cache_bytes, those used least recently can
+# be deleted first.  Files are moved into the directory whole, so that separate processes can share it.
+
+_versions = {}    # of the external tools (Inkscape), as reported by them (asked once per process)
+
+def _version(tool, flag):
+    if tool not in _versions:
+        try:
+            _versions[tool] = subprocess.run("{} {}".format(tool, flag), shell=True, capture_output=True, text=True, timeout=60).stdout
+        except (OSError, subprocess.SubprocessError):
+            _versions[tool] = ""
+    return _versions[tool]
+
+def _evict(directory, max_bytes):
+    # deletes the least recently used files until the total size is within max_bytes (skipping those that vanish meanwhile)
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(".partial"):  continue    # being moved in by some process
+        try:
+            info = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        entries += [(info.st_mtime, info.st_size, name)]
+    total = sum(size for _,size,_ in entries)
+    for _,size,name in sorted(entries):
+        if total<=max_bytes:  break
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+        total -= size
+
+def _cached_conversion(convert, source, target, options):
+    # runs the conversion of the svg file source to the file target, unless the same conversion is in the cache
+    directory = local.conversion_cache
+    with open(source, "rb") as svg_file:
+        key = hashlib.sha256(svg_file.read())
+    key.update(repr(options).encode())
+    kept = os.path.join(directory, "{}{}".format(key.hexdigest(), os.path.splitext(target)[1]))
+    if os.path.exists(target):  os.remove(target)    # not written through, in case it is a link to a kept file
+    if os.path.exists(kept):
+        os.remove(source)    # as the script would
+        try:
+            os.link(kept, target)
+        except OSError:
+            shutil.copyfile(kept, target)
+        os.utime(kept)
+        return
+    convert()
+    if not os.path.exists(target):  return    # conversion failed (it will have said why)
+    os.makedirs(directory, exist_ok=True)
+    partial = "{}.{}.partial".format(kept, os.getpid())
+    shutil.copyfile(target, partial)
+    os.replace(partial, kept)
+    _evict(directory, local.conversion_cache_bytes)
+
+
+# Starting Inkscape takes seconds, so if local.inkscape_workers is more than zero, up to that many Inkscape processes are
+# started in shell mode as they are needed, and kept for the rest of the session, with the conversions sent to them one
+# after another (instead of starting Inkscape for each one, by a script).  Inside of a conversion_batch, the conversions
+# are not done as each image is finished, but all together at the end of it, spread over the workers.  Any program that
+# answers to --version and speaks the shell mode of Inkscape 0.92 (or the actions of 1.x, depending on the version it
+# reports) can stand in for Inkscape (see tests/inkscape_stub.py).
+
+class _inkscape_shell(object):
+    """ a long-lived Inkscape process in shell mode, to which conversions of svg files to pdf are sent one at a time """
+    def __init__(self):
+        major = re.search(r"Inkscape\s+(\d+)", _version(local.inkscape, "--version"))
+        self._actions = (major is not None) and (int(major.group(1))>=1)    # Inkscape 1.x takes actions, rather than command-line options
+        self._process = subprocess.Popen("exec {} --shell".format(local.inkscape), shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._prompt()
+    _prompts = b">", b"> "    # as written by Inkscape 0.92 and 1.x, at the start of a line
+    def _prompt(self):
+        # waits for the prompt that says that the previous command is done (not just any output ending in ">", like a tag in a warning)
+        output = b""
+        while not any((output==prompt) or output.endswith(b"\n"+prompt) for prompt in self._prompts):
+            chunk = os.read(self._process.stdout.fileno(), 4096)
+            if not chunk:  raise RuntimeError("the Inkscape shell exited unexpectedly")
+            output += chunk
+    def pdf(self, source, target, area):
+        source, target = os.path.abspath(source), os.path.abspath(target)    # the process keeps the working directory it started in
+        if self._actions:
+            area = "export-area-page" if (area=="-C") else "export-area-drawing"
+            command = "file-open:{}; {}; export-filename:{}; export-do; file-close".format(source, area, target)
+        else:
+            command = "{} {} --export-pdf={}".format(shlex.quote(source), area, shlex.quote(target))
+        self._process.stdin.write((command+"\n").encode())
+        self._process.stdin.flush()
+        self._prompt()
+    def close(self):
+        try:
+            self._process.stdin.write(b"quit\n")
+            self._process.stdin.close()
+        except OSError:
+            pass    # already gone
+        self._process.wait()
+
+_idle_shells = queue.Queue()
+_shells_lock = threading.Lock()
+_shells      = []    # all that are running
+
+def _with_shell(work):
+    # calls work with an idle Inkscape shell, starting one if fewer than local.inkscape_workers are running (otherwise waiting for one)
+    with _shells_lock:
+        if _idle_shells.empty() and (len(_shells)<local.inkscape_workers):
+            shell = _inkscape_shell()
+            _shells.append(shell)
+            _idle_shells.put(shell)
+    shell = _idle_shells.get()
+    try:
+        work(shell)
+    except Exception:
+        with _shells_lock:
+            if shell in _shells:  _shells.remove(shell)    # possibly broken, so replaced when next needed
+        shell.close()
+        raise
+    _idle_shells.put(shell)
+
+@atexit.register
+def _close_shells():
+    with _shells_lock:
+        while not _idle_shells.empty():  _idle_shells.get()
+        while _shells:  _shells.pop().close()
+
+_batch = None    # conversions deferred to the end of the current conversion_batch (if any)
+
+class conversion_batch(object):
+    """ a context in which pdf conversions are deferred to its end, to be spread over the Inkscape workers (see local.inkscape_workers) """
+    def __enter__(self):
+        global _batch
+        self._outer = _batch is not None    # nested batches join the outer one
+        if not self._outer:  _batch = {}    # by output file, since a later image with the same filestem replaces the svg file of an earlier one
+        return self
+    def __exit__(self, *exception):
+        global _batch
+        if self._outer:  return False
+        jobs, _batch = list(_batch.values()), None
+        if exception[0] is None:
+            threads = min(local.inkscape_workers, len(jobs)) or 1    # scripts cannot run side by side (see util.shell)
+            with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+                list(pool.map(lambda job: job(), jobs))    # raises the first exception, if any
+        return False
+
+def _worker_pdf(filestem, area):
+    # converts filestem.svg to filestem.pdf in an Inkscape shell, removing the svg file (as the scripts do)
+    if os.path.exists("{}.pdf".format(filestem)):  os.remove("{}.pdf".format(filestem))    # so that a failure is noticed
+    _with_shell(lambda shell: shell.pdf("{}.svg".format(filestem), "{}.pdf".format(filestem), area))
+    if not os.path.exists("{}.pdf".format(filestem)):  raise RuntimeError("Inkscape did not convert {}.svg".format(filestem))
+    os.remove("{}.svg".format(filestem))
+
 class _pseudo_renderer(object):
     """ class to resolve and buffer the drawing calls into svg code and then convert to target format """
-    def __init__(self, svg_renderer, conversion_script):
-        self._svg_renderer      = svg_renderer
-        self._conversion_script = conversion_script
+    def __init__(self, svg_renderer, filestem, conversion):
+        self._svg_renderer = svg_renderer
+        self._filestem     = filestem
+        self._conversion   = conversion    # function of the Inkscape export-area option
+        self._export_area  = "-D"          # the drawing, unless a viewport fixes the page
     def finish(self):
         self._svg_renderer.finish()
-        self._conversion_script.run()
+        area = self._export_area
+        convert = lambda: self._conversion(area)
+        if local.conversion_cache is not None:
+            source, target = "{}.svg".format(self._filestem), "{}.pdf".format(self._filestem)
+            options = area, local.inkscape, _version(local.inkscape, "--version")
+            convert = lambda convert=convert: _cached_conversion(convert, source, target, options)
+        if _batch is None:
+            convert()
+        else:
+            _batch.pop(self._filestem, None)
+            _batch[self._filestem] = convert
     def background(self, background):
         self._svg_renderer.background(background)
+    def viewport(self, viewport):
+        self._svg_renderer.viewport(viewport)
+        self._export_area = "-C"
     def duration(self, duration):
         raise RuntimeError("target file format does not support animation")
     def path(self, lstyle, fstyle, points, toggle):
@@ -85,21 +265,18 @@ class _pseudo_renderer(object):
         self._svg_renderer.arc(lstyle, fstyle, begin, end, radius, skew, toggle)
     def circle(self, lstyle, fstyle, center, radius, toggle):
         self._svg_renderer.circle(lstyle, fstyle, center, radius, toggle)
+    def bitmap(self, pixels, corners, toggle):
+        self._svg_renderer.bitmap(pixels, corners, toggle)
 
 def pdf(filestem):
     """ returns a pseudo-renderer class to resolve and buffer the drawing calls into pdf format (via svg using Inkscape) """
-    script = util.shell.bash()
-    script("here=`pwd`")
-    script("{inkscape} -D -z --file=$here/{filestem}.svg --export-pdf=$here/{filestem}.pdf".format(inkscape=local.inkscape, filestem=filestem))
-    script("rm $here/{filestem}.svg".format(filestem=filestem))
-    return _pseudo_renderer(svg.renderer_full(filestem, title="", controls=None), script)
-
-def jpg(filestem, *, dpi):
-    """ returns a pseudo-renderer class to resolve and buffer the drawing calls into jpg format (via svg and pdf using Inkscape and ImageMagick) """
-    script = util.shell.bash()
-    script("here=`pwd`")
-    script("{inkscape} -D -z --file=$here/{filestem}.svg --export-pdf=$here/{filestem}.pdf".format(inkscape=local.inkscape, filestem=filestem))
-    script("rm {filestem}.svg".format(filestem=filestem))
-    script("{convert} -density {dpi} {filestem}.pdf {filestem}.jpg".format(convert=local.convert, filestem=filestem, dpi=dpi))
-    script("rm {filestem}.pdf".format(filestem=filestem))
-    return _pseudo_renderer(svg.renderer_full(filestem, title="", controls=None), script)
+    def conversion(area):
+        if local.inkscape_workers:
+            _worker_pdf(filestem, area)
+            return
+        script = util.shell.bash()
+        script("here=`pwd`")
+        script("{inkscape} {area} -z --file=$here/{filestem}.svg --export-pdf=$here/{filestem}.pdf".format(inkscape=local.inkscape, area=area, filestem=filestem))
+        script("rm $here/{filestem}.svg".format(filestem=filestem))
+        script.run()
+    return _pseudo_renderer(renderer_full(filestem, title="", controls=None), filestem, conversion)
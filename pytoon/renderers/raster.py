@@ -0,0 +1,299 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import math
+import numpy
+from ..util import raster_code
+from .      import base
+
+
+
+#   A renderer that rasterizes line art in-process, into a NumPy RGBA buffer, and encodes png or jpg files directly,
+# instead of going through svg, pdf and external programs (see jpg_pdf.py).  The picture is meant to be the same one
+# that the svg renderer describes:  the same viewbox (so also the same margins), the same arc conventions, and one svg
+# user unit per css pixel (96 per inch).  Curves are flattened to polylines, strokes are turned into polygons (butt caps
+# and miter joins, as svg defaults), and everything is filled with the nonzero winding rule, sampled several times per
+# pixel in each direction for anti-aliasing.
+
+
+
+### Some local utilities
+
+_map_displacement = lambda x,y: (x,-y)    # Screen coordinates are upside-down, relative to how mathematicians and physical scientists think, ...
+_map_rotation     = lambda a:   -a        # ... and, consequently, so is the sense/sign of rotation.
+_supersampling    = 4                     # samples per pixel in each direction
+_tolerance        = 0.1                   # largest deviation (in pixels) of flattened curves from the true ones
+_miter_limit      = 4                     # svg default
+
+def _rgba(color):
+    """ converts a color structure (#RRGGBB code and alpha) to a 4-tuple of floats between 0 and 1 """
+    rgb = color.rgb
+    a = 1 if (color.a is None) else color.a
+    return int(rgb[1:3],16)/255, int(rgb[3:5],16)/255, int(rgb[5:7],16)/255, a
+
+def _arc_steps(radius, angle, scale):
+    """ number of line segments needed to follow an arc of the given radius (user units) through the given angle (radians) """
+    r = radius * scale
+    if r<=_tolerance:  return 1
+    step = 2 * math.acos(1 - _tolerance/r)
+    return max(1, min(math.ceil(abs(angle)/step), 10000))
+
+def _arc_points(begin, end, rx, ry, phi, large, sweep, scale):
+    """ returns the points (after begin) along an svg elliptical arc, following the svg specification for endpoint parameterization """
+    if begin==end:  return []
+    center = base.arc_center(begin, end, rx, ry, phi, large, sweep)
+    if center is None:  return [end]
+    (cx, cy), (rx, ry), (cos, sin), theta1, dtheta = center
+    N = _arc_steps(max(rx,ry), dtheta, scale)
+    t = theta1 + dtheta * numpy.arange(1,N) / N
+    x = cx + rx*numpy.cos(t)*cos - ry*numpy.sin(t)*sin
+    y = cy + rx*numpy.cos(t)*sin + ry*numpy.sin(t)*cos
+    return list(zip(x.tolist(), y.tolist())) + [end]
+
+def _oriented(polygons):
+    """ takes an (N,V,2) array of polygons and returns an (N*V,4) array of their edges, with all polygons turned counter-clockwise, so that they add under the nonzero rule """
+    x, y = polygons[...,0], polygons[...,1]
+    area = (x*numpy.roll(y,-1,axis=1) - numpy.roll(x,-1,axis=1)*y).sum(axis=1)
+    polygons = numpy.where((area<0)[:,None,None], polygons[:,::-1], polygons)
+    return numpy.concatenate((polygons, numpy.roll(polygons,-1,axis=1)), axis=2).reshape(-1,4)
+
+def _edges(points):
+    """ returns the (N,4) array of edges of a polygon given as an (N,2) array of points (implicitly closed) """
+    return numpy.concatenate((points, numpy.roll(points,-1,axis=0)), axis=1)
+
+def _stroke(points, closed, half_width):
+    """ returns the edges of the polygons that make up the stroke of a polyline, given as an (N,2) array of points """
+    keep = numpy.concatenate(([True], (numpy.diff(points,axis=0)!=0).any(axis=1)))
+    points = points[keep]
+    if len(points)<2:  return numpy.zeros((0,4))
+    if closed:
+        if (points[0]!=points[-1]).any():  points = numpy.concatenate((points, points[:1]))
+        points = numpy.concatenate((points, points[1:2]))    # wrap around once, so that there is a join at the closing point
+    delta  = numpy.diff(points, axis=0)
+    unit   = delta / numpy.hypot(delta[:,0], delta[:,1])[:,None]
+    normal = half_width * numpy.stack((-unit[:,1], unit[:,0]), axis=1)
+    a, b = points[:-1], points[1:]
+    pieces = [_oriented(numpy.stack((a+normal, b+normal, b-normal, a-normal), axis=1))]
+    if len(points)>2:
+        n1, n2 = normal[:-1], normal[1:]
+        p = points[1:-1]
+        turn = unit[:-1,0]*unit[1:,1] - unit[:-1,1]*unit[1:,0]
+        outer = -numpy.sign(turn)[:,None]    # side of the join that needs filling in
+        cosine = (n1*n2).sum(axis=1) / half_width**2
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            miter = (n1+n2) / (1+cosine)[:,None]
+        mitered = (1+cosine) >= 2/_miter_limit**2    # otherwise, bevel (ie, the miter point is just the midpoint)
+        miter = numpy.where(mitered[:,None], miter, (n1+n2)/2)
+        joins = numpy.stack((p, p+outer*n1, p+outer*miter, p+outer*n2), axis=1)
+        pieces += [_oriented(joins[turn!=0])]
+    return numpy.concatenate(pieces)
+
+def _dashes(points, pattern):
+    """ cuts a polyline, given as an (N,2) array of points, into a list of the polylines that make up the dashes """
+    lengths = numpy.hypot(*numpy.diff(points,axis=0).T)
+    s = numpy.concatenate(([0], numpy.cumsum(lengths)))
+    total, period = s[-1], sum(pattern)
+    dashes = []
+    for k in range(int(total//period)+1):
+        start = k*period
+        for on,off in zip(pattern[0::2], pattern[1::2]):
+            a, b = start, min(start+on, total)
+            if a<b:
+                inner = (s>a) & (s<b)
+                x = numpy.concatenate(([numpy.interp(a,s,points[:,0])], points[inner,0], [numpy.interp(b,s,points[:,0])]))
+                y = numpy.concatenate(([numpy.interp(a,s,points[:,1])], points[inner,1], [numpy.interp(b,s,points[:,1])]))
+                dashes += [numpy.stack((x,y), axis=1)]
+            start += on + off
+    return dashes
+
+def _bytes(channels):
+    """ converts an array of channel intensities between 0 and 1 to 8-bit integers """
+    return numpy.rint(255*numpy.clip(channels,0,1)).astype(numpy.uint8)
+
+def _coverage(edges, width, height):
+    """ returns the row and column offsets and the (anti-aliased) coverage of the pixels inside the given edges (in pixel units) by the nonzero rule """
+    ss = _supersampling
+    edges = edges[edges[:,1]!=edges[:,3]]    # horizontal edges do not cross any sampling rows
+    if len(edges)==0:  return None
+    x0, y0, x1, y1 = edges.T
+    ja = numpy.clip(numpy.ceil(numpy.minimum(y0,y1)*ss - 0.5), 0, height*ss).astype(int)    # sampling row j is at height (j+1/2)/ss
+    jb = numpy.clip(numpy.ceil(numpy.maximum(y0,y1)*ss - 0.5), 0, height*ss).astype(int)
+    count = jb - ja
+    total = count.sum()
+    if total==0:  return None
+    e = numpy.repeat(numpy.arange(len(edges)), count)
+    j = numpy.repeat(ja, count) + numpy.arange(total) - numpy.repeat(numpy.cumsum(count)-count, count)
+    x = x0[e] + ((j+0.5)/ss - y0[e]) * (x1[e]-x0[e]) / (y1[e]-y0[e])
+    i = numpy.clip(numpy.floor(x*ss - 0.5).astype(int) + 1, 0, width*ss)    # first sampling column to the right of the crossing
+    r0, r1 = j.min()//ss, j.max()//ss + 1
+    c0, c1 = i.min()//ss, min(-(-i.max()//ss), width)
+    if c0>=c1:  return None
+    winding = numpy.zeros(((r1-r0)*ss, (c1-c0)*ss+1), dtype=numpy.int16)
+    numpy.add.at(winding, (j-r0*ss, i-c0*ss), numpy.where(y1>y0, 1, -1).astype(numpy.int16)[e])
+    inside = (numpy.cumsum(winding, axis=1, dtype=numpy.int16)[:,:-1] != 0)
+    return r0, c0, inside.reshape(r1-r0, ss, c1-c0, ss).mean(axis=(1,3), dtype=numpy.float32)
+
+
+
+### Painting onto a canvas of premultiplied RGBA (float) channels, given in pixel coordinates
+
+def _paint_polygons(canvas, edges, color):
+    """ composites a solid color over the canvas, weighted by the coverage of the polygons with the given edges """
+    height, width, _ = canvas.shape
+    coverage = _coverage(edges, width, height)
+    if coverage is not None:
+        r0, c0, amount = coverage
+        r, g, b, a = color
+        alpha = (a*amount)[...,None]
+        region = canvas[r0:r0+amount.shape[0], c0:c0+amount.shape[1]]
+        region *= 1 - alpha
+        region += alpha * numpy.array((r,g,b,1), dtype=numpy.float32)
+
+def _paint_bitmap(canvas, pixels, corners):
+    """ composites an RGBA array over the canvas, with bilinear resampling onto the parallelogram given by its top-left, top-right and bottom-left corners """
+    height, width, _ = canvas.shape
+    (x0, y0), (x1, y1), (x2, y2) = corners
+    x, y = numpy.array((x0, x1, x2, x1+x2-x0)), numpy.array((y0, y1, y2, y1+y2-y0))
+    r0, r1 = max(0, math.floor(y.min())), min(height, math.ceil(y.max()))
+    c0, c1 = max(0, math.floor(x.min())), min(width,  math.ceil(x.max()))
+    if (r0>=r1) or (c0>=c1):  return
+    forward = numpy.array([[x1-x0, x2-x0], [y1-y0, y2-y0]])
+    if abs(numpy.linalg.det(forward))<1e-12:  return    # degenerate placement covers nothing
+    py, px = numpy.mgrid[r0:r1, c0:c1] + 0.5            # canvas pixel centers
+    u, v = numpy.tensordot(numpy.linalg.inv(forward), numpy.stack((px-x0, py-y0)), axes=1)
+    inside = (u>=0) & (u<1) & (v>=0) & (v<1)
+    rows, cols, _ = pixels.shape
+    s = numpy.clip(u*cols - 0.5, 0, cols-1)             # texel coordinates (centers at half-integers)
+    t = numpy.clip(v*rows - 0.5, 0, rows-1)
+    i, j = s.astype(int), t.astype(int)
+    i1, j1 = numpy.minimum(i+1, cols-1), numpy.minimum(j+1, rows-1)
+    fs, ft = (s-i)[...,None], (t-j)[...,None]
+    texels = pixels.astype(numpy.float32) / 255
+    texels[...,:3] *= texels[...,3:]                    # interpolate premultiplied colors
+    sample = (texels[j,i]*(1-fs) + texels[j,i1]*fs)*(1-ft) + (texels[j1,i]*(1-fs) + texels[j1,i1]*fs)*ft
+    sample *= inside[...,None]
+    region = canvas[r0:r1, c0:c1]
+    region *= 1 - sample[...,3:]
+    region += sample
+
+
+
+### The renderer
+
+class renderer(base.renderer):
+    """ class to resolve and buffer the drawing calls, and then rasterize them into png or jpg format (returning the file contents if no filestem given), or just an RGBA array """
+    def __init__(self, filestem, *, dpi, image_format, quality=90):
+        self._filestem   = filestem
+        self._format     = image_format    # "png", "jpg", or "rgba" (returns an (H,W,4) array of 8-bit channels, rows from the top)
+        self._quality    = quality
+        self._scale      = dpi / 96        # pixels per svg user unit
+        self.resolution  = 1 / self._scale
+        self._shapes     = []              # functions that paint onto the canvas, given its origin (in screen coordinates)
+        self._dims       = 0, 0, 0, 0      # xmin, xmax, ymin, ymax (in screen coordinates)
+        self._duration   = None
+        self._background = None
+    def finish(self):
+        xmin, ymin, Dx, Dy = self._viewbox()
+        width, height = max(1, math.ceil(Dx*self._scale)), max(1, math.ceil(Dy*self._scale))
+        canvas = numpy.zeros((height, width, 4), dtype=numpy.float32)    # premultiplied alpha
+        if self._background is not None:
+            r, g, b, a = self._background
+            canvas[...] = (r*a, g*a, b*a, a)
+        for paint in self._shapes:
+            paint(canvas, (xmin, ymin))
+        alpha = canvas[...,3:]
+        if self._format=="jpg":
+            rgb = canvas[...,:3] + (1-alpha)    # over white
+            return self._output(raster_code.jpg(_bytes(rgb), self._quality))
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            rgb = numpy.where(alpha>0, canvas[...,:3]/alpha, 0)
+        pixels = _bytes(numpy.concatenate((rgb, alpha), axis=2))
+        if   self._format=="png":   return self._output(raster_code.png(pixels))
+        elif self._format=="rgba":  return pixels
+        else:                       raise ValueError("unknown raster format: {}".format(self._format))
+    def _output(self, code):
+        if self._filestem is None:
+            return code
+        else:
+            with open("{}.{}".format(self._filestem, self._format), "wb") as stream:
+                stream.write(code)
+    def background(self, background):
+        if background.rgb!="none":
+            self._background = _rgba(background)
+    def duration(self, duration):
+        raise RuntimeError("target file format does not support animation")
+    def path(self, lstyle, fstyle, points, toggle):
+        x, y = self._parse_point(points[0])
+        polyline = [(x, y)]
+        for pt in points[1:]:
+            if len(pt)==2:
+                x, y = self._parse_point(pt)
+                polyline += [(x, y)]
+            else:
+                x0, y0 = x, y
+                x, y, p = pt
+                x, y = self._parse_point((x, y))
+                if p.curve=="arc":
+                    skew = _map_rotation(p.skew) + math.atan2(y-y0, x-x0) * 180/math.pi
+                    polyline += _arc_points((x0,y0), (x,y), p.rx, p.ry, skew, 0, int(p.rx<0), self._scale)
+                    self._extend_boundaries(*base.arc_extents((x0,y0), (x,y), p.rx, p.ry, skew, 0, int(p.rx<0)))
+                else:
+                    raise NotImplementedError(str(p.curve))    # p.curve should already be a string, but just in case
+        self._add_shape(lstyle, fstyle, numpy.array(polyline, dtype=float), closed=False)
+    def image(self, filename, size, position, rotate, toggle):
+        raise NotImplementedError("placement of image files is not yet supported by the raster renderer")
+    def line(self, lstyle, begin, end, toggle):
+        return self._line_as_path(lstyle, begin, end, toggle)
+    def polygon(self, lstyle, fstyle, points, toggle):
+        return self._polygon_as_path(lstyle, fstyle, points, toggle)
+    def arc(self, lstyle, fstyle, begin, end, radius, skew, toggle):
+        return self._arc_as_path(lstyle, fstyle, begin, end, radius, skew, toggle)
+    def circle(self, lstyle, fstyle, center, radius, toggle):
+        x, y = self._parse_point(center)
+        self._adjust_boundaries(x+radius, y+radius)
+        self._adjust_boundaries(x-radius, y-radius)
+        N = _arc_steps(radius, 2*math.pi, self._scale)
+        t = 2*math.pi * numpy.arange(N) / N
+        self._add_shape(lstyle, fstyle, numpy.stack((x + radius*numpy.cos(t), y + radius*numpy.sin(t)), axis=1), closed=True)
+    def bitmap(self, pixels, corners, toggle):
+        corners = [self._parse_point(corner) for corner in corners]
+        (x0, y0), (x1, y1), (x2, y2) = corners
+        self._adjust_boundaries(x1+x2-x0, y1+y2-y0)    # fourth corner
+        to_pixels = lambda origin: [((x-origin[0])*self._scale, (y-origin[1])*self._scale) for x,y in corners]
+        self._shapes += [lambda canvas, origin: _paint_bitmap(canvas, pixels, to_pixels(origin))]
+    def _parse_point(self, point):
+        x, y = _map_displacement(*point)
+        self._adjust_boundaries(x, y)
+        return x, y
+    def _add_shape(self, lstyle, fstyle, polyline, closed):
+        layers = []
+        if fstyle.fill=="solid":
+            if (fstyle.color.rgb!="none") and (fstyle.color.a!=0):
+                layers += [(_edges(polyline), _rgba(fstyle.color))]
+        elif fstyle.fill!="none":
+            raise NotImplementedError("gradient fills are not yet supported by the raster renderer")
+        if (lstyle.color.rgb!="none") and (lstyle.color.a!=0) and (lstyle.weight!=0):
+            if len(lstyle.dash)==0:
+                pieces = [_stroke(polyline, closed, lstyle.weight/2)]
+            else:
+                pieces = [_stroke(dash, False, lstyle.weight/2) for dash in _dashes(polyline, [d*lstyle.weight for d in lstyle.dash])]
+            layers += [(numpy.concatenate([numpy.zeros((0,4))] + pieces), _rgba(lstyle.color))]
+        def paint(canvas, origin):
+            origin = numpy.array(origin * 2)
+            for edges,color in layers:
+                _paint_polygons(canvas, (edges-origin)*self._scale, color)
+        self._shapes += [paint]
@@ -16,8 +16,12 @@
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import io
+import gzip
 import math
-from ..util import struct, float_eq, svg_code, js_code, image_file
+import base64
+import tempfile
+import numpy
+from ..util import struct, float_eq, linestyle, svg_code, js_code, raster_code, image_file, eased_keyframes
 from .      import base
 
 
@@ -27,6 +31,100 @@ from .      import base
 _map_displacement = lambda x,y: (x,-y)                # Screen coordinates are upside-down, relative to how mathematicians and physical scientists think, ...
 _map_rotation     = lambda a:   -a                    # ... and, consequently, so is the sense/sign of rotation.
 _flt              = lambda x:   "" if (x is None) else "{:.5g}".format(x)    # defend file size against absurd precision
+_spool_size       = 2**24                                                    # characters of image code held in memory before the buffer spills to disk
+_gzip_level       = 9                                                        # compression level for svgz output if compress=True (gzip's default)
+_instance_points  = 6                                                        # static paths with fewer points are not worth drawing as instances
+_instance_scale   = 10                                                       # nor are those much larger than the definition (see _instance)
+_image_marker     = "<!-- pytoon image code -->\n"                           # stands in for the image code when the surrounding document is formatted
+_held_marker      = "<!-- pytoon held shape {} -->\n"                        # stands in for a shape until it is known whether its style is shared
+
+# Output profiles trade precision for size.  Lengths (coordinates, radii, line weights) are rounded to a resolution given as
+# a fraction of the size of the image, or written exactly (shortest round-trip repr) if None.  Since the code is streamed
+# as it is drawn, the size is that of what was drawn so far, which only grows, so the resolution is never coarser than
+# promised.  Path data also drops redundant separators and repeated command letters, and, if relative, uses relative
+# commands where shorter (only for static paths, since animated path data must keep the same commands throughout).
+# With no profile (None), numbers are written to 5 significant digits, as they always were.
+_encodings = {
+    "compact": struct(resolution=1e-4, relative=True),     # well below a pixel on any screen
+    "print":   struct(resolution=1e-5, relative=True),     # for large prints
+    "exact":   struct(resolution=None, relative=False),    # lossless
+}
+
+def _decimal(x, places):
+    # the shortest text for x rounded to the given number of decimal places (or exactly if None), eg, "-.5" for -0.5
+    text = repr(float(x)) if (places is None) else "{:.{}f}".format(x, places)
+    if ("." in text) and ("e" not in text):  text = text.rstrip("0").rstrip(".")
+    if   text.startswith("0."):   text = text[1:]
+    elif text.startswith("-0."):  text = "-" + text[2:]
+    return "0" if (text in ("-0", "")) else text
+
+def _path_code(commands):
+    # joins (letter, numbers) commands into path data, leaving out repeated letters and any separator that is not needed
+    code, current, previous = "", None, None
+    for letter,numbers in commands:
+        if letter!=current:
+            code += letter
+            previous = None
+        for number in numbers:
+            if (previous is not None) and not (number[0]=="-" or (number[0]=="." and "." in previous and "e" not in previous)):
+                code += " "
+            code += number
+            previous = number
+        current = {"M":"L", "m":"l"}.get(letter, letter)    # implied letter for the next command
+    return code
+
+class _spool(object):
+    """ a text buffer that is held in memory until it grows large, and then spills over into a temporary file """
+    def __init__(self, max_size):
+        self._buffer   = io.StringIO()
+        self._size     = 0
+        self._max_size = max_size
+    def write(self, text):
+        self._size += len(text)
+        if (self._size>self._max_size) and isinstance(self._buffer, io.StringIO):
+            spilled = tempfile.TemporaryFile(mode="w+", newline="\n")
+            spilled.write(self._buffer.getvalue())
+            self._buffer = spilled
+        self._buffer.write(text)
+    def lines(self):
+        self._buffer.seek(0)
+        return self._buffer    # iterates over lines
+    def close(self):
+        self._buffer.close()
+
+def _compression_level(compress):
+    # the gzip level for the compress argument of svg output (None for uncompressed)
+    if (compress is None) or (compress is False):  return None
+    if compress is True:                           return _gzip_level
+    if (not isinstance(compress, int)) or not (0<=compress<=9):
+        raise ValueError("svg compress must be True, False/None, or a gzip level from 0 to 9: {}".format(repr(compress)))
+    return compress
+
+class document_output(object):
+    """ opens a text stream that writes an svg document to filestem.svg (.svgz if compressed), to a given stream, or into memory if neither, gzipping it as it is written if asked """
+    def __init__(self, filestem, *, stream=None, compress=None):
+        self._filestem = filestem
+        self._stream   = stream
+        self._level    = _compression_level(compress)    # checked before anything is drawn
+        self._memory   = None
+        self._closing  = []    # innermost first
+    def open(self):
+        level, stream, filestem = self._level, self._stream, self._filestem
+        if stream is None:
+            if filestem is None:
+                stream = self._memory = io.StringIO() if (level is None) else io.BytesIO()
+            else:
+                stream = open("{}.{}".format(filestem, "svg" if (level is None) else "svgz"), "w" if (level is None) else "wb")
+                self._closing += [stream]
+        if level is not None:    # a given stream must then be binary
+            stream = gzip.GzipFile(filename="", mode="wb", fileobj=stream, compresslevel=level, mtime=0)    # no time stamp, so that output is reproducible
+            stream = io.TextIOWrapper(stream, encoding="utf-8", newline="\n")
+            self._closing = [stream] + self._closing    # closes the gzip stream as well (but not the underlying one)
+        return stream
+    def close(self):
+        """ finishes the output, returning the document (str, or gzipped bytes) if held in memory, otherwise None """
+        for stream in self._closing:  stream.close()
+        return None if (self._memory is None) else self._memory.getvalue()
 
 def _same(values, compare):
     value = values[0]
@@ -37,16 +135,23 @@ def _same(values, compare):
     else:
         return all(equal)
 
-def _compress(animated, floats=False):
+def _compress(animated, floats=False, string=None):
+    # frames may carry the keySpline of the segment that ends there as a third component (see renderer_base._eased)
     compare = float_eq if floats else lambda a,b: a==b
-    string  = _flt if floats else str
-    times, values = zip(*animated)
+    string  = (_flt if floats else str) if (string is None) else string
+    times, values, *splines = zip(*animated)
     times = [_flt(t) for t in times]
     if _same(values, compare):
         return [(None, string(values[0]))]
     else:
         values = [string(v) for v in values]
-        return list(zip(times,values))
+        return list(zip(times,values,*splines))
+
+def _spline(controls):
+    # the svg keySpline for the easing control values from util.eased_keyframes (None for linear)
+    if controls is None:  return None
+    y1, y2 = controls
+    return "0.33333 {} 0.66667 {}".format(_flt(y1), _flt(y2))
 
 
 
@@ -92,23 +197,41 @@ def parse_controls(controls):
 
 class renderer_base(base.renderer):
     """ base class to resolve and buffer the drawing calls into svg code """
-    def __init__(self):
-        self._main     = ""
-        self._defs     = ""
-        self._def_id   = 0
-        self._dims     = 0, 0, 0, 0    # xmin, xmax, ymin, ymax (in screen coordinates)
-        self._duration = None
+    precision = 5    # as written by _flt
+    def __init__(self, sink, encoding=None):
+        self._main      = sink    # file-like object that receives image code as it is drawn
+        self._defs      = ""
+        self._def_id    = 0
+        self._dims      = 0, 0, 0, 0    # xmin, xmax, ymin, ymax (in screen coordinates)
+        self._duration  = None
+        self._tolerance = None
+        if (encoding is not None) and (encoding not in _encodings):
+            raise ValueError("svg encoding must be one of {}: {}".format(", ".join(_encodings), repr(encoding)))
+        self._encoding  = None if (encoding is None) else _encodings[encoding]
+        self._classes   = None    # maps static styles to css class names (if used, see _styled)
+        self._held      = None    # maps static styles to the first shapes drawn with them (if classes are used)
+        self._symbols   = None    # maps normalized geometry to the ids of its definitions (if used, see _instance)
+        if (self._encoding is not None) and (self._encoding.resolution is None):  self.precision = None
     def duration(self, duration):
         if duration is None:  self._assert_no_controls()
         self._duration = duration
+    def tolerance(self, tolerance):
+        self._tolerance = tolerance    # for fitting spline easing to keyframes
     def path(self, lstyle, fstyle, points, toggle):
+        self._bound_path(points)
+        instance = self._instance(points)
+        if instance is not None:
+            identifier, scale, transform = instance
+            lstyle = linestyle(lstyle, weight=lstyle.weight/scale)    # the stroke is scaled along with the geometry (dashes go with the weight)
+            self._styled(lambda style, css_class: svg_code.use(identifier, transform, *style, css_class), *self._parse_line(lstyle), *self._parse_fill(fstyle))
+            return
         line_rgb, line_alpha, line_weight, line_dash = self._parse_line(lstyle)
         fill_rgb, fill_alpha = self._parse_fill(fstyle)
         if self._duration is None:
             points = self._parse_points(points)
         else:
-            points = [(_flt(t),self._parse_points(pts)) for t,pts in points]
-        self._main += svg_code.path(points, line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha, self._duration)
+            points = [(_flt(t),self._parse_points(pts),*spline) for t,pts,*spline in self._eased(points)]
+        self._styled(lambda style, css_class: svg_code.path(points, *style, self._duration, css_class), line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha)
     def image(self, filename, size, position, rotate, toggle):
         img = image_file(filename)
         x, y = position
@@ -118,7 +241,7 @@ class renderer_base(base.renderer):
         x0, y0 = _map_displacement(x0, y0)
         dx, dy = _map_displacement(dx, dy)
         rotate = _map_rotation(rotate)
-        self._main += svg_code.image(img.filename, xsize, ysize, rotate, x0, y0, dx, dy)
+        self._main.write(svg_code.image(img.filename, xsize, ysize, rotate, x0, y0, dx, dy))
         self._adjust_boundaries(x, y)    # is this right?
     def line(self, lstyle, begin, end, toggle):
         return self._line_as_path(lstyle, begin, end, toggle)
@@ -135,30 +258,178 @@ class renderer_base(base.renderer):
             center_x, center_y = self._parse_point(center)
             self._adjust_boundaries(center_x+radius, center_y+radius)
             self._adjust_boundaries(center_x-radius, center_y-radius)
-            radius = _flt(radius)
-            center_x, center_y = _flt(center_x), _flt(center_y)
+            length = self._length_format()
+            radius = length(radius)
+            center_x, center_y = length(center_x), length(center_y)
         else:
-            # minor bug here since boundaries never adjusted (user can always put in phantom polygon)
-            radius = _compress(radius, floats=True)
-            times, centers = zip(*center)
-            centers = [self._parse_point(ctr) for ctr in centers]
-            center_x, center_y = zip(*centers)
-            center_x = _compress(list(zip(times,center_x)), floats=True)
-            center_y = _compress(list(zip(times,center_y)), floats=True)
-        self._main += svg_code.circle(center_x, center_y, radius, line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha, self._duration)
+            centers = numpy.array([_map_displacement(*ctr) for _,ctr in center], dtype=float)
+            largest = max(abs(r) for _,r in radius)    # the largest radius bounds the circle between keyframes, even if the center has other times
+            self._extend_boundaries(numpy.concatenate((centers[:,0]-largest, centers[:,0]+largest)), numpy.concatenate((centers[:,1]-largest, centers[:,1]+largest)))
+            center = self._eased([(t,_map_displacement(*ctr)) for t,ctr in center])    # jointly, so that cx and cy share keyTimes
+            length = self._length_format()
+            radius = _compress(self._eased(radius), floats=True, string=length)
+            center_x = _compress([(t,x,*spline) for t,(x,_),*spline in center], floats=True, string=length)
+            center_y = _compress([(t,y,*spline) for t,(_,y),*spline in center], floats=True, string=length)
+        self._styled(lambda style, css_class: svg_code.circle(center_x, center_y, radius, *style, self._duration, css_class), line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha)
+    def bitmap(self, pixels, corners, toggle):
+        if (self._duration is None) or (len(pixels)==len(corners)==1):
+            if self._duration is not None:  (_, pixels), (_, corners) = pixels[0], corners[0]
+            self._main.write(self._bitmap(pixels, corners, {}))
+        else:
+            # animated bitmaps become a sequence of frames, each displayed only for its own interval of time
+            if len(pixels)==1:   pixels  = [(t, pixels[0][1])  for t,_ in corners]
+            if len(corners)==1:  corners = [(t, corners[0][1]) for t,_ in pixels]
+            times = [t for t,_ in pixels]
+            if (len(times)!=len(corners)) or not all(float_eq(t,s) for t,(s,_) in zip(times,corners)):
+                raise NotImplementedError("animated bitmaps only work for equivalent frame times for pixels and placement")
+            key_times = ";".join(_flt(t) for t in times)
+            encoded = {}    # frames often share pixels (when only the placement is animated)
+            for k,((_,p),(_,c)) in enumerate(zip(pixels, corners)):
+                display = ["none"] * len(times)
+                display[k] = "inline"
+                self._main.write(self._bitmap(p, c, encoded, (key_times, ";".join(display))))
+    def _bitmap(self, pixels, corners, encoded, display=None):
+        (x0, y0), (x1, y1), (x2, y2) = (self._parse_point(corner) for corner in corners)
+        self._adjust_boundaries(x1+x2-x0, y1+y2-y0)    # fourth corner
+        length = self._length_format()
+        matrix = " ".join(length(v) for v in (x1-x0, y1-y0, x2-x0, y2-y0, x0, y0))
+        if id(pixels) not in encoded:
+            encoded[id(pixels)] = base64.b64encode(raster_code.png(pixels)).decode("ascii")
+        return svg_code.bitmap(encoded[id(pixels)], matrix, self._duration, display)
+    def _eased(self, animated):
+        # if a tolerance was given, replaces runs of keyframes of a numerical property by spline easing between fewer of them,
+        # returned as (time, value, keySpline) frames, where the spline is for the segment ending there (None if linear)
+        if (self._tolerance is None) or (len(animated)<3):  return animated
+        times, values = zip(*animated)
+        fit = eased_keyframes(times, values, self._tolerance)
+        if fit is None:  return animated
+        indices, controls = fit
+        saved = (len(times) - len(indices)) * (8*numpy.size(values[0]) + 9)    # rough number of characters per keyframe (value and time) ...
+        cost  = sum(9 if (y is None) else 34 for y in controls[1:])             # ... and per keySpline
+        if all(float_eq(t, i/(len(times)-1)) for i,t in enumerate(times)):
+            cost += 9 * len(indices)    # times no longer evenly spaced, so they must be written
+        if saved<=cost:  return animated
+        return [(times[i], values[i], _spline(y)) for i,y in zip(indices, controls)]
+    def _instance(self, points):
+        # For a static path (without arcs) in a full document drawn with instances=True, looks for earlier paths of which it is
+        # an instance, up to translation, rotation and uniform scaling.  The first time geometry repeats, it is defined (at the
+        # size of the first one, with the first point at the origin and the first segment along x), and the id of the
+        # definition, the scale and the transform for a use element are returned.  Otherwise (including the first time it is
+        # seen) returns None.  Not done for the exact encoding, since the transformed coordinates would not be.
+        #   The definition, the translation and the matrix are written with enough places that the transformed points land
+        # within the rounding of the inline path (see _places), but instances more than _instance_scale times the size of the
+        # definition are drawn inline, since the error of the definition grows with the scale.
+        #   This only saves bytes in the output: it happens after the drawing commands reach the renderer, so every instance
+        # is still sampled and validated upstream like any other shape.  Circles, animated shapes and paths of fewer than
+        # _instance_points points are never instanced.
+        if (self._symbols is None) or (self._duration is not None) or (self.precision is None):  return None
+        if (len(points)<_instance_points) or any(len(point)!=2 for point in points):  return None
+        z = numpy.array([complex(*_map_displacement(*point)) for point in points])
+        length = abs(z[1]-z[0])
+        if length==0:  return None
+        direction = (z[1]-z[0]) / length
+        geometry  = (z-z[0]) * direction.conjugate()
+        geometry[1] = length    # exactly, rather than with rounding noise off the axis
+        key = len(z), numpy.round(geometry/length, 9).tobytes()
+        if key not in self._symbols:
+            self._symbols[key] = "g{}".format(len(self._symbols)), length, geometry, None    # drawn as given, in case it never repeats
+            return None
+        identifier, defined_length, undefined, extent = self._symbols[key]
+        scale = length / defined_length
+        places = self._places()
+        if (scale>_instance_scale) or (places is None):  return None
+        if undefined is not None:
+            self._defs += svg_code.defined_path(identifier, self._defined_points(undefined, places+2))    # errors scaled by at most _instance_scale
+            extent = max(abs(undefined))
+            self._symbols[key] = identifier, defined_length, None, extent
+        a = direction * scale
+        digits = max(0, math.ceil(math.log10(10*extent)) + places)    # a factor multiplies lengths up to the extent of the definition
+        factor = lambda x: _decimal(x, digits)
+        x0, y0 = _decimal(z[0].real, places+1), _decimal(z[0].imag, places+1)
+        if abs(a-1)<1e-9:  transform = "translate({} {})".format(x0, y0)
+        else:              transform = "matrix({} {} {} {} {} {})".format(factor(a.real), factor(a.imag), factor(-a.imag), factor(a.real), x0, y0)
+        return identifier, scale, transform
+    def _defined_points(self, geometry, places):
+        # the path data of a definition (see _instance), in screen coordinates, to the given number of decimal places
+        x, y = [_decimal(w.real, places) for w in geometry], [_decimal(w.imag, places) for w in geometry]
+        if self._encoding is not None:  return _path_code([("M", (x[0],y[0]))] + [("L", xy) for xy in zip(x[1:],y[1:])])
+        return svg_code.path_beg(x[0], y[0]) + "".join(svg_code.path_line(*xy) for xy in zip(x[1:],y[1:]))
+    def _styled(self, code, *style):
+        # writes the code of a shape, given as a function of a parsed style (the arguments of svg_code.path and circle) and a
+        # css class name, moving the static parts of the style into a class shared by all shapes with the same ones.  A class
+        # only pays for itself if it is used more than once, so the first shape with a given style is held back (a marker is
+        # written in its place), and it is written inline at the end (see renderer_full._write) if no other shape shares it.
+        # Those shapes are held in memory, rather than streamed, so this costs one shape per distinct style.
+        if self._classes is None:
+            self._main.write(code(style, None))
+            return
+        if self._duration is None:
+            static = style
+        else:
+            static = tuple(value[0][1] if ((value is not None) and (len(value)==1)) else None for value in style)
+        if all(value is None for value in static):
+            self._main.write(code(style, None))
+            return
+        rest = tuple(original if (value is None) else None for value,original in zip(static, style))    # animated parts
+        if static not in self._held:
+            marker = _held_marker.format(len(self._held))
+            self._held[static] = marker, code(style, None), (lambda css_class: code(rest, css_class))
+            self._main.write(marker)
+            return
+        if static not in self._classes:  self._classes[static] = "s{}".format(len(self._classes))
+        self._main.write(code(rest, self._classes[static]))
     def _parse_point(self, point):
         x, y = _map_displacement(*point)
         self._adjust_boundaries(x, y)
         return x, y
+    def _length_format(self):
+        # returns the function that writes lengths in the chosen encoding, given the size of the image so far
+        if self._encoding is None:  return _flt
+        places = self._places()
+        return lambda x: _decimal(x, places)
+    def _places(self):
+        # the decimal places to which lengths are rounded in the chosen encoding, given the size of the image so far (None if
+        # exact, or if nothing has size yet).  With no encoding, the places at which _flt rounds the largest coordinate so far.
+        xmin, xmax, ymin, ymax = self._dims
+        if self._encoding is None:
+            largest = max(abs(xmin), abs(xmax), abs(ymin), abs(ymax))
+            return None if (largest==0) else max(0, self.precision - 1 - math.floor(math.log10(largest)))
+        size = max(xmax-xmin, ymax-ymin)
+        if (self._encoding.resolution is None) or (size==0):  return None
+        return max(0, math.ceil(-math.log10(size*self._encoding.resolution)))
+    def _bound_path(self, points):
+        # adjusts the boundaries to a path (all of its keyframes, if animated), including the full extent of any arcs
+        frames = [points] if (self._duration is None) else [pts for _,pts in points]
+        try:
+            xy = numpy.array(frames, dtype=float)    # if there are no arcs, and all keyframes have the same number of points
+        except (ValueError, TypeError):
+            for pts in frames:  self._extend_boundaries(*self._path_extents(pts))
+        else:
+            x, y = _map_displacement(xy[...,0].ravel(), xy[...,1].ravel())
+            self._extend_boundaries(x, y)
+    def _path_extents(self, points):
+        # arrays of the x and y coordinates (screen) of the points of a path, and of the extremes of its arcs
+        x, y = [], []
+        for k,pt in enumerate(points):
+            x0, y0 = _map_displacement(*pt[:2])
+            if len(pt)==2:
+                x += [x0]
+                y += [y0]
+            else:
+                x1, y1 = _map_displacement(*points[k-1][:2])
+                skew = _map_rotation(pt[2].skew) + math.atan2(y0-y1,x0-x1) * 180/math.pi
+                xa, ya = base.arc_extents((x1,y1), (x0,y0), pt[2].rx, pt[2].ry, skew, 0, int(pt[2].rx<0))    # as written by _parse_points
+                x += xa.tolist()
+                y += ya.tolist()
+        return numpy.array(x), numpy.array(y)
     def _parse_points(self, points):
+        if self._encoding is not None:  return self._encode_points(points)
         x, y = _map_displacement(*(points[0]))
         pt_string = svg_code.path_beg(_flt(x), _flt(y))
-        self._adjust_boundaries(x, y)
         for pt in points[1:]:
             if len(pt)==2:
                 x, y = _map_displacement(*pt)
                 pt_string += svg_code.path_line(_flt(x), _flt(y))
-                self._adjust_boundaries(x, y)
             else:
                 x0, y0 = x, y
                 x, y, p = pt
@@ -169,10 +440,43 @@ class renderer_base(base.renderer):
                     cclockwise = 0
                     if p.rx<0:  cclockwise = 1
                     pt_string += svg_code.path_arc(_flt(abs(p.rx)), _flt(p.ry), _flt(skew), cclockwise, _flt(x), _flt(y))
-                    self._adjust_boundaries(x,y)    # seems like this should be more sophistacated
                 else:
                     raise NotImplementedError(str(p.curve))    # p.curve should already be a string, but just in case
         return pt_string
+    def _encode_points(self, points):
+        # the path data for _parse_points in the chosen encoding (see _encodings)
+        segments = []    # letter, leading numbers (not lengths), other lengths, and the endpoint of each command
+        x, y = _map_displacement(*(points[0]))
+        segments += [("M", (), (), x, y)]
+        for pt in points[1:]:
+            if len(pt)==2:
+                x, y = _map_displacement(*pt)
+                segments += [("L", (), (), x, y)]
+            else:
+                x0, y0 = x, y
+                x, y, p = pt
+                x, y = _map_displacement(x, y)
+                if p.curve=="arc":
+                    skew = _map_rotation(p.skew) + math.atan2(y-y0,x-x0) * 180/math.pi
+                    segments += [("A", (abs(p.rx), p.ry), (_decimal(float(_flt(skew)), None), "0", "1" if (p.rx<0) else "0"), x, y)]
+                else:
+                    raise NotImplementedError(str(p.curve))    # p.curve should already be a string, but just in case
+        length = self._length_format()
+        relative = self._encoding.relative and (self._duration is None)
+        commands, current, previous = [], None, None
+        for letter,lengths,others,x,y in segments:
+            lengths = [length(r) for r in lengths]
+            x, y = float(length(x)), float(length(y))    # so that relative positions are relative to what is written
+            absolute = (letter, [*lengths, *others, length(x), length(y)])
+            if relative and (previous is not None):
+                x0, y0 = previous
+                shifted = (letter.lower(), [*lengths, *others, length(x-x0), length(y-y0)])
+                size = lambda command: len("".join(command[1])) + len(command[1]) + (command[0]!=current)
+                if size(shifted)<size(absolute):  absolute = shifted
+            commands += [absolute]
+            current = {"M":"L", "m":"l"}.get(absolute[0], absolute[0])
+            previous = x, y
+        return _path_code(commands)
     def _parse_line(self, lstyle):
         if self._duration is None:
             if (lstyle.color.rgb=="none") or (lstyle.color.a==0) or (lstyle.weight==0):
@@ -180,8 +484,9 @@ class renderer_base(base.renderer):
             else:
                 rgb    = lstyle.color.rgb
                 alpha  = None if (lstyle.color.a is None) else _flt(lstyle.color.a)
-                weight = _flt(lstyle.weight)
-                dash   = None if (len(lstyle.dash)==0) else svg_code.dash(_flt(d*lstyle.weight) for d in lstyle.dash)
+                length = self._length_format()
+                weight = length(lstyle.weight)
+                dash   = None if (len(lstyle.dash)==0) else svg_code.dash(length(d*lstyle.weight) for d in lstyle.dash)
                 return rgb, alpha, weight, dash
         else:
             rgb   = []
@@ -202,8 +507,9 @@ class renderer_base(base.renderer):
                 alpha = _compress(alpha, floats=True)
                 if (len(alpha)==1 and alpha[0][1]=="1"):
                     alpha = None
-                weight = _compress(lstyle.weight, floats=True)
-                dash = [(t, svg_code.dash(_flt(d*lstyle.weight[0][1]) for d in dd) ) for t,dd in lstyle.dash]
+                length = self._length_format()
+                weight = _compress(self._eased(lstyle.weight), floats=True, string=length)
+                dash = [(t, svg_code.dash(length(d*lstyle.weight[0][1]) for d in dd) ) for t,dd in lstyle.dash]
                 dash = _compress(dash)
                 if (len(dash)==1 and dash[0][1]==""):    # a little dirty bc relies on knowing how dash is rendered
                     dash = None
@@ -260,38 +566,29 @@ class renderer_base(base.renderer):
                 return svg_code.fillgrad(identifier)
             else:
                 raise NotImplementedError(str(fstyle.fill))    # fstyle.fill should already be a string, but just in case
-    def _adjust_boundaries(self, x, y):
-        xmin, xmax, ymin, ymax = self._dims
-        xmin = min(xmin, x)
-        xmax = max(xmax, x)
-        ymin = min(ymin, y)
-        ymax = max(ymax, y)
-        self._dims = xmin, xmax, ymin, ymax
     def _resolve_viewbox(self):
-        xmin, xmax, ymin, ymax = self._dims
-        Dx = xmax-xmin        #        vv- Hardcoded things should always be adjustable ... maybe in config file
-        Dy = ymax-ymin        # clean this up and the line of code below ... takes care of skinny images and adds margin
-        Dx = max(Dx, 0.05*Dy) # from https://developer.mozilla.org/en-US/docs/Web/SVG/Attribute/viewBox
-        Dy = max(Dy, 0.05*Dx) # The value of the viewBox attribute is a list of four numbers: min-x, min-y, width and height.
-        margin = 0.1          #
-        return " ".join(str(p) for p in (xmin-margin*Dx, ymin-margin*Dy, Dx*(1+2*margin), Dy*(1+2*margin)))
+        length = str if (self._encoding is None) else self._length_format()
+        return " ".join(length(p) for p in self._viewbox())
 
 
 
 ### renderers specifically for full files or snippets
 
 class renderer_full(renderer_base):
-    """ class to resolve and buffer the drawing calls into svg code, dumping them into a complete file """
-    def __init__(self, filestem, *, title, controls):
-        renderer_base.__init__(self)
-        self._filestem   = filestem
+    """ class to resolve and stream the drawing calls into svg code, dumping them into a complete file (or a given writable stream, or returning it if filestem is None) """
+    def __init__(self, filestem, *, title, controls, stream=None, encoding=None, compress=None, instances=False):
+        renderer_base.__init__(self, _spool(_spool_size), encoding)    # spills to disk for big images
+        self._classes    = {}    # styles are shared through a style sheet in the document
+        self._held       = {}    # until they are used a second time (see _styled)
+        self._symbols    = {} if instances else None    # and repeated geometry through definitions, if asked
         self._title      = title
         self._controls   = controls
+        self._output     = document_output(filestem, stream=stream, compress=compress)
         self._background = ""
     def finish(self):
         cite_package = "This file was created using the PyToon package by Anthony D. Dutoi [https://github.com/adutoi/PyToon, tonydutoi@gmail.com].\n"
         javascript, thanks = ("", ""), ""
-        image_code = self._main
+        image_code = _image_marker    # the buffered image code is copied in where the marker lands, so the document is never held as one string
         if self._duration is not None:
             step, key_controls, button, location = parse_controls(self._controls)
             thanks     = js_code.svg_credit
@@ -301,17 +598,30 @@ class renderer_full(renderer_base):
                     image    = image_code,
                     controls = svg_code.animation_controls(duration=self._duration, control_location=location)
                 )
-        with open("{}.svg".format(self._filestem), "w") as stream:
-            stream.write(
-                svg_code.file_format(
-                    background      = self._background,
-                    viewbox         = self._resolve_viewbox(),
-                    documentation   = svg_code.title_description(title=self._title, description=cite_package+thanks),
-                    javascript      = javascript,
-                    definitions     = svg_code.defintions(defs=self._defs),
-                    image_code      = image_code
-                )
-            )
+        document = svg_code.file_format(
+            background      = self._background,
+            viewbox         = self._resolve_viewbox(),
+            documentation   = svg_code.title_description(title=self._title, description=cite_package+thanks),
+            javascript      = javascript,
+            definitions     = svg_code.defintions(defs=self._defs + (svg_code.style_sheet(self._classes) if self._classes else "")),
+            image_code      = image_code,
+            xlink           = (self._symbols is not None) and any(undefined is None for _,_,undefined,_ in self._symbols.values())
+        )
+        self._write(self._output.open(), document)
+        self._main.close()
+        return self._output.close()
+    def _write(self, stream, document):
+        # Writes the document around the buffered image code, indenting it as the code templates would have done, and putting
+        # the held shapes in place of their markers (with the class of their style, if it ended up shared)
+        held = {marker: (inline if (static not in self._classes) else shared(self._classes[static])) for static,(marker,inline,shared) in self._held.items()}
+        marker  = document.index(_image_marker)
+        start   = document.rfind("\n", 0, marker) + 1
+        indent  = document[start:marker]
+        stream.write(document[:start])
+        for line in self._main.lines():
+            for line in (held[line].splitlines(keepends=True) if (line in held) else [line]):
+                stream.write(indent+line if line.strip() else line)
+        stream.write(document[marker+len(_image_marker):])
     def background(self, background):
         if background.rgb!="none":
             if (background.a is not None) and (background.a!=1):
@@ -322,11 +632,11 @@ class renderer_full(renderer_base):
 
 class renderer_raw(renderer_base):
     """ class to resolve and buffer the drawing calls into svg code, returning fragments as a string """
-    def __init__(self):
-        renderer_base.__init__(self)
+    def __init__(self, *, encoding=None):
+        renderer_base.__init__(self, io.StringIO(), encoding)
     def finish(self):
         if self._defs:  raise NotImplementedError("sorry defs (fill gradients, etc) not yet supported for raw svg output (say, for animations)")
-        return self._main, self._resolve_viewbox()
+        return self._main.getvalue(), self._resolve_viewbox()
     def background(self, background):
         raise RuntimeError("raw svg format does not support a background (returns only code snippets)")
     def _assert_no_controls(self):
@@ -0,0 +1,80 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   A spatial index answers which of a list of items (the children of a composite) may touch a region or a point of the
+# page, without looking at all of them.  It is a uniform grid of about as many cells as items, laid over the union of their
+# bounding boxes (taken over all sample times), and each item is listed in the cells its box overlaps.  Items whose boxes
+# are not known (eg, paths with arcs) are always found, as are items too large to be worth listing cell by cell, which are
+# instead checked one by one.  Answers are the positions of the items in the list, in order (which is drawing order).
+#   Since they are built from bounding boxes, answers can include items that only come near the region, but they never
+# miss one that touches it.  Items that are composites carry the index of their own children (see subindex), so that a
+# query can descend the hierarchy (for culling when drawing, or for hit-testing).
+#
+import math
+from . import util
+
+
+
+class index(object):
+    """ a grid over the bounding boxes of a list of items, for finding those that may touch a region or point """
+    _large = 0.25    # items overlapping more than this fraction of the cells are checked individually instead
+    def __init__(self, boxes, subindices=None):
+        self.boxes       = list(boxes)                                                          # (xmin, ymin, xmax, ymax), or None if unknown
+        self._subindices = [None]*len(self.boxes) if (subindices is None) else list(subindices)
+        self._unlisted   = [i for i,box in enumerate(self.boxes) if box is None]                # positions checked on every query
+        known = [(i,box) for i,box in enumerate(self.boxes) if box is not None]
+        self.bounds = None    # union of the boxes (None if any is unknown, or if there are no items)
+        self._cells = {}
+        if not known:  return
+        x0 = min(box[0] for _,box in known)
+        y0 = min(box[1] for _,box in known)
+        x1 = max(box[2] for _,box in known)
+        y1 = max(box[3] for _,box in known)
+        if not self._unlisted:  self.bounds = x0, y0, x1, y1
+        self._n = max(1, int(math.sqrt(len(known))))    # cells per side
+        self._origin = x0, y0
+        self._size   = max(x1-x0, 1e-300) / self._n, max(y1-y0, 1e-300) / self._n
+        for i,box in known:
+            (ia, iz), (ja, jz) = self._span(box)
+            if (iz-ia+1)*(jz-ja+1) > self._large*self._n**2:
+                self._unlisted += [i]
+            else:
+                for cell in ((ci,cj) for ci in range(ia, iz+1) for cj in range(ja, jz+1)):
+                    self._cells.setdefault(cell, []).append(i)
+        self._unlisted.sort()
+    def _span(self, box):
+        # the ranges of cell indices (inclusive, clipped to the grid) that a box overlaps
+        (x0, y0), (dx, dy) = self._origin, self._size
+        clip = lambda k: min(max(k, 0), self._n-1)
+        return (clip(int(math.floor((box[0]-x0)/dx))), clip(int(math.floor((box[2]-x0)/dx)))), (clip(int(math.floor((box[1]-y0)/dy))), clip(int(math.floor((box[3]-y0)/dy))))
+    def region(self, xmin, ymin, xmax, ymax):
+        """ returns the positions of the items whose boxes touch the given rectangle (in page coordinates), in order """
+        region = xmin, ymin, xmax, ymax
+        found = set(i for i in self._unlisted if (self.boxes[i] is None) or util.boxes_meet(self.boxes[i], region))
+        if self._cells and util.boxes_meet((*self._origin, self._origin[0]+self._n*self._size[0], self._origin[1]+self._n*self._size[1]), region):
+            (ia, iz), (ja, jz) = self._span(region)
+            for cell in ((ci,cj) for ci in range(ia, iz+1) for cj in range(ja, jz+1)):
+                found.update(i for i in self._cells.get(cell, ()) if util.boxes_meet(self.boxes[i], region))
+        return sorted(found)
+    def point(self, x, y):
+        """ returns the positions of the items whose boxes contain the given point, in order """
+        return self.region(x, y, x, y)
+    def subindex(self, position):
+        """ returns the index over the children of the item at position, if it is a composite (otherwise None) """
+        return self._subindices[position]
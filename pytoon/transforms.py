@@ -17,6 +17,7 @@
 #
 import math
 from . import util
+from . import caching
 
 """
 The basic idea is to facilitate nested coordinate transformations that automatically
@@ -87,15 +88,25 @@ that
 
 
 class transform(object):
-    def __init__(self, mapping, *, _inner=None, _clock=None, _Dt=None, _allow_resolve=True, **kwargs):
+    def __init__(self, mapping, *, _affine=None, _inner=None, _clock=None, _Dt=None, _allow_resolve=True, **kwargs):
         self._mapping       = mapping
+        self._affine        = _affine    # for affine uniform transforms, a function of the parameters returning a 2x3 matrix and line scale
         self._parameters    = kwargs
         self._inner         = _inner
         self._clock         = _clock
         self._Dt            = _Dt
         self._allow_resolve = _allow_resolve
+        self._plan          = util.substitution_plan(kwargs)    # for repeated evaluation of the parameters at different times
+        self._all_affine    = (_affine is not None) and ((not _inner) or _inner._all_affine)    # whole chain can be collapsed to a single matrix
+        self._digest        = None
+    def _fingerprint(self):
+        # for caching (see caching.py) ... affine transforms are known by their matrix function, which is shared, rather than by their mapping, which is not
+        if self._digest is None:
+            mapping = self._mapping if (self._affine is None) else self._affine
+            self._digest = caching.fingerprint((mapping, self._parameters, self._inner, self._clock, self._Dt, self._allow_resolve))
+        return self._digest
     def animated(self, *, Dt):
-        return transform(self._mapping, _inner=self._inner, _clock=self._clock, _Dt=Dt, _allow_resolve=self._allow_resolve, **self._parameters)
+        return transform(self._mapping, _affine=self._affine, _inner=self._inner, _clock=self._clock, _Dt=Dt, _allow_resolve=self._allow_resolve, **self._parameters)
     def n_intervals(self, ta, tz):
         N = 0 if (not self._inner) else self._inner.n_intervals(ta, tz)
         if self._Dt is not None:
@@ -103,23 +114,35 @@ class transform(object):
         return N
     def nest(self, inner):
         if self._inner:
-            return transform(self._mapping, _inner=self._inner.nest(inner), _clock=self._clock, _Dt=self._Dt, _allow_resolve=self._allow_resolve, **self._parameters)
+            return transform(self._mapping, _affine=self._affine, _inner=self._inner.nest(inner), _clock=self._clock, _Dt=self._Dt, _allow_resolve=self._allow_resolve, **self._parameters)
         else:
-            return transform(self._mapping, _inner=inner,                   _clock=self._clock, _Dt=self._Dt, _allow_resolve=self._allow_resolve, **self._parameters)
+            return transform(self._mapping, _affine=self._affine, _inner=inner,                   _clock=self._clock, _Dt=self._Dt, _allow_resolve=self._allow_resolve, **self._parameters)
     def resolve(self, varval, clock=None, reresolve=False):
         inner = None
         if self._inner:
             inner = self._inner.resolve(varval, clock, reresolve)
+        if (not self._allow_resolve) and (inner is self._inner):
+            return self    # already resolved all the way down (as when handed down from a composite), so a copy would be identical
         if self._allow_resolve:
             params, Dt = varval((self._parameters, self._Dt))
         else:
             clock      = self._clock      # ignore function argument
             params, Dt = self._parameters, self._Dt
             reresolve  = False
-        return transform(self._mapping, _inner=inner, _clock=clock, _Dt=Dt, _allow_resolve=reresolve, **params)
+        return transform(self._mapping, _affine=self._affine, _inner=inner, _clock=clock, _Dt=Dt, _allow_resolve=reresolve, **params)
+    def matrix(self, _t_=None):
+        # only for transforms where the whole chain is affine (check ._all_affine), returns the single 2x3 matrix and line scale they collapse to
+        varval = util.variable_evaluator({"_t_": self._clock(_t_)})
+        matrix, scale = self._affine(**self._plan(varval))
+        if self._inner:
+            inner_matrix, inner_scale = self._inner.matrix(_t_)
+            matrix, scale = _compose(matrix, inner_matrix), scale*inner_scale
+        return matrix, scale
     def mappings(self, _t_=None, origin=(0,0)):
+        if self._all_affine:
+            return self._affine_mappings(*self.matrix(_t_))
         varval = util.variable_evaluator({"_t_": self._clock(_t_)})
-        outer_absolute, outer_relative, outer_linescale = self._mapping(**varval(self._parameters))
+        outer_absolute, outer_relative, outer_linescale = self._mapping(**self._plan(varval))
         if self._inner:
             inner_absolute, inner_relative, inner_linescale = self._inner.mappings(_t_, origin)
             origin = inner_absolute(origin)
@@ -132,10 +155,41 @@ class transform(object):
         linescale = outer_linescale(origin)
         if self._inner:  linescale *= inner_linescale
         return absolute, relative, linescale
+    @staticmethod
+    def _affine_mappings(matrix, linescale):
+        kernel = _affine_kernel(matrix)
+        return kernel, kernel, linescale    # relative mapping of a uniform transform ignores the origin
 
 
 
-def uniform_transform(kernel_scale, **symbolic_kwargs):
+# Affine maps are stored as 2x3 matrices ((a, b, e), (c, d, f)), meaning x -> a*x + b*y + e and y -> c*x + d*y + f
+
+_identity = ((1, 0, 0), (0, 1, 0))
+
+def _compose(outer, inner):
+    (a1, b1, e1), (c1, d1, f1) = outer
+    (a2, b2, e2), (c2, d2, f2) = inner
+    return ((a1*a2 + b1*c2, a1*b2 + b1*d2, a1*e2 + b1*f2 + e1),
+            (c1*a2 + d1*c2, c1*b2 + d1*d2, c1*e2 + d1*f2 + f1))
+
+def _affine_kernel(matrix):
+    if matrix==_identity:
+        return util.echo    # also passes along points carrying curve information untouched
+    (a, b, e), (c, d, f) = matrix
+    def kernel(point):
+        x, y = point
+        return (a*x + b*y + e, c*x + d*y + f)
+    return kernel
+
+def _affine_map(matrix, points):
+    if matrix==_identity:
+        return list(points)
+    (a, b, e), (c, d, f) = matrix
+    return [(a*x + b*y + e, c*x + d*y + f) for x,y in points]
+
+
+
+def _uniform_mapping(kernel_scale):
     def mapping(**concrete_kwargs):
         kernel, scale = kernel_scale(**concrete_kwargs)
         def absolute(point):
@@ -145,7 +199,20 @@ def uniform_transform(kernel_scale, **symbolic_kwargs):
         def linescale(origin):
             return scale
         return absolute, relative, linescale
-    return transform(mapping, **symbolic_kwargs)
+    return mapping
+
+def _as_kernel(matrix_scale):
+    def kernel_scale(**concrete_kwargs):
+        matrix, scale = matrix_scale(**concrete_kwargs)
+        return _affine_kernel(matrix), scale
+    return kernel_scale
+
+def uniform_transform(kernel_scale, **symbolic_kwargs):
+    return transform(_uniform_mapping(kernel_scale), **symbolic_kwargs)
+
+def affine_transform(matrix_scale, **symbolic_kwargs):
+    # a uniform transform given by a function that returns a 2x3 matrix (instead of a kernel), so that nested chains can be collapsed
+    return transform(_uniform_mapping(_as_kernel(matrix_scale)), _affine=matrix_scale, **symbolic_kwargs)
 
 def positional_transform(kernel_scale, **symbolic_kwargs):
     def mapping(**concrete_kwargs):
@@ -165,42 +232,31 @@ def positional_transform(kernel_scale, **symbolic_kwargs):
 
 
 def _no_transform():
-    def kernel(point):
-        return point
     scale = 1
-    return kernel, scale
+    return _identity, scale
 
 def _translate(displacement):
     Dx, Dy = displacement
-    def kernel(point):
-        x, y = point
-        return (x+Dx, y+Dy)
     scale = 1
-    return kernel, scale
+    return ((1, 0, Dx), (0, 1, Dy)), scale
 
 def _rotate(angle):
     c = math.cos(angle)
     s = math.sin(angle)
-    def kernel(point):
-        x, y = point
-        return (c*x - s*y, c*y + s*x)
     scale = 1
-    return kernel, scale
+    return ((c, -s, 0), (s, c, 0)), scale
 
 def _scale(factor, scale_linewidths=True):
-    def kernel(point):
-        x, y = point
-        return (factor*x, factor*y)
     if scale_linewidths:
         scale = factor
     else:
         scale = 1
-    return kernel, scale
+    return ((factor, 0, 0), (0, factor, 0)), scale
 
-no_transform = uniform_transform(_no_transform)
+no_transform = affine_transform(_no_transform)
 
 def translate(Dx, Dy):
-    return uniform_transform(_translate, displacement=(Dx,Dy))
+    return affine_transform(_translate, displacement=(Dx,Dy))
 
 def rotate(angle=None, *, rad=None):
     if angle is rad is None:
@@ -209,16 +265,16 @@ def rotate(angle=None, *, rad=None):
         raise ValueError("rotation angle was specified twice")
     elif rad is None:
         rad = angle * math.pi/180
-    return uniform_transform(_rotate, angle=rad)
+    return affine_transform(_rotate, angle=rad)
 
 def scale(factor):
-    return uniform_transform(_scale, factor=factor)
+    return affine_transform(_scale, factor=factor)
 
 def zoom(factor):
-    return uniform_transform(_scale, factor=factor, scale_linewidths=False)
+    return affine_transform(_scale, factor=factor, scale_linewidths=False)
 
 def stretch(factor):
-    return positional_transform(_scale, factor=factor, scale_linewidths=False)
+    return positional_transform(_as_kernel(_scale), factor=factor, scale_linewidths=False)
 
 
 
@@ -17,9 +17,10 @@
 #
 
 from .external   import svg_code, js_code    # would be free-standing module files, so import directly to this level
-from .general    import struct, as_tuple, as_dict, int_round, echo, nested, float_eq, valid_real_number, valid_point, shell, code_template
-from .varval     import variable_evaluator
-from .animated   import is_animated, animated, deanimated
+from .general    import struct, as_tuple, as_dict, int_round, echo, nested, float_eq, bounding_box, boxes_meet, valid_real_number, valid_point, shell, code_template
+from .varval     import variable_evaluator, substitution_plan
+from .animated   import is_animated, animated, deanimated, reduced as reduced_keyframes, eased as eased_keyframes, simplified as simplified_points
 from .colors     import color_wheel, colordef, gray_rgb, color_parser
 from .styles     import linestyle, fillstyle, style_parsers
 from .image      import image_file
+from .           import raster as raster_code    # png and jpg encoders (pixel buffers to bytes)
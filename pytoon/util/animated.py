@@ -15,6 +15,8 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import numpy
+
 
 
 
@@ -70,3 +72,159 @@ def validator(parser):
         else:
             return parser(prop)
     return valid
+
+
+
+def _rounded(values, precision):
+    """ rounds an array elementwise to the given number of significant digits (if not None), as if written out and read back """
+    if precision is None:  return values
+    magnitude = numpy.floor(numpy.log10(numpy.abs(numpy.where(values==0, 1, values))))
+    scale = 10.**(magnitude - (precision-1))
+    return numpy.round(values/scale) * scale
+
+def _numerical(values):
+    """ returns the values (scalars, points, or lists of points) as an array with dimensions (keyframes, points, coordinates), or None if they are not numerical """
+    try:
+        array = numpy.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return None    # ragged, or not numbers
+    if   array.ndim==1:  return array[:,None,None]    # scalars
+    elif array.ndim==2:  return array[:,None,:]       # points
+    elif array.ndim==3:  return array                 # lists of points
+    else:                return None
+
+def _interpolation_error(values, precision):
+    """ for numerical values, returns a function giving the error of each keyframe strictly between a and b, if it were replaced by linear interpolation (None for non-numerical values) """
+    array = _numerical(values)
+    if array is None:  return None
+    array = _rounded(array, precision)
+    def error(times, a, b):
+        fracs = ((times[a+1:b] - times[a]) / (times[b] - times[a]))[:,None,None]
+        interpolated = _rounded(array[a] + fracs*(array[b]-array[a]), precision)
+        return numpy.sqrt(((interpolated - array[a+1:b])**2).sum(axis=2)).max(axis=1)    # worst point of each keyframe
+    return error
+
+def _repetition_error(values):
+    """ for values that are not interpolated numerically, returns a function that only allows dropping keyframes between identical ones """
+    def error(times, a, b):
+        return numpy.array([0. if (values[a]==value==values[b]) else numpy.inf for value in values[a+1:b]])
+    return error
+
+def reduced(properties, tolerance, precision=None, key=None):
+    """ drops keyframes from animated properties that linear interpolation between the remaining ones reproduces to within tolerance (Ramer-Douglas-Peucker) """
+    # Properties sharing the same keyframe times are reduced jointly (to keep the same times), and others separately.  A
+    # numerical value (scalar, point, or list of points) is compared after rounding to precision significant digits (the
+    # output precision, if given), with the error being the largest distance of any of its points from the interpolation.
+    # Other values (compared via key, if given) are only dropped in runs of identical ones.  First and last are kept.
+    properties = list(properties)
+    if not properties:  return properties
+    times = [[t for t,_ in prop] for prop in properties]
+    if any(t!=times[0] for t in times[1:]):
+        return [reduced([prop], tolerance, precision, key)[0] for prop in properties]
+    if len(times[0])<3:  return properties
+    times = numpy.array(times[0], dtype=float)
+    errors = []
+    for prop in properties:
+        values = [value for _,value in prop]
+        error = _interpolation_error(values, precision)
+        if error is None:  error = _repetition_error(values if (key is None) else [key(value) for value in values])
+        errors += [error]
+    keep = [0, len(times)-1]
+    segments = [(0, len(times)-1)]
+    while segments:
+        a, b = segments.pop()
+        if b-a<2:  continue
+        error = numpy.max([e(times, a, b) for e in errors], axis=0)
+        worst = int(numpy.argmax(error))
+        if error[worst]>tolerance:
+            k = a + 1 + worst
+            keep += [k]
+            segments += [(a,k), (k,b)]
+    keep = sorted(keep)
+    return [[prop[i] for i in keep] for prop in properties]
+
+
+
+def simplified(frames, tolerance, closed=False):
+    """ drops points from the point lists of the keyframes of a path (all at the same positions) that the straight segments between the remaining ones pass within tolerance of, in every keyframe (Ramer-Douglas-Peucker) """
+    # A point may also carry an arc to it from the previous one, and both stay.  If closed (a polygon), the segment back to
+    # the first point counts too.  A single (static) list of points is given as a list of one frame.  Keyframes with different
+    # numbers of points (which cannot be interpolated anyway) are simplified each on its own.
+    n = len(frames[0])
+    if any(len(points)!=n for points in frames):
+        return [simplified([points], tolerance, closed)[0] for points in frames]
+    if n<3:  return frames
+    anchors = {0, n}
+    try:
+        array = numpy.array(frames, dtype=float)    # (keyframes, points, coordinates)
+    except (TypeError, ValueError):
+        array = numpy.array([[p[:2] for p in points] for points in frames], dtype=float)    # some points carry arcs
+        for points in frames:
+            for k,p in enumerate(points):
+                if len(p)>2:  anchors |= {max(k-1, 0), k}
+    if closed:  array = numpy.append(array, array[:,:1], axis=1)
+    else:       anchors = (anchors - {n}) | {n-1}
+    x, y = array[...,0], array[...,1]
+    anchors = sorted(anchors)
+    keep = list(anchors)
+    segments = list(zip(anchors[:-1], anchors[1:]))
+    while segments:
+        a, b = segments.pop()
+        if b-a<2:  continue
+        dx, dy = x[:,b:b+1]-x[:,a:a+1], y[:,b:b+1]-y[:,a:a+1]
+        px, py = x[:,a+1:b]-x[:,a:a+1], y[:,a+1:b]-y[:,a:a+1]
+        norm2 = dx*dx + dy*dy
+        fracs = numpy.clip((px*dx + py*dy) / numpy.where(norm2>0, norm2, 1), 0, 1)    # nearest point on the segment
+        ex, ey = px - fracs*dx, py - fracs*dy
+        error = (ex*ex + ey*ey).max(axis=0)
+        worst = int(numpy.argmax(error))
+        if error[worst]>tolerance**2:
+            k = a + 1 + worst
+            keep += [k]
+            segments += [(a,k), (k,b)]
+    keep = [k for k in sorted(keep) if k<n]    # (the repeated first point of a closed one is dropped again)
+    if len(keep)==n:  return frames
+    return [[points[k] for k in keep] for points in frames]
+
+
+
+def _eased_segment(times, array, a, b, tolerance):
+    """ fits the easing between keyframes a and b to those in between, returning the control values (y1,y2) of the svg keySpline (x1,x2 = 1/3,2/3), or None if the error is too large """
+    fracs = (times[a+1:b] - times[a]) / (times[b] - times[a])
+    delta = array[b] - array[a]
+    def error(y1, y2):
+        eased = 3*(1-fracs)**2*fracs*y1 + 3*(1-fracs)*fracs**2*y2 + fracs**3    # with x1,x2 = 1/3,2/3, the bezier parameter is the time fraction
+        return numpy.sqrt(((array[a] + eased[:,None,None]*delta - array[a+1:b])**2).sum(axis=2)).max()
+    controls = (1/3, 2/3)    # linear (preferred, if good enough)
+    norm2 = (delta**2).sum()
+    if (norm2>0) and (error(*controls)>tolerance):
+        progress = ((array[a+1:b] - array[a]) * delta).sum(axis=(1,2)) / norm2
+        basis = numpy.array([3*(1-fracs)**2*fracs, 3*(1-fracs)*fracs**2]).T
+        controls, *_ = numpy.linalg.lstsq(basis, progress-fracs**3, rcond=None)
+        controls = tuple(numpy.clip(controls, 0, 1))    # required to lie in the unit square
+    return controls if (error(*controls)<=tolerance) else None
+
+def eased(times, values, tolerance, refine=4):
+    """ chooses keyframes of numerical values such that cubic easing between them reproduces the others to within tolerance """
+    # Returns the indices of the chosen keyframes and, for each, the control values (y1,y2) of the easing of the segment
+    # that ends there (None for the first, and for linear segments), or None if the values are not numerical.  The fit is
+    # to the linear interpolation of the given keyframes (as would be displayed), sampled refine times per interval.
+    # Segments are extended greedily from the first keyframe, stopping at the first failed fit.
+    array = _numerical(values)
+    if array is None:  return None
+    times = numpy.array(times, dtype=float)
+    fracs = numpy.arange(refine) / refine
+    times = numpy.append((times[:-1,None] + fracs*(times[1:,None] - times[:-1,None])).ravel(), times[-1])
+    array = numpy.append((array[:-1,None] + fracs[:,None,None]*(array[1:,None] - array[:-1,None])).reshape(-1, *array.shape[1:]), array[-1:], axis=0)
+    indices, controls = [0], [None]
+    a = 0
+    while a<len(times)-1:
+        end, fit = a+refine, None
+        for b in range(a+2*refine, len(times), refine):
+            y = _eased_segment(times, array, a, b, tolerance)
+            if y is None:  break
+            end, fit = b, (None if (y==(1/3, 2/3)) else y)
+        indices  += [end//refine]
+        controls += [fit]
+        a = end
+    return indices, controls
@@ -63,15 +63,24 @@ def _simplify_text(text):
 
 
 
+def _indent(text, prefix):
+    """ the same as textwrap.indent(text, prefix), but returns text as is (without going through the lines) if prefix is empty """
+    if not prefix:  return text
+    return "".join(prefix+line if line.strip() else line for line in text.splitlines(keepends=True))
+
 def template(text):
+    """ compiles text into a function that formats it, indenting multiline substitutions to the level of their {field} (and the result by indent spaces) """
+    # All of the parsing happens here, once, so templates are best made at import time.  Subblocks that are not indented are
+    # substituted as given, and a template with no indented subblocks, formatted with no indent, is just a call to str.format.
     string = _simplify_text(text)
     string, subblocks = _identify_subblocks(string)
-    def format_it(indent=0, **kwargs):
-        indent = " " * indent
-        substitutions = dict(kwargs)    # copy because will do in-place modifications
-        for k,i in subblocks.items():
-            if len(substitutions[k])>0:
-                substitutions[k] = textwrap.indent(substitutions[k], i)
-        text = string.format(**substitutions)
-        return textwrap.indent(text, indent)
+    subblocks = {k:i for k,i in subblocks.items() if i}
+    if not subblocks:
+        def format_it(indent=0, **kwargs):
+            text = string.format(**kwargs)
+            return _indent(text, " "*indent) if indent else text
+    else:
+        def format_it(indent=0, **kwargs):
+            for k,i in subblocks.items():  kwargs[k] = _indent(kwargs[k], i)    # kwargs is already a new dictionary
+            return _indent(string.format(**kwargs), " "*indent)
     return format_it
@@ -71,18 +71,19 @@ _javascript_in_svg = code("""
 
 # Javascript implementations of controls
 
+_init_in_svg = code("""
+  function Init(evt)
+  {{
+    SVGDocument = evt.target.ownerDocument;
+    SVGRoot     = SVGDocument.documentElement;
+    {variables}
+    SVGRoot.addEventListener('keyup', function (e) {{{listeners}}}, false);
+    {initialize}
+  }};
+""")
+
 def _initialize_listeners_in_svg(variables, listeners, initialize):
-    template = code("""
-      function Init(evt)
-      {{
-        SVGDocument = evt.target.ownerDocument;
-        SVGRoot     = SVGDocument.documentElement;
-        {variables}
-        SVGRoot.addEventListener('keyup', function (e) {{{listeners}}}, false);
-        {initialize}
-      }};
-    """)
-    return template(
+    return _init_in_svg(
         variables  =      "".join(variables),
         listeners  = "else ".join(listeners),
         initialize =      "".join(initialize)
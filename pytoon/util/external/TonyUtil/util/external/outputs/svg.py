@@ -33,43 +33,64 @@ from .external.outputs import code
 #"""
 #     vv-This-vv still works, so what is all ^^-this-^^ stuff?
 
-def file_format(*, viewbox, image_code, definitions="", javascript=("",""), background="", documentation=""):
-    template = code.template("""
-      <svg width="100%" height="100%"{background} viewBox="{viewbox}" xmlns="http://www.w3.org/2000/svg"{javascript_init}>
-        {documentation}
+# Templates are compiled once, here, rather than on every call.
 
-        {javascript}
-        {definitions}
-        {image_code}
+_file_template = code.template("""
+  <svg width="100%" height="100%"{background} viewBox="{viewbox}" xmlns="http://www.w3.org/2000/svg"{xlink}{javascript_init}>
+    {documentation}
 
-      </svg>
-    """)
+    {javascript}
+    {definitions}
+    {image_code}
+
+  </svg>
+""")
+
+def file_format(*, viewbox, image_code, definitions="", javascript=("",""), background="", documentation="", xlink=False):
     if documentation:  documentation = "\n" + documentation
     if background:  background = ' style="background-color:{}"'.format(background)    # allow things other than solid colors?
     javascript_init, javascript = javascript
-    return template(background=background, viewbox=viewbox, javascript_init=javascript_init, documentation=documentation, javascript=javascript, definitions=definitions, image_code=image_code)
+    xlink = ' xmlns:xlink="http://www.w3.org/1999/xlink"' if xlink else ""    # needed for use elements
+    return _file_template(background=background, viewbox=viewbox, xlink=xlink, javascript_init=javascript_init, documentation=documentation, javascript=javascript, definitions=definitions, image_code=image_code)
+
+_definitions_template = code.template("""
+  <defs>
+    {defs}
+  </defs>
+""")
 
 def defintions(defs):
-    template = code.template("""
-      <defs>
-        {defs}
-      </defs>
-    """)
-    if defs:  return template(defs) + "\n"
+    if defs:  return _definitions_template(defs=defs) + "\n"
     else:     return ""
 
+_style_template = code.template("""
+  <style>
+    {rules}
+  </style>
+""")
+
+def style_sheet(classes):
+    # classes maps the (static) style arguments of path and circle to class names
+    rules = []
+    for style,name in classes.items():
+        properties = ";".join("{}:{}".format(prop, value) for prop,value in _shape_props(*style).items() if value is not None)
+        rules += [".{}{{{}}}".format(name, properties)]
+    return _style_template(rules="\n".join(rules)+"\n")
+
+_title_template = code.template("""
+  <title>{title}</title>
+""")
+
+_description_template = code.template("""
+  <desc>
+    {description}
+  </desc>
+""")
+
 def title_description(title=None, description=None):
-    title_template = code.template("""
-      <title>{title}</title>
-    """)
-    description_template = code.template("""
-      <desc>
-        {description}
-      </desc>
-    """)
     documentation = ""
-    if title:        documentation += title_template(title=title)
-    if description:  documentation += description_template(description=description)
+    if title:        documentation += _title_template(title=title)
+    if description:  documentation += _description_template(description=description)
     return documentation
 
 
@@ -107,17 +128,51 @@ image      = lambda f,h,v,a,x,y,dx,dy: '''
 
 # General xml tag and specifications/applications
 
-def _xml_tag(tag, props, duration):
-    animate = code.template("""
-      <animate attributeName="{to_animate}" repeatCount="indefinite" dur="{duration}s"
-        KeyTimes="{times}"
-        values="
-          {values}
-        "
-      />
-    """)
-    constant = ""
+def _runs_merged(frames):
+    # drops the keyframes in the middle of runs of equal values, which change nothing
+    if len(frames)<3:  return frames
+    kept = [frames[0]]
+    for previous,frame,following in zip(frames, frames[1:], frames[2:]):
+        if not (previous[1]==frame[1]==following[1]):  kept += [frame]
+    return kept + [frames[-1]]
+
+def _timing(times, splines, written):
+    # keyTimes are left out if evenly spaced (the default), and the string is reused for attributes on the same times (written is a cache);
+    # splines are for the segments between keyframes (None for linear), with calcMode="spline" only if any is not linear
+    if times not in written:
+        n = len(times) - 1
+        if all(abs(float(t)-i/n)<1e-5 for i,t in enumerate(times)):
+            written[times] = ""
+        else:
+            written[times] = ' keyTimes="{}"'.format("; ".join(str(t) for t in times))
+    timing = written[times]
+    if any(spline is not None for spline in splines):
+        timing += ' calcMode="spline" keySplines="{}"'.format("; ".join("0 0 1 1" if (spline is None) else spline for spline in splines))
+    return timing
+
+_animate_template = code.template("""
+  <animate attributeName="{to_animate}" repeatCount="indefinite" dur="{duration}s"{timing}
+    values="
+      {values}
+    "
+  />
+""")
+
+_element_template = code.template("""
+  <{tag}{constant}>
+    {animated}
+  </{tag}>
+""")
+
+_empty_element_template = code.template("""
+  <{tag}{constant}/>
+""")
+
+def _xml_tag(tag, props, duration, css_class=None):
+    # An animated value is a list of (time, value) pairs, or (time, value, keySpline) for the segment ending there.
+    constant = "" if (css_class is None) else ' class="{}"'.format(css_class)
     animated = ""
+    written  = {}
     for prop,value in props.items():
         if value is not None:
             if duration is None:
@@ -127,18 +182,15 @@ def _xml_tag(tag, props, duration):
                 if value is not None:
                     constant += ' {}="{}"'.format(prop, value)
             else:
-                times, values = zip(*value)
-                animated += animate(to_animate=prop, duration=duration, times="; ".join(str(t) for t in times), values=";\n".join(str(v) for v in values)+"\n")
+                frames = _runs_merged(value)
+                times  = tuple(frame[0] for frame in frames)
+                values = [frame[1] for frame in frames]
+                splines = [frame[2] if len(frame)>2 else None for frame in frames[1:]]
+                animated += _animate_template(to_animate=prop, duration=duration, timing=_timing(times, splines, written), values=";\n".join(str(v) for v in values)+"\n")
     if animated:
-        return code.template("""
-          <{tag}{constant}>
-            {animated}
-          </{tag}>
-        """)(tag=tag, constant=constant, animated=animated)
+        return _element_template(tag=tag, constant=constant, animated=animated)
     else:
-        return code.template("""
-          <{tag}{constant}/>
-        """)(tag=tag, constant=constant)
+        return _empty_element_template(tag=tag, constant=constant)
 
 def _shape_props(line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha):
     return {
@@ -150,21 +202,56 @@ def _shape_props(line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_al
         "fill-opacity":      fill_alpha
     }
 
-def path(points, line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha, duration=None):
+def path(points, line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha, duration=None, css_class=None):
     props = _shape_props(line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha)
     props.update({
         "d": points
     })
-    return _xml_tag("path", props, duration)
+    return _xml_tag("path", props, duration, css_class)
+
+_defined_path_template = code.template("""
+  <path id="{identifier}" d="{points}"/>
+""")
 
-def circle(center_x, center_y, radius, line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha, duration=None):
+def defined_path(identifier, points):
+    # geometry to be drawn by use (style is left to inherit from the use element)
+    return _defined_path_template(identifier=identifier, points=points)
+
+def use(identifier, transform, line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha, css_class=None):
+    props = _shape_props(line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha)
+    props.update({
+        "xlink:href": "#" + identifier,
+        "transform":  transform
+    })
+    return _xml_tag("use", props, None, css_class)
+
+def circle(center_x, center_y, radius, line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha, duration=None, css_class=None):
     props = _shape_props(line_rgb, line_alpha, line_weight, line_dash, fill_rgb, fill_alpha)
     props.update({
         "r":  radius,
         "cx": center_x,
         "cy": center_y
     })
-    return _xml_tag("circle", props, duration)
+    return _xml_tag("circle", props, duration, css_class)
+
+_bitmap_template = code.template("""
+  <image xmlns:xlink="http://www.w3.org/1999/xlink" width="1" height="1" preserveAspectRatio="none" transform="matrix({matrix})" xlink:href="data:image/png;base64,{data}"/>
+""")
+
+_bitmap_frame_template = code.template("""
+  <image xmlns:xlink="http://www.w3.org/1999/xlink" width="1" height="1" preserveAspectRatio="none" transform="matrix({matrix})" xlink:href="data:image/png;base64,{data}">
+    <animate attributeName="display" calcMode="discrete" repeatCount="indefinite" dur="{duration}s" keyTimes="{times}" values="{values}"/>
+  </image>
+""")
+
+def bitmap(png_base64, matrix, duration=None, display=None):
+    # The image fills the unit square, which is mapped to the page by the matrix (given as "a b c d e f").
+    # If display=(keytimes,values) is given, the image is shown (or not) at discrete times of the animation.
+    if display is None:
+        return _bitmap_template(matrix=matrix, data=png_base64)
+    else:
+        times, values = display
+        return _bitmap_frame_template(matrix=matrix, data=png_base64, duration=duration, times=times, values=values)
 
 
 
@@ -180,64 +267,69 @@ animation = code.template("""
   {controls}
 """)
 
+_controls_template = code.template("""
+  <g transform="translate({control_x},{control_y})">
+    <g transform="scale({control_scale})">
+      <!-- the play/pause button -->
+      <a id="playGroup" display="inline" onclick="Play()">
+        <circle id="play" cx="15" cy="15" r="12" fill="lightgray" stroke-width="2" stroke="gray"/>
+        <polygon points="11,9 22,15 11,21" fill="gray" stroke="gray" stroke-width="2" stroke-linejoin="round"/>
+      </a>
+      <a id="pauseGroup" display="none" onclick="Pause()">
+        <circle id="pause" cx="15" cy="15" r="12" fill="lightgray" stroke-width="2" stroke="gray"/>
+        <line x1="12" y1="10" x2="12" y2="20" stroke="gray" stroke-width="4" stroke-linecap="round"/>
+        <line x1="19" y1="10" x2="19" y2="20" stroke="gray" stroke-width="4" stroke-linecap="round"/>
+      </a>
+      <!-- the progress bar -->
+      <line x1="12" y1="10" x2="12" y2="20" stroke="gray" stroke-width="4" stroke-linecap="round">
+        <animateTransform attributeName="transform" type="translate" from="20 0" to="220 0" begin="0s" dur="{duration}s" repeatCount="indefinite" />
+      </line>
+      <!-- the timeline as a series of clickable dots -->
+      {timeline}
+    </g>
+  </g>
+""")
+
+_time_dot_template = code.template("""
+  <a display="inline" onclick="Reset({timepoint})">
+    <circle cx="{timemark}" cy="15" r="2" fill="gray" stroke-width="0" stroke="gray"/>
+  </a>
+""")
+
 def animation_controls(*, duration, control_location=(0,0,1), dot_count=150, offset=32, length=200, _fudge=0.9999, _flt=lambda x: "{:.5g}".format(x)):
-    controls = code.template("""
-      <g transform="translate({control_x},{control_y})">
-        <g transform="scale({control_scale})">
-          <!-- the play/pause button -->
-          <a id="playGroup" display="inline" onclick="Play()">
-            <circle id="play" cx="15" cy="15" r="12" fill="lightgray" stroke-width="2" stroke="gray"/>
-            <polygon points="11,9 22,15 11,21" fill="gray" stroke="gray" stroke-width="2" stroke-linejoin="round"/>
-          </a>
-          <a id="pauseGroup" display="none" onclick="Pause()">
-            <circle id="pause" cx="15" cy="15" r="12" fill="lightgray" stroke-width="2" stroke="gray"/>
-            <line x1="12" y1="10" x2="12" y2="20" stroke="gray" stroke-width="4" stroke-linecap="round"/>
-            <line x1="19" y1="10" x2="19" y2="20" stroke="gray" stroke-width="4" stroke-linecap="round"/>
-          </a>
-          <!-- the progress bar -->
-          <line x1="12" y1="10" x2="12" y2="20" stroke="gray" stroke-width="4" stroke-linecap="round">
-            <animateTransform attributeName="transform" type="translate" from="20 0" to="220 0" begin="0s" dur="{duration}s" repeatCount="indefinite" />
-          </line>
-          <!-- the timeline as a series of clickable dots -->
-          {timeline}
-        </g>
-      </g>
-    """)
     def time_dot(f):
-        dot = code.template("""
-          <a display="inline" onclick="Reset({timepoint})">
-            <circle cx="{timemark}" cy="15" r="2" fill="gray" stroke-width="0" stroke="gray"/>
-          </a>
-        """)
-        return dot(timepoint=_flt(f*duration), timemark=_flt(offset+(f*length)))
+        return _time_dot_template(timepoint=_flt(f*duration), timemark=_flt(offset+(f*length)))
     control_x, control_y, control_scale = control_location
     timeline = "".join( time_dot(_fudge*i/dot_count) for i in range(dot_count+1) )
-    return controls(duration=duration, timeline=timeline, control_x=control_x, control_y=control_y, control_scale=control_scale)
+    return _controls_template(duration=duration, timeline=timeline, control_x=control_x, control_y=control_y, control_scale=control_scale)
+
+_external_frame_template = code.template("""
+  <image width="100%" height="100%" xlink:href="{filename}">
+    {animate}
+  </image>
+""")
+
+_embedded_frame_template = code.template("""
+  <g>
+    {image_code}
+    {animate}
+  </g>
+""")
+
+_frame_display_template = code.template("""
+  <animate attributeName='display' values='{display}' dur='{duration}s' begin='0.0s' repeatCount="indefinite"/>
+""")
 
 def frame(*, filename=None, image_code=None, duration=None, index=None, count=None):
     if (filename and image_code) or not (filename or image_code):
         raise RuntimeError("one (and only one) of filename or image_code can be specified to make an animation frame")
-    external_image = code.template("""
-      <image width="100%" height="100%" xlink:href="{filename}">
-        {animate}
-      </image>
-    """)
-    embedded_image = code.template("""
-      <g>
-        {image_code}
-        {animate}
-      </g>
-    """)
-    animate_it = code.template("""
-      <animate attributeName='display' values='{display}' dur='{duration}s' begin='0.0s' repeatCount="indefinite"/>
-    """)
     if duration:
         display = ["none"]*count
         display[index] = "inline"
-        animate  = animate_it(display=";".join(display), duration=duration)
+        animate  = _frame_display_template(display=";".join(display), duration=duration)
     else:
         animate  = ""
     if filename:
-        return external_image(    filename=filename, animate=animate)
+        return _external_frame_template(    filename=filename, animate=animate)
     else:
-        return embedded_image(image_code=image_code, animate=animate)
+        return _embedded_frame_template(image_code=image_code, animate=animate)
@@ -16,6 +16,7 @@
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import math
+import numbers
 from .external import struct, as_tuple, as_dict, int_round, shell, code_template    # here for further export (this is where they would be defined if written locally)
 
 
@@ -28,6 +29,10 @@ def nested(*, outer, inner):
     """ nests single-parameter functions """
     def nest(arg):
         return outer(inner(arg))
+    inner_chain = [] if (inner is echo) else getattr(inner, "_chain_", None)    # keep nested variable evaluators decomposable into
+    outer_chain = [] if (outer is echo) else getattr(outer, "_chain_", None)    # their chain of substitution dictionaries (see varval.py)
+    if (inner_chain is not None) and (outer_chain is not None):
+        nest._chain_ = inner_chain + outer_chain
     return nest
 
 
@@ -36,6 +41,32 @@ float_eq = lambda x,y:  math.isclose(x,y, rel_tol=1e-14)
 
 
 
+def bounding_box(geometry, pad=0):
+    """ returns (xmin, ymin, xmax, ymax) of the points found in (possibly nested or animated) geometry, grown by pad, or None if it cannot be sure """
+    points = []
+    def collect(value):
+        if isinstance(value, (list, tuple)):
+            if len(value)>=2 and isinstance(value[0], numbers.Real) and isinstance(value[1], numbers.Real):
+                if len(value)>2:  raise ValueError    # an arc can bulge well beyond its end points
+                points.append(value)
+            else:
+                for item in value:  collect(item)    # lists of points, or keyframes (times are not pairs)
+        elif not (value is None or isinstance(value, numbers.Real)):
+            raise ValueError    # something not understood (eg, an array), so no promises
+    try:
+        collect(geometry)
+    except ValueError:
+        return None
+    if not points:  return None
+    x, y = zip(*points)
+    return min(x)-pad, min(y)-pad, max(x)+pad, max(y)+pad
+
+def boxes_meet(a, b):
+    """ whether two boxes, given as (xmin, ymin, xmax, ymax), touch or overlap """
+    return (a[0]<=b[2]) and (a[2]>=b[0]) and (a[1]<=b[3]) and (a[3]>=b[1])
+
+
+
 def valid_real_number(variable, condition):
     x, name = variable
     condition_expression, textual_condition = condition 
@@ -0,0 +1,337 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import zlib
+import struct as binary    # not to be confused with the util struct (a SimpleNamespace)
+import numpy
+
+
+
+#   Encoders that take pixel buffers (NumPy arrays of 8-bit channels, outer index enumerating rows from the top)
+# and return the bytes of an image file, with no help from external programs.  These grew out of the bmp writer
+# in TonyUtil (outputs/raster.py), but they work on whole arrays at a time, rather than pixel by pixel.
+
+
+
+def valid_pixels(pixels, grayscale=False):
+    """ returns an (H,W,4) array of 8-bit RGBA channels, given an RGB(A) array of 8-bit integers (or floats between 0 and 1), optionally converted to grayscale """
+    try:
+        array = numpy.asarray(pixels)
+        _, _, channels = array.shape
+    except ValueError:
+        raise ValueError( "pixels should be a (height, width, 3 or 4) array: {}".format(repr(pixels)) )
+    if (channels not in (3,4)) or (array.size==0):
+        raise ValueError( "pixels should be a non-empty (height, width, 3 or 4) array, got shape {}".format(array.shape) )
+    if array.dtype.kind=="f":
+        array = numpy.rint(255*numpy.clip(array,0,1))
+    elif array.dtype.kind not in "ui":
+        raise ValueError( "pixel channels should be integers or floats, got {}".format(array.dtype) )
+    array = numpy.clip(array, 0, 255).astype(numpy.uint8)
+    if channels==3:
+        array = numpy.concatenate((array, numpy.full(array.shape[:2]+(1,), 255, dtype=numpy.uint8)), axis=2)    # opaque
+    if grayscale:
+        gray = numpy.rint(array[...,:3] @ numpy.array([0.2126, 0.7152, 0.0722])).astype(numpy.uint8)    # same weights as for color codes
+        array = numpy.concatenate((numpy.repeat(gray[...,None], 3, axis=2), array[...,3:]), axis=2)
+    return array
+
+
+
+### PNG (lossless, with alpha channel), including the animated extension (APNG)
+
+def png_chunk(kind, data):
+    """ returns the bytes of a PNG chunk of the given (4-letter) kind """
+    kind = kind.encode("ascii")
+    return binary.pack(">I", len(data)) + kind + data + binary.pack(">I", zlib.crc32(kind+data))
+
+png_signature = b"\x89PNG\r\n\x1a\n"
+
+def png_header(width, height):
+    """ returns the IHDR chunk for an 8-bit RGBA image of the given size """
+    return png_chunk("IHDR", binary.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+def png_data(pixels, level=6):
+    """ returns the compressed scanlines of an (H,W,4) RGBA array, as they appear in IDAT (or fdAT) chunks """
+    rows = numpy.ascontiguousarray(pixels, dtype=numpy.uint8).reshape(len(pixels), -1)
+    up = rows.copy()
+    up[1:] -= rows[:-1]    # filter type 2 ("up") ... wraps modulo 256 as the format expects, and line art is mostly runs of identical rows
+    filtered = numpy.empty((len(rows), rows.shape[1]+1), dtype=numpy.uint8)
+    filtered[:,0]  = 2
+    filtered[:,1:] = up
+    return zlib.compress(filtered.tobytes(), level)
+
+def png(pixels, level=6):
+    """ returns the bytes of a PNG file holding an (H,W,4) RGBA array """
+    height, width, _ = pixels.shape
+    return png_signature + png_header(width, height) + png_chunk("IDAT", png_data(pixels, level)) + png_chunk("IEND", b"")
+
+
+
+def apng_control(frames, loops=0):
+    """ returns the acTL chunk of an animated PNG, giving the number of frames and the number of times to play them (0 for forever) """
+    return png_chunk("acTL", binary.pack(">II", frames, loops))
+
+def apng_frame(sequence, width, height, delay):
+    """ returns the fcTL chunk of an animated PNG, for a full frame shown for delay=(numerator,denominator) seconds; the frame data follows with the next sequence number """
+    numerator, denominator = delay
+    return png_chunk("fcTL", binary.pack(">IIIIIHHBB", sequence, width, height, 0, 0, numerator, denominator, 0, 0))
+
+def apng_data(sequence, data):
+    """ returns an fdAT chunk (the analog of IDAT for all but the first frame of an animated PNG) """
+    return png_chunk("fdAT", binary.pack(">I", sequence) + data)
+
+
+
+### GIF (lossless up to 256 colors per frame, binary transparency)
+
+def gif_palette(pixels):
+    """ returns an (H,W) array of color indices and a (256,3) palette for an (H,W,4) RGBA array, where index 0 is transparent """
+    # Line art has only a handful of colors, aside from the anti-aliased edges, so keeping the most frequent ones and
+    # mapping the rest to the nearest of those does better than a generic color cube.
+    rgb = pixels[...,:3].reshape(-1,3).astype(numpy.int64)
+    packed = (rgb[:,0] << 16) | (rgb[:,1] << 8) | rgb[:,2]
+    opaque = (pixels[...,3].reshape(-1) >= 128)
+    colors, inverse, counts = numpy.unique(packed[opaque], return_inverse=True, return_counts=True)
+    unpacked = numpy.stack(((colors >> 16) & 255, (colors >> 8) & 255, colors & 255), axis=1)
+    kept = numpy.argsort(-counts, kind="stable")[:255]
+    if len(colors)>255:
+        distance = ((unpacked[:,None,:] - unpacked[None,kept,:])**2).sum(axis=2)    # unique colors by kept colors
+        nearest = numpy.argmin(distance, axis=1)
+    else:
+        nearest = numpy.argsort(kept)
+    indices = numpy.zeros(len(packed), dtype=numpy.int64)
+    indices[opaque] = nearest[inverse] + 1
+    palette = numpy.zeros((256,3), dtype=numpy.uint8)
+    palette[1:len(kept)+1] = unpacked[kept]
+    return indices.reshape(pixels.shape[:2]), palette
+
+def gif_lzw(indices):
+    """ returns the LZW-compressed image data (in sub-blocks) for an array of 8-bit color indices """
+    clear, end = 256, 257
+    table = {bytes([i]):i for i in range(256)}
+    size, width = 258, 9    # next code and current code width
+    out, bits, count = bytearray(), clear, width
+    def emit(code):
+        nonlocal bits, count
+        bits |= code << count
+        count += width
+    data = numpy.asarray(indices, dtype=numpy.uint8).tobytes()
+    current = data[:1]
+    for i in range(1, len(data)):
+        extended = current + data[i:i+1]
+        if extended in table:
+            current = extended
+        else:
+            emit(table[current])
+            if size==4096:
+                emit(clear)
+                table = {bytes([i]):i for i in range(256)}
+                size, width = 258, 9
+            else:
+                table[extended] = size
+                size += 1
+                if size>(1<<width) and width<12:  width += 1
+            current = data[i:i+1]
+            if count>=64:
+                full = count//8
+                out += (bits & ((1<<(8*full))-1)).to_bytes(full, "little")
+                bits >>= 8*full
+                count -= 8*full
+    if current:  emit(table[current])
+    emit(end)
+    out += bits.to_bytes((count+7)//8, "little")
+    blocks = b"".join(bytes([len(out[i:i+255])]) + out[i:i+255] for i in range(0, len(out), 255))
+    return bytes([8]) + blocks + b"\x00"
+
+def gif_header(width, height, loops=0):
+    """ returns the beginning of a GIF file (without a global color table), including the looping extension (0 for forever) """
+    return b"GIF89a" + binary.pack("<HHBBB", width, height, 0, 0, 0) + b"\x21\xFF\x0BNETSCAPE2.0\x03\x01" + binary.pack("<H", loops) + b"\x00"
+
+def gif_frame(pixels, delay):
+    """ returns the bytes of one (full, replacing) frame of a GIF for an (H,W,4) RGBA array, shown for delay centiseconds """
+    height, width, _ = pixels.shape
+    indices, palette = gif_palette(pixels)
+    control = b"\x21\xF9\x04" + binary.pack("<BHB", (2<<2)|1, delay, 0) + b"\x00"    # dispose to background; index 0 is transparent
+    descriptor = b"\x2C" + binary.pack("<HHHHB", 0, 0, width, height, 0x87)          # local color table of 256 colors
+    return control + descriptor + palette.tobytes() + gif_lzw(indices)
+
+gif_trailer = b"\x3B"
+
+
+
+### JPEG (baseline, lossy, no alpha channel)
+# Everything below is from the standard (ITU T.81), using the example quantization and Huffman tables of its Annex K,
+# scaled for quality the same way as the IJG library.  Entropy coding is vectorized over all blocks of the image.
+
+_zigzag = numpy.array([
+     0,  1,  8, 16,  9,  2,  3, 10, 17, 24, 32, 25, 18, 11,  4,  5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13,  6,  7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63
+])
+
+_luma_quantization = numpy.array([
+    16, 11, 10, 16,  24,  40,  51,  61,    12, 12, 14, 19,  26,  58,  60,  55,
+    14, 13, 16, 24,  40,  57,  69,  56,    14, 17, 22, 29,  51,  87,  80,  62,
+    18, 22, 37, 56,  68, 109, 103,  77,    24, 35, 55, 64,  81, 104, 113,  92,
+    49, 64, 78, 87, 103, 121, 120, 101,    72, 92, 95, 98, 112, 100, 103,  99
+])
+
+_chroma_quantization = numpy.array([
+    17, 18, 24, 47, 99, 99, 99, 99,    18, 21, 26, 66, 99, 99, 99, 99,
+    24, 26, 56, 99, 99, 99, 99, 99,    47, 66, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,    99, 99, 99, 99, 99, 99, 99, 99
+])
+
+# Huffman tables as (number of codes of each length 1-16, symbols in order of increasing code)
+_luma_dc   = ((0,1,5,1,1,1,1,1,1,0,0,0,0,0,0,0), list(range(12)))
+_chroma_dc = ((0,3,1,1,1,1,1,1,1,1,1,0,0,0,0,0), list(range(12)))
+_luma_ac   = ((0,2,1,3,3,2,4,3,5,5,4,4,0,0,1,0x7d), bytes.fromhex(
+    "01020300041105122131410613516107227114328191a1082342b1c11552d1f02433627282090a161718191a25262728292a3435363738393a434445464748494a"
+    "535455565758595a636465666768696a737475767778797a838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7"
+    "c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9fa"))
+_chroma_ac = ((0,2,1,2,4,4,3,4,7,5,4,4,0,1,2,0x77), bytes.fromhex(
+    "000102031104052131061241510761711322328108144291a1b1c109233352f0156272d10a162434e125f11718191a262728292a35363738393a434445464748494a"
+    "535455565758595a636465666768696a737475767778797a82838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7"
+    "c8c9cad2d3d4d5d6d7d8d9dae2e3e4e5e6e7e8e9eaf2f3f4f5f6f7f8f9fa"))
+
+def _huffman_codes(table):
+    """ returns arrays of codes and code lengths indexed by symbol, for a table in the form above """
+    counts, symbols = table
+    codes, lengths = numpy.zeros(256, dtype=numpy.int64), numpy.zeros(256, dtype=numpy.int64)
+    code, i = 0, 0
+    for length,count in enumerate(counts, start=1):
+        for _ in range(count):
+            codes[symbols[i]], lengths[symbols[i]] = code, length
+            code += 1
+            i    += 1
+        code <<= 1
+    return codes, lengths
+
+def _dct_matrix():
+    k, n = numpy.meshgrid(numpy.arange(8), numpy.arange(8), indexing="ij")
+    C = numpy.cos((2*n+1) * k * numpy.pi / 16) / 2
+    C[0] /= numpy.sqrt(2)
+    return C
+
+def _scaled_quantization(table, quality):
+    quality = min(max(int(quality), 1), 100)
+    scale = (5000 // quality) if (quality<50) else (200 - 2*quality)
+    return numpy.clip((table*scale + 50) // 100, 1, 255)
+
+def _magnitude(values):
+    """ returns the JPEG size category (bit count) and the bits that encode each value in the array """
+    size = numpy.zeros(values.shape, dtype=numpy.int64)
+    nonzero = (values!=0)
+    size[nonzero] = numpy.floor(numpy.log2(numpy.abs(values[nonzero]))).astype(numpy.int64) + 1
+    bits = numpy.where(values<0, values + (1<<size) - 1, values)    # one's complement for negatives
+    return size, bits
+
+def _entropy_coded(blocks, component, tables):
+    """ returns the entropy-coded bytes of the quantized (B,64) blocks (zigzag order, interleaved in scan order), given the component index of each block """
+    B = len(blocks)
+    dc_codes, dc_lengths, ac_codes, ac_lengths = tables                 # each indexed by [component, symbol]
+    # DC coefficients are coded as differences from the previous block of the same component
+    dc = blocks[:,0].copy()
+    for c in numpy.unique(component):
+        these = (component==c)
+        dc[these] = numpy.diff(blocks[these,0], prepend=0)
+    size, bits = _magnitude(dc)
+    events_block  = [numpy.arange(B)]
+    events_order  = [numpy.zeros(B, dtype=numpy.int64)]
+    events_code   = [(dc_codes[component,size] << size) | bits]
+    events_length = [dc_lengths[component,size] + size]
+    # AC coefficients are coded as (run of zeros, size) symbols, with runs of 16 zeros ("ZRL") as needed and an end-of-block symbol
+    b, k = numpy.nonzero(blocks[:,1:])
+    values = blocks[:,1:][b,k]
+    previous = numpy.full(len(k), -1)
+    same = numpy.concatenate(([False], b[1:]==b[:-1]))
+    previous[same] = k[:-1][same[1:]]
+    run = k - previous - 1
+    size, bits = _magnitude(values)
+    symbol = ((run % 16) << 4) | size
+    comp = component[b]
+    events_block  += [b]
+    events_order  += [2*k + 2]
+    events_code   += [(ac_codes[comp,symbol] << size) | bits]
+    events_length += [ac_lengths[comp,symbol] + size]
+    zrl = run // 16
+    zb = numpy.repeat(b, zrl)
+    events_block  += [zb]
+    events_order  += [numpy.repeat(2*k + 1, zrl)]
+    events_code   += [ac_codes[component[zb],0xF0]]
+    events_length += [ac_lengths[component[zb],0xF0]]
+    last = numpy.full(B, -1)
+    numpy.maximum.at(last, b, k)
+    eob = numpy.nonzero(last<62)[0]
+    events_block  += [eob]
+    events_order  += [numpy.full(len(eob), 200)]
+    events_code   += [ac_codes[component[eob],0x00]]
+    events_length += [ac_lengths[component[eob],0x00]]
+    # put events in order and pack them into a bit stream
+    block, order = numpy.concatenate(events_block), numpy.concatenate(events_order)
+    ordering = numpy.lexsort((order, block))
+    code   = numpy.concatenate(events_code)[ordering]
+    length = numpy.concatenate(events_length)[ordering]
+    position = numpy.repeat(length, length) - (numpy.arange(length.sum()) - numpy.repeat(numpy.cumsum(length)-length, length)) - 1
+    stream = (numpy.repeat(code, length) >> position) & 1
+    stream = numpy.concatenate((stream, numpy.ones((-len(stream)) % 8, dtype=stream.dtype)))    # pad with 1 bits
+    data = numpy.packbits(stream.astype(numpy.uint8))
+    stuffed = numpy.nonzero(data==0xFF)[0] + 1
+    return numpy.insert(data, stuffed, 0).tobytes()    # a 0xFF byte of data must be followed by 0x00
+
+def _jpg_segment(marker, data):
+    return binary.pack(">BBH", 0xFF, marker, len(data)+2) + data
+
+def jpg(pixels, quality=90):
+    """ returns the bytes of a (baseline, 4:4:4) JPEG file holding an (H,W,3) RGB array """
+    height, width, _ = pixels.shape
+    rgb = numpy.asarray(pixels, dtype=float)
+    rgb = numpy.pad(rgb, ((0,(-height)%8), (0,(-width)%8), (0,0)), mode="edge")    # whole blocks, repeating the edges
+    r, g, b = rgb[...,0], rgb[...,1], rgb[...,2]
+    components = (
+         0.299   *r + 0.587   *g + 0.114   *b - 128,
+        -0.168736*r - 0.331264*g + 0.5     *b,
+         0.5     *r - 0.418688*g - 0.081312*b
+    )
+    quantization = [_scaled_quantization(_luma_quantization,   quality)] + 2*[_scaled_quantization(_chroma_quantization, quality)]
+    C = _dct_matrix()
+    blocks = []
+    for Y,Q in zip(components, quantization):
+        tiles = Y.reshape(Y.shape[0]//8, 8, Y.shape[1]//8, 8).transpose(0,2,1,3)
+        coefficients = numpy.einsum("ij,abjk,lk->abil", C, tiles, C).reshape(-1, 64)
+        blocks += [numpy.rint(coefficients / Q).astype(numpy.int64)[:,_zigzag]]
+    B = len(blocks[0])
+    blocks = numpy.stack(blocks, axis=1).reshape(3*B, 64)    # one block of each component per MCU, in order
+    component = numpy.tile(numpy.arange(3), B)
+    dc = [_huffman_codes(_luma_dc), _huffman_codes(_chroma_dc), _huffman_codes(_chroma_dc)]
+    ac = [_huffman_codes(_luma_ac), _huffman_codes(_chroma_ac), _huffman_codes(_chroma_ac)]
+    tables = [numpy.stack([t[i] for t in dc]) for i in (0,1)] + [numpy.stack([t[i] for t in ac]) for i in (0,1)]
+    huffman = b""
+    for index,table in ((0x00,_luma_dc), (0x01,_chroma_dc), (0x10,_luma_ac), (0x11,_chroma_ac)):
+        counts, symbols = table
+        huffman += bytes([index, *counts]) + bytes(symbols)
+    return b"".join((
+        b"\xFF\xD8",
+        _jpg_segment(0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"),
+        _jpg_segment(0xDB, b"".join(bytes([i]) + bytes(Q[_zigzag].astype(numpy.uint8)) for i,Q in enumerate(quantization[:2]))),
+        _jpg_segment(0xC0, binary.pack(">BHHB", 8, height, width, 3) + bytes([1,0x11,0, 2,0x11,1, 3,0x11,1])),
+        _jpg_segment(0xC4, huffman),
+        _jpg_segment(0xDA, bytes([3, 1,0x00, 2,0x11, 3,0x11, 0, 63, 0])),
+        _entropy_coded(blocks, component, tables),
+        b"\xFF\xD9"
+    ))
@@ -15,51 +15,173 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
-from .general import struct, as_dict, nested
+import inspect
+from .general import struct, as_dict, nested, echo
 
 
 
 # These implement the functionality that allows the user to delay specification of certain entity properties by substituting a string of
 # their choice in its stead.  Since evaluation is lazy (done only at render time), the value can be passed in later, usually inherited from
-# a parent composite object.  The inner function of variable_evaluator does the actual resolving of the substitution.  It is only meant for
-# use on simple, hashable datatypes, (nested) tuples/lists/dicts/structs thereof, or a more complex objects that has the _value_() special
-# method defined.  Crazy things might happen if given some more complicated object (unless _value_() is defined).
+# a parent composite object.  The function _evaluate does the actual resolving of the substitution.  It is only meant for use on simple,
+# hashable datatypes, (nested) tuples/lists/dicts/structs thereof, or a more complex objects that has the _value_() special method defined.
+# Crazy things might happen if given some more complicated object (unless _value_() is defined).
+
+_plain = (str, int, float, bool, complex, type(None))    # exact types that can be neither callable, nor containers, nor implement _value_
+
+def _evaluate(substitutions, obj):
+    """ evaluates the context-dependent value of obj (or its components) and returns it; might just be itself, a simple substitution, or a user-implemented alogorithm to decide """
+    if type(obj) in _plain:
+        return substitutions.get(obj, obj)    # shortcut to the same result as the trials below would give
+    try:
+        value = obj._value_(substitutions)    # if the special method _value_ is implemented the dictionary acts as input for an arbitrary algorithm
+    except AttributeError:
+        try:
+            succeeded = False
+            for k,v in substitutions.items():         # otherwise go one by one and see if object is callable with *single* keyword argument from substitutions
+                try:
+                    value = obj(**{k:v})
+                except:
+                    pass
+                else:
+                    if succeeded:
+                        raise ValueError("multiple matching arguments for function found")    # not the most useful exception, since will then proceed with trying regular substitition, etc
+                    succeeded = True
+            if not succeeded:
+                raise ValueError("no matching arguments for function found")
+        except ValueError:
+            try:
+                value = substitutions[obj]    # if obj is hashable and found as a key in the dictionary, it is substituted
+            except (TypeError, KeyError):
+                if isinstance(obj, struct):
+                    value = struct(**{ k:_evaluate(substitutions,v) for k,v in as_dict(obj).items() })    # if it is a struct, recur inside
+                elif isinstance(obj, dict):
+                    value = { k:_evaluate(substitutions,v) for k,v in obj.items() }                       # if it is a dict, recur inside
+                elif isinstance(obj, (tuple, list)):
+                    value = type(obj)( _evaluate(substitutions,i) for i in obj )                          # if it is an iterable (but not str), recur inside
+                else:
+                    value = obj                                                                           # if none of the above (esp, string or number), leave it alone
+    return value
 
 def variable_evaluator(substitutions, *, inner=None):
     """ provides a function that converts symbolically represented variables (as strings) to their context-dependent values, based on a dictionary of substitutions """
     def varval(obj):
-        """ evaluates the context-dependent value of obj (or its components) and returns it; might just be itself, a simple substitution, or a user-implemented alogorithm to decide """
-        try:
-            value = obj._value_(substitutions)    # if the special method _value_ is implemented the dictionary acts as input for an arbitrary algorithm
-        except AttributeError:
+        return _evaluate(substitutions, obj)
+    varval._chain_ = [substitutions]    # see substitution_plan below
+    if inner:
+        return nested(outer=varval, inner=inner)
+    else:
+        return varval
+
+
+
+# A (nested) variable evaluator applies a chain of substitution dictionaries, innermost first, and it rediscovers by trial and error where
+# the substitutions and callables sit in an object on every call.  A substitution plan walks the object once per chain (of the same
+# dictionaries if fixed=True, or dictionaries with the same keys otherwise), records those slots, and then replays only those on later
+# calls.  Slots that cannot be decided once and for all (callables that do not take the keys, results of calls, etc) are handed to the
+# trial-and-error evaluation, so the result is always the same as that of calling the evaluator on the object directly.
+
+def _generic(obj, chain, i):
+    for substitutions in chain[i:]:
+        obj = _evaluate(substitutions, obj)
+    return obj
+
+def _keywords(obj, keys):
+    """ returns those of keys that callable obj might take as a single keyword argument (all of them if its signature is unknown) """
+    try:
+        parameters = inspect.signature(obj).parameters.values()
+    except (TypeError, ValueError):
+        return list(keys)
+    if any(p.kind is p.VAR_KEYWORD for p in parameters):
+        return list(keys)
+    names = {p.name for p in parameters if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)}
+    return [k for k in keys if k in names]
+
+def _compile(obj, chain, i, fixed):
+    """ returns a function of a chain of substitution dictionaries that gives the result of applying chain[i:] to obj, or None if obj is left alone """
+    if i==len(chain):
+        return None
+    substitutions = chain[i]
+    if type(obj) in _plain:
+        if obj in substitutions:
+            return lambda chain: _generic(chain[i][obj], chain, i+1)
+        else:
+            return _compile(obj, chain, i+1, fixed)
+    try:
+        obj._value_
+    except AttributeError:
+        pass
+    else:
+        return lambda chain: _generic(obj, chain, i)    # arbitrary user algorithm
+    if callable(obj) and not isinstance(obj, struct):    # struct.__call__ never takes keyword arguments
+        matches = []
+        for k,v in substitutions.items():
             try:
-                succeeded = False
-                for k,v in substitutions.items():         # otherwise go one by one and see if object is callable with *single* keyword argument from substitutions
-                    sucess = True
+                obj(**{k:v})
+            except:
+                pass
+            else:
+                matches += [k]
+        if len(matches)==1:
+            k, = matches
+            others = [] if fixed else [key for key in _keywords(obj, substitutions) if key!=k]    # might match for other values
+            def call(chain):
+                try:
+                    value = obj(**{k:chain[i][k]})
+                except:
+                    return _generic(obj, chain, i)
+                for key in others:
                     try:
-                        value = obj(**{k:v})
+                        obj(**{key:chain[i][key]})
                     except:
-                        success = False
-                    else:
-                        if succeeded:
-                            raise ValueError("multiple matching arguments for function found")    # not the most useful exception, since will then proceed with trying regular substitition, etc
-                        succeeded = True
-                if not succeeded:
-                    raise ValueError("no matching arguments for function found")
-            except ValueError:
-                try:
-                    value = substitutions[obj]    # if obj is hashable and found as a key in the dictionary, it is substituted
-                except (TypeError, KeyError):
-                    if isinstance(obj, struct):
-                        value = struct(**{ k:varval(v) for k,v in as_dict(obj).items() })    # if it is a struct, recur inside
-                    elif isinstance(obj, dict):
-                        value = { k:varval(v) for k,v in obj.items() }                       # if it is a dict, recur inside
-                    elif isinstance(obj, (tuple, list)):
-                        value = type(obj)( varval(i) for i in obj )                          # if it is an iterable (but not str), recur inside
+                        pass
                     else:
-                        value = obj                                                          # if none of the above (esp, string or number), leave it alone
-        return value
-    if inner:
-        return nested(outer=varval, inner=inner)
+                        return _generic(obj, chain, i)    # more than one match, which the evaluator handles
+                return _generic(value, chain, i+1)
+            return call
+        elif not fixed:
+            return lambda chain: _generic(obj, chain, i)    # might match for other values of the same keys
+    try:
+        substituted = obj in substitutions
+    except TypeError:
+        substituted = False
+    if substituted:
+        return lambda chain: _generic(chain[i][obj], chain, i+1)
+    if isinstance(obj, (struct, dict)):
+        items = [(k, v, _compile(v, chain, i, fixed)) for k,v in (as_dict(obj) if isinstance(obj, struct) else obj).items()]
+        if type(obj) in (struct, dict) and all(item is None for k,v,item in items):
+            return None    # evaluator would just make a copy
+        if isinstance(obj, struct):
+            return lambda chain: struct(**{k:(v if item is None else item(chain)) for k,v,item in items})
+        else:
+            return lambda chain: {k:(v if item is None else item(chain)) for k,v,item in items}
+    elif isinstance(obj, (tuple, list)):
+        items = [(v, _compile(v, chain, i, fixed)) for v in obj]
+        if type(obj) in (tuple, list) and all(item is None for v,item in items):
+            return None
+        return lambda chain: type(obj)((v if item is None else item(chain)) for v,item in items)
     else:
-        return varval
+        return _compile(obj, chain, i+1, fixed)
+
+class substitution_plan(object):
+    """ evaluates obj as a given (nested) variable evaluator would, but replays a record of where substitutions and callables sit in obj """
+    _cached = 16    # plans kept (those used least recently are dropped), since copies of an entity share its plan, each with its own dictionaries
+    def __init__(self, obj, *, fixed=False):
+        self._obj      = obj
+        self._fixed    = fixed    # if True, plans are specific to the substitution dictionaries themselves, otherwise just to their keys
+        self._compiled = {}
+    def __call__(self, varval):
+        chain = [] if (varval is echo) else getattr(varval, "_chain_", None)
+        if chain is None:
+            return varval(self._obj)    # some opaque function
+        if self._fixed:  key = tuple(id(substitutions) for substitutions in chain)
+        else:            key = tuple(tuple(substitutions) for substitutions in chain)
+        try:
+            compiled_chain, plan = self._compiled.pop(key)
+        except KeyError:
+            compiled_chain, plan = chain, _compile(self._obj, chain, 0, self._fixed)
+            if len(self._compiled)>=self._cached:  del self._compiled[next(iter(self._compiled))]
+        self._compiled[key] = compiled_chain, plan    # most recently used last ... holding the dictionaries keeps their ids unique
+        if plan is None:
+            return self._obj
+        else:
+            return plan(chain)
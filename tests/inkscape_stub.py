@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   This stands in for Inkscape when testing the pdf and jpg conversions without it (see renderers/jpg_pdf.py), as in
+#     pytoon.local.inkscape = "python3 tests/inkscape_stub.py"
+# It answers to --version, and to the command-line options used by the conversion scripts, and in --shell mode it reads
+# the same options from stdin, one conversion per line, answering each with a prompt, like Inkscape 0.92.  Instead of a
+# pdf, it writes a copy of the svg file.  If the environment variable INKSCAPE_STUB_LOG names a file, a line is added to
+# it for each process started and each conversion done, so that a test can count them, and INKSCAPE_STUB_DELAY gives the
+# seconds that each conversion takes (so that a test can keep several workers busy at once).
+#
+import os
+import sys
+import shlex
+import time
+import shutil
+
+def log(line):
+    if os.environ.get("INKSCAPE_STUB_LOG"):
+        with open(os.environ["INKSCAPE_STUB_LOG"], "a") as stream:  stream.write(line+"\n")
+
+def convert(arguments):
+    source, target = None, None
+    for argument in arguments:
+        if   argument.startswith("--file="):        source = argument[len("--file="):]
+        elif argument.startswith("--export-pdf="):  target = argument[len("--export-pdf="):]
+        elif not argument.startswith("-"):          source = argument
+    if (source is None) or (target is None):
+        print("inkscape stub: needs an svg file and --export-pdf", file=sys.stderr)
+        return
+    time.sleep(float(os.environ.get("INKSCAPE_STUB_DELAY", 0)))
+    shutil.copyfile(source, target)
+    log("convert {}".format(source))
+
+if __name__ == "__main__":
+    if "--version" in sys.argv:
+        print("Inkscape 0.92.0 (stub)")
+    elif "--shell" in sys.argv:
+        log("start {}".format(os.getpid()))
+        sys.stdout.write("Inkscape 0.92.0 (stub) interactive shell mode. Type 'quit' to quit.\n>")
+        sys.stdout.flush()
+        for line in sys.stdin:
+            if line.strip()=="quit":  break
+            if line.strip():  convert(shlex.split(line))
+            sys.stdout.write(">")
+            sys.stdout.flush()
+    else:
+        log("start {}".format(os.getpid()))
+        convert(sys.argv[1:])
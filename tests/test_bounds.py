@@ -0,0 +1,58 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import re
+import math
+import random
+import numpy
+import pytest
+from pytoon import circle, translate
+from pytoon.renderers.base import arc_center, arc_extents
+
+
+
+def sampled(begin, end, rx, ry, phi, large, sweep, n=20001):
+    # the x and y coordinates of n points along an arc
+    (cx, cy), (rx, ry), (cos, sin), theta1, dtheta = arc_center(begin, end, rx, ry, phi, large, sweep)
+    t = theta1 + numpy.linspace(0, 1, n)*dtheta
+    return cx + rx*numpy.cos(t)*cos - ry*numpy.sin(t)*sin, cy + rx*numpy.cos(t)*sin + ry*numpy.sin(t)*cos
+
+def test_arc_extents():
+    random.seed(0)
+    arcs  = [((0,0), (2,0), 1, 1, 0, large, sweep) for large in (0,1) for sweep in (0,1)]    # half circles
+    arcs += [((0,0), (10,0), 1, 1, 0, 0, 1)]                                                  # radii scaled up
+    arcs += [((random.uniform(-5,5), random.uniform(-5,5)), (random.uniform(-5,5), random.uniform(-5,5)), random.uniform(0.5,6), random.uniform(0.5,6), random.uniform(-180,180), random.randint(0,1), random.randint(0,1)) for _ in range(200)]
+    for arc in arcs:
+        x, y = sampled(*arc)
+        (x1, y1), (x2, y2) = arc[:2]
+        assert (x[0], y[0], x[-1], y[-1]) == pytest.approx((x1, y1, x2, y2))    # the sampling follows the arc
+        ex, ey = arc_extents(*arc)
+        assert (ex.min(), ex.max(), ey.min(), ey.max()) == pytest.approx((x.min(), x.max(), y.min(), y.max()), abs=1e-6)
+
+def test_degenerate_arcs():
+    for arc in [((1,1), (1,1), 1, 1, 0, 0, 1), ((0,0), (1,1), 0, 1, 0, 0, 1)]:
+        assert arc_center(*arc) is None
+        ex, ey = arc_extents(*arc)
+        assert (list(ex), list(ey)) == ([arc[0][0], arc[1][0]], [arc[0][1], arc[1][1]])    # just the endpoints
+
+def test_moving_circle_is_in_view(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    moving = circle(radius=2, lstyle=False, fstyle="red")(transform=translate(lambda _t_: 10*_t_, 0).animated(Dt=0.5))
+    code = moving.svg(None, time=(0,1), duration=1, controls=False)
+    x0, y0, width, height = (float(v) for v in re.search(r'viewBox="([^"]*)"', code).group(1).split())
+    assert (x0 <= -2) and (x0+width >= 12)       # the circle at both ends
+    assert (y0 <= -2) and (y0+height >= 2)
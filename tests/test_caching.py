@@ -0,0 +1,76 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import pytest
+from pytoon import composite, circle, rotate, fragment_cache
+
+
+
+def spin(T):
+    return rotate(rad=lambda _t_: _t_/T).animated(Dt=T/4)    # functions go into the key by identity, so this is shared
+
+def scene(spinning=None, special="red"):
+    # a composite of composites (so that a subtree can be reused), optionally spinning
+    rows = [composite([circle(center=(10*i,10*j), radius=3, fstyle="blue") for i in range(4)]) for j in range(3)]
+    special = circle(center=(15,-10), radius=5, fstyle=special)
+    image = composite([*rows, special])
+    if spinning is not None:  image = image(transform=spinning)
+    return image
+
+outputs = {
+    "svg":         (lambda image, cache: image.svg(None, cache=cache)),
+    "compact svg": (lambda image, cache: image.svg(None, encoding="compact", cache=cache)),
+    "png":         (lambda image, cache: image.png(None, cache=cache)),
+    "animated":    (lambda image, cache: image.svg(None, time=(0,1), duration=1, cache=cache)),
+}
+
+@pytest.mark.parametrize("name", outputs)
+def test_same_output_with_cache(name, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    render = outputs[name]
+    spinning = spin(T=1) if (name=="animated") else None
+    image, edited = scene(spinning), scene(spinning, special="green")
+    cache = fragment_cache()
+    assert render(image, cache) == render(image, None)
+    assert (cache.hits, cache.misses) == (0, 17)    # everything drawn once (4 composites, 13 circles)
+    assert render(image, cache) == render(image, None)
+    assert (cache.hits, cache.misses) == (1, 17)    # all of it from the top
+    assert render(edited, cache) == render(edited, None)
+    assert (cache.hits, cache.misses) == (4, 19)    # only the top and the edited circle are redrawn
+
+def test_cache_is_keyed_by_settings_and_time(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    image, cache = scene(spin(T=1)), fragment_cache()
+    image.svg(None, time=0, cache=cache)
+    image.svg(None, time=0.5, cache=cache)
+    image.svg(None, time=0.5, grayscale=True, cache=cache)
+    assert cache.hits == 0
+    image.svg(None, time=0.5, cache=cache)
+    assert cache.hits == 1
+
+def test_rebuilt_scene_is_found(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = fragment_cache()
+    scene().svg(None, cache=cache)
+    scene().svg(None, cache=cache)    # equal, not the same objects
+    assert cache.hits == 1
+
+def test_memory_bound(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    image, cache = scene(), fragment_cache(max_bytes=200)
+    assert image.svg(None, cache=cache) == image.svg(None, cache=cache) == image.svg(None)
+    assert cache.bytes <= 200
@@ -0,0 +1,98 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#   The pdf conversions, with tests/inkscape_stub.py standing in for Inkscape (it copies the svg instead of making a pdf),
+# counting the processes it starts and the conversions it does from its log.
+#
+import os
+import sys
+import time
+import types
+import threading
+import pytest
+from pytoon import local, circle
+from pytoon.renderers import jpg_pdf
+
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("INKSCAPE_STUB_LOG", str(tmp_path/"stub.log"))
+    monkeypatch.setattr(local, "inkscape", "{} {}".format(sys.executable, os.path.join(os.path.dirname(__file__), "inkscape_stub.py")))
+    monkeypatch.setattr(local, "conversion_cache", None)
+    monkeypatch.setattr(local, "conversion_cache_bytes", local.conversion_cache_bytes)
+    monkeypatch.setattr(local, "inkscape_workers", 0)
+    yield lambda: [line.split()[0] for line in open(tmp_path/"stub.log")] if os.path.exists(tmp_path/"stub.log") else []
+    jpg_pdf._close_shells()
+
+
+
+def test_conversion_cache(stub, tmp_path):
+    local.conversion_cache = str(tmp_path/"cache")
+    dot = circle(radius=3, fstyle="red")
+    dot.pdf("a")
+    dot.pdf("b")                                 # the same svg, converted the same way
+    dot.pdf("c", viewport=(-5,-5,5,5))           # a different export area
+    dot(radius=4).pdf("a")                       # different svg code
+    assert stub().count("convert") == 3
+    assert len(os.listdir("cache")) == 3
+    assert sorted(name for name in os.listdir(".") if name.endswith(".svg")) == []
+    assert "r=\"4\"" in open("a.pdf").read() and "r=\"3\"" in open("b.pdf").read()
+
+def test_conversion_cache_is_bounded(stub, tmp_path):
+    local.conversion_cache = str(tmp_path/"cache")
+    circle(radius=3).pdf("a")
+    local.conversion_cache_bytes = os.path.getsize("a.pdf")
+    circle(radius=4).pdf("b")
+    assert len(os.listdir("cache")) == 1
+
+def test_workers_are_kept(stub):
+    local.inkscape_workers = 2
+    for i in range(5):  circle(radius=i+1).pdf("w{}".format(i))
+    assert stub() == ["start"] + 5*["convert"]    # one after another, so one worker is enough
+    assert 'r="5"' in open("w4.pdf").read()
+
+def test_batch_spreads_over_workers(stub, monkeypatch):
+    monkeypatch.setenv("INKSCAPE_STUB_DELAY", "0.2")    # so that both workers are needed
+    local.inkscape_workers = 2
+    with jpg_pdf.conversion_batch():
+        for i in range(4):  circle(radius=i+1).pdf("b{}".format(i))
+        circle(radius=9).pdf("b0")    # replaces the svg of the first, which is then converted once
+        assert stub() == []           # nothing converted yet
+    log = stub()
+    assert log.count("start") == 2
+    assert log.count("convert") == 4
+    assert 'r="9"' in open("b0.pdf").read()
+    assert not [name for name in os.listdir(".") if name.endswith(".svg")]
+
+def test_prompt_is_matched_exactly():
+    reading, writing = os.pipe()
+    shell = jpg_pdf._inkscape_shell.__new__(jpg_pdf._inkscape_shell)    # without starting a process
+    shell._process = types.SimpleNamespace(stdout=os.fdopen(reading, "rb"))
+    def answer():
+        os.write(writing, b"warning: could not read <svg>")    # ends in ">", but is not the prompt
+        time.sleep(0.2)
+        os.write(writing, b"\n>")
+    thread = threading.Thread(target=answer)
+    start = time.perf_counter()
+    thread.start()
+    shell._prompt()
+    assert time.perf_counter()-start >= 0.2
+    thread.join()
+    os.close(writing)
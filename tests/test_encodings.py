@@ -0,0 +1,78 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import re
+import random
+import pytest
+from pytoon import path, struct
+
+
+
+def scene_points():
+    # points over a range of sizes (random ones, and some that test the separators), and an arc
+    random.seed(1)
+    arc = struct(curve="arc", rx=-3, ry=2, skew=30)
+    points  = [(random.uniform(-50,50), random.uniform(-20,20)) for _ in range(30)]
+    points += [(5,-0.5), (5.5,-0.5), (0.5,-5), (1e-7,3), (1e-7,-1e-7), (-2.5e-12,0.25), (10,10,arc), (20,-5), (20.05,-5.05)]
+    return points
+
+def scene():
+    return path(points=scene_points(), lstyle=("black",0.5))
+
+def absolute(d):
+    # the commands of path data (M, L and A only), with the endpoints of relative ones made absolute
+    tokens = re.findall(r"[MmLlAa]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?", d)
+    assert re.sub(r"\s", "", "".join(tokens)) == re.sub(r"\s", "", d)    # nothing is left over
+    commands, x, y, letter, k = [], 0., 0., None, 0
+    while k<len(tokens):
+        if tokens[k].isalpha():
+            letter = tokens[k]
+            k += 1
+        count = 7 if (letter in "Aa") else 2
+        numbers = [float(n) for n in tokens[k:k+count]]
+        k += count
+        if letter.islower():  numbers[-2:] = numbers[-2]+x, numbers[-1]+y
+        x, y = numbers[-2:]
+        commands += [(letter.upper(), numbers)]
+        letter = {"M":"L", "m":"l"}.get(letter, letter)    # implied letter for the next command
+    return commands
+
+def path_data(encoding):
+    code = scene().svg(None, encoding=encoding)
+    _, _, width, height = (float(v) for v in re.search(r'viewBox="([^"]*)"', code).group(1).split())
+    return re.search(r' d="([^"]*)"', code).group(1), max(width, height)
+
+@pytest.mark.parametrize("encoding,resolution", [("compact",1e-4), ("print",1e-5)])
+def test_round_trip(encoding, resolution, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    exact, _ = path_data("exact")
+    rounded, size = path_data(encoding)
+    assert re.search(r"[0-9.]\.|[a-zA-Z0-9.]-", rounded)    # separators were dropped
+    exact, rounded = absolute(exact), absolute(rounded)
+    assert [letter for letter,_ in rounded] == [letter for letter,_ in exact] == ["M"] + ["L"]*35 + ["A", "L", "L"]
+    for (letter,numbers),(_,reference) in zip(rounded, exact):
+        if letter=="A":
+            assert numbers[3:5] == reference[3:5]                 # flags
+            assert numbers[2] == pytest.approx(reference[2])      # the rotation, which is not a length
+            numbers, reference = numbers[:2]+numbers[5:], reference[:2]+reference[5:]
+        for value,expected in zip(numbers, reference):
+            assert abs(value-expected) <= resolution*size
+
+def test_exact_is_exact(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    endpoints = [numbers[-2:] for _,numbers in absolute(path_data("exact")[0])]
+    assert endpoints == [[x, -y] for x,y,*_ in scene_points()]    # y is flipped on the page
@@ -0,0 +1,54 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import multiprocessing
+import pytest
+from pytoon import base, composite, circle, polygon, rotate, profiler
+
+
+
+def spinning():
+    dots = composite([circle(center=(10*i,0), radius=3, fstyle="red") for i in range(3)])(transform=rotate(rad=lambda _t_: _t_))
+    backdrop = polygon(points=[(-30,-30),(30,-30),(30,30),(-30,30)], lstyle=False, fstyle="black")    # the same viewbox for all frames
+    return composite([backdrop, dots])
+
+def render(**kwargs):
+    return spinning().svg(None, time=(0,1), duration=1, global_frames=5, **kwargs)
+
+def test_workers_give_the_same_output(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    contexts = []
+    get_context = multiprocessing.get_context
+    monkeypatch.setattr(base.multiprocessing, "get_context", lambda method: contexts.append(method) or get_context(method))
+    serial = render()
+    assert contexts == []
+    assert render(workers=2) == render(workers=3) == serial
+    assert contexts == ["fork", "fork"]
+
+def test_serial_without_fork(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    serial = render()
+    def no_pools(method):  raise AssertionError("no pool expected")
+    monkeypatch.setattr(base.multiprocessing, "get_all_start_methods", lambda: ["spawn"])
+    monkeypatch.setattr(base.multiprocessing, "get_context", no_pools)
+    assert render(workers=2) == serial
+    assert base._frame_job is None
+
+def test_workers_are_only_for_global_frames(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(RuntimeError):  spinning().svg(None, time=(0,1), duration=1, workers=2)
+    with pytest.raises(RuntimeError):  render(workers=2, profile=profiler())
@@ -0,0 +1,80 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import re
+import pytest
+from pytoon import composite, polygon
+
+
+
+def scene():
+    # copies of one shape, translated, rotated and scaled, far from the origin (the last one too large to be an instance)
+    shape = polygon(points=[(0,0), (3,0), (4,2), (2,3), (1,2.5), (-1,2), (-0.5,1)], lstyle=("black",0.5))
+    copies = [shape.S(scale).R(37*k).T(1000+310*k, -2000+170*k) for k,scale in enumerate([1, 1, 2.5, 0.3, 7.1, 1])]
+    return composite(copies + [shape.S(25).T(-900,1500)])
+
+def absolute(d):
+    # the points of path data (M and L only), with relative ones made absolute
+    tokens = re.findall(r"[MmLl]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?", d)
+    assert re.sub(r"\s", "", "".join(tokens)) == re.sub(r"\s", "", d)    # nothing is left over
+    points, x, y, letter, k = [], 0., 0., None, 0
+    while k<len(tokens):
+        if tokens[k].isalpha():
+            letter = tokens[k]
+            k += 1
+        dx, dy = float(tokens[k]), float(tokens[k+1])
+        k += 2
+        x, y = (x+dx, y+dy) if letter.islower() else (dx, dy)
+        points += [(x, y)]
+    return points
+
+def shapes(code):
+    # the points of the shapes drawn (not defined), with the transforms of use elements applied to their definitions
+    definitions = {identifier: absolute(d) for identifier,d in re.findall(r'<path id="([^"]*)" d="([^"]*)"', code)}
+    drawn = []
+    for tag in re.findall(r"<(?:path|use) [^>]*>", code):
+        if ' id="' in tag:  continue
+        if tag.startswith("<path"):
+            drawn += [absolute(re.search(r' d="([^"]*)"', tag).group(1))]
+        else:
+            identifier = re.search(r'xlink:href="#([^"]*)"', tag).group(1)
+            name, numbers = re.search(r'transform="(\w+)\(([^)]*)\)"', tag).groups()
+            numbers = [float(n) for n in numbers.split()]
+            a, b, c, d, e, f = [1, 0, 0, 1, *numbers] if (name=="translate") else numbers
+            drawn += [[(a*u + c*v + e, b*u + d*v + f) for u,v in definitions[identifier]]]
+    return drawn
+
+@pytest.mark.parametrize("encoding", [None, "compact", "print"])
+def test_instances_land_in_place(encoding, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    inline = scene().svg(None, encoding=encoding)
+    instanced = scene().svg(None, encoding=encoding, instances=True)
+    assert ("xlink" not in inline) and (" id=" not in inline)    # nothing is defined unless asked
+    assert instanced.count("<use ") == 4    # the first copy is drawn as given, and the largest is drawn inline
+    _, _, width, height = (float(v) for v in re.search(r'viewBox="([^"]*)"', inline).group(1).split())
+    if encoding is None:  tolerance = 1e-4 * max(abs(x) for shape in shapes(inline) for point in shape for x in point)    # 5 significant digits
+    else:                 tolerance = {"compact":1e-4, "print":1e-5}[encoding] * max(width, height)
+    inline, instanced = shapes(inline), shapes(instanced)
+    assert [len(shape) for shape in instanced] == [len(shape) for shape in inline] == [8]*7
+    for shape,reference in zip(instanced, inline):
+        for (x,y),(x0,y0) in zip(shape, reference):
+            assert abs(x-x0) <= tolerance
+            assert abs(y-y0) <= tolerance
+
+def test_not_for_exact(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert scene().svg(None, encoding="exact", instances=True) == scene().svg(None, encoding="exact")
@@ -0,0 +1,106 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#   Keyframe reduction (draw._canvas._reduced) and spline easing (renderers.svg.renderer_base._eased), checked by sampling
+# the animations as a browser would play them.
+#
+import re
+import math
+import numpy
+import pytest
+from pytoon import circle, translate, rotate
+
+
+
+def eased(t):
+    # eases from 0 to 10, holds, and eases on to 20
+    if t<0.4:  return 5 * (1-math.cos(math.pi*t/0.4))
+    if t<0.6:  return 10.
+    return 10 + 5*(1-math.cos(math.pi*(t-0.6)/0.4))
+
+scenes = {
+    "eased": circle(radius=2)(transform=translate(lambda _t_: eased(_t_), 0).animated(Dt=0.02)),
+    "spun":  circle(center=(10,0), radius=2)(transform=rotate(rad=lambda _t_: math.pi*_t_**2).animated(Dt=0.02)),
+}
+
+def animations(code):
+    # the attribute name, times, values and splines (None for linear) of each animate element
+    found = {}
+    for element in re.findall(r"<animate .*?/>", code, re.S):
+        attribute = lambda name: re.search(r'\s{}="([^"]*)"'.format(name), element)
+        values = [float(v) for v in attribute("values").group(1).split(";")]
+        times = attribute("keyTimes")
+        times = numpy.linspace(0, 1, len(values)) if (times is None) else [float(t) for t in times.group(1).split(";")]
+        splines = attribute("keySplines")
+        splines = [None]*(len(values)-1) if (splines is None) else [tuple(float(c) for c in s.split()) for s in splines.group(1).split(";")]
+        found[attribute("attributeName").group(1)] = list(times), values, splines
+    return found
+
+def bezier(s, a, b):
+    return 3*(1-s)**2*s*a + 3*(1-s)*s**2*b + s**3
+
+def played(animation, t):
+    # the value at time t, interpolated linearly or along the keySpline of the segment
+    times, values, splines = animation
+    k = min(max(numpy.searchsorted(times, t, side="right")-1, 0), len(times)-2)
+    u = (t-times[k]) / (times[k+1]-times[k])
+    if splines[k] is not None:
+        x1, y1, x2, y2 = splines[k]
+        lo, hi = 0., 1.
+        for _ in range(60):    # the x of the bezier is monotonic in its parameter
+            mid = (lo+hi) / 2
+            if bezier(mid, x1, x2)<u:  lo = mid
+            else:                      hi = mid
+        u = bezier(lo, y1, y2)
+    return values[k] + u*(values[k+1]-values[k])
+
+def render(name, tolerance):
+    return scenes[name].svg(None, time=(0,1), duration=1, tolerance=tolerance, controls=False)
+
+@pytest.mark.parametrize("name", scenes)
+@pytest.mark.parametrize("tolerance", [0.05, 0.5, 2])
+def test_within_tolerance(name, tolerance, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    exact, reduced = animations(render(name, None)), animations(render(name, tolerance))
+    assert set(reduced) == set(exact)
+    for attribute in exact:
+        times, values, splines = reduced[attribute]
+        assert len(times) == len(values) == len(splines)+1    # as keyTimes and keySplines are written
+        assert len(values) <= len(exact[attribute][1])
+        for t in numpy.linspace(0, 1, 1001):
+            assert abs(played(reduced[attribute], t) - played(exact[attribute], t)) <= tolerance + 1e-3    # written to 5 digits
+
+def test_splines_are_fitted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    times, values, splines = animations(render("eased", 0.05))["cx"]
+    assert len(values) < 42
+    assert any(spline is not None for spline in splines)
+    assert values.count(10) == 2    # the hold is kept as a single linear segment
+    assert splines[values.index(10)] == (0, 0, 1, 1)
+
+@pytest.mark.parametrize("name", scenes)
+def test_zero_tolerance_changes_nothing(name, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert render(name, 0) == render(name, None)
+
+def test_runs_are_merged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    times, values, _ = animations(render("eased", None))["cx"]
+    assert len(values) == 42             # of 51, the 9 in the middle of the hold are dropped ...
+    assert times[20:22] == [0.4, 0.6]    # ... so the times must be written
+    assert "keyTimes" not in render("spun", None)    # evenly spaced
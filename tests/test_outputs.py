@@ -0,0 +1,43 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+from pytoon import circle, profiler
+
+
+
+def test_in_memory_raster_outputs_leave_no_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dot = circle(radius=3, fstyle="red")
+    assert dot.png(None).startswith(b"\x89PNG")
+    assert dot.jpg(None).startswith(b"\xff\xd8")
+    assert not os.path.exists("None_aux")
+
+def test_in_memory_animations_leave_no_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dot = circle(center=lambda _t_: (_t_,0), radius=3, fstyle="red", lstyle=False)
+    assert dot.apng(None, time=(0,1), fps=4, viewport=(-5,-5,5,5)).startswith(b"\x89PNG")
+    assert dot.gif(None, time=(0,1), fps=4, viewport=(-5,-5,5,5)).startswith(b"GIF")
+    assert not os.path.exists("None_aux")
+
+def test_animations_can_be_profiled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dot, profile = circle(center=lambda _t_: (_t_,0), radius=3, fstyle="red", lstyle=False), profiler()
+    dot.apng(None, time=(0,1), fps=4, viewport=(-5,-5,5,5), profile=profile)
+    dot.gif(None, time=(0,1), fps=4, viewport=(-5,-5,5,5), profile=profile)
+    assert [n.name for n in profile.root.children] == ["circle[{}]".format(i) for i in range(8)]    # one per frame
+    assert profile.totals()[1] == {"points":8, "keyframes":0}
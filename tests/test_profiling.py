@@ -0,0 +1,63 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from pytoon import composite, circle, polygon, rotate, profiler
+
+
+
+def scene():
+    triangle = polygon(points=[(0,0), (1,0), (0,1)])
+    inner = composite([circle(radius=1), triangle])
+    return composite([inner, triangle.T(5,0), inner.T(0,5)])
+
+def test_tree_mirrors_the_composites(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    profile = profiler()
+    scene().svg(None, profile=profile)
+    assert [n.path for n in profile.root.walk()][1:] == [
+        "composite[0]",
+        "composite[0]/composite[0]", "composite[0]/composite[0]/circle[0]", "composite[0]/composite[0]/polygon[1]",
+        "composite[0]/polygon[1]",
+        "composite[0]/composite[2]", "composite[0]/composite[2]/circle[0]", "composite[0]/composite[2]/polygon[1]",
+    ]
+    assert profile.totals()[1] == {"points": 1+3+3+1+3, "keyframes": 0}    # the center of each circle, and the corners of each triangle
+    top, = profile.root.children
+    assert top.time >= sum(n.time for n in top.children) >= 0
+    assert profile.root.time == top.time
+    assert "write" in top.stages
+
+def test_counts_of_animations(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    profile = profiler()
+    scene()(transform=rotate(rad=lambda _t_: _t_).animated(Dt=0.25)).svg(None, time=(0,1), duration=1, profile=profile)
+    counts = {n.path: n.counts for n in profile.root.walk() if n.counts}
+    assert counts["composite[0]/composite[0]/circle[0]"] == {"points": 5, "keyframes": 5}    # the center moves, the radius does not
+    assert counts["composite[0]/polygon[1]"] == {"points": 3*5, "keyframes": 5}
+
+def test_hottest_and_report(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    profile = profiler()
+    scene().svg(None, profile=profile)
+    scene().png(None, profile=profile)
+    assert [n.name for n in profile.root.children] == ["composite[0]", "composite[1]"]    # one per rendering
+    hottest = profile.hottest(top=3)
+    assert len(hottest) == 3
+    assert [n.self_time for n in hottest] == sorted((n.self_time for n in profile.root.walk() if n is not profile.root), reverse=True)[:3]
+    lines = profile.report(top=3).splitlines()
+    assert len(lines) == 4
+    assert lines[0].split()[:2] == ["self", "ms"]
+    assert [line.split()[-1] for line in lines[1:]] == [n.path for n in hottest]
@@ -0,0 +1,67 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import re
+import zlib
+import base64
+import struct
+import numpy
+from pytoon import rasterize
+
+
+
+def decoded(png):
+    # the (H,W,4) pixels of an 8-bit RGBA png without interlacing, as written by util.raster.png (filter types 0 and 2 only)
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks, k = {}, 8
+    while k<len(png):
+        length, = struct.unpack(">I", png[k:k+4])
+        chunks[png[k+4:k+8]] = chunks.get(png[k+4:k+8], b"") + png[k+8:k+8+length]
+        k += length + 12
+    width, height, depth, kind, _, _, interlace = struct.unpack(">IIBBBBB", chunks[b"IHDR"])
+    assert (depth, kind, interlace) == (8, 6, 0)
+    rows = numpy.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=numpy.uint8).reshape(height, 4*width+1)
+    pixels, previous = [], numpy.zeros(4*width, dtype=numpy.uint8)
+    for row in rows:
+        assert row[0] in (0, 2)
+        previous = row[1:] + (previous if (row[0]==2) else 0)    # wraps modulo 256
+        pixels += [previous]
+    return numpy.array(pixels).reshape(height, width, 4)
+
+def images(code):
+    return [decoded(base64.b64decode(data)) for data in re.findall(r'data:image/png;base64,([^"]*)"', code)]
+
+def test_static_field(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    field = lambda x, y: ((lambda t: ("#{:02X}{:02X}00".format(int(100*x), int(200*y)), 0.5)), None)
+    code = rasterize(field, xdim=(0,2,2), ydim=(0,1,1), bitmap=True).svg(None)
+    assert code.count("<image") == 1
+    assert "<path" not in code
+    pixels, = images(code)
+    assert pixels.shape == (2, 3, 4)    # (Ny+1) x (Nx+1)
+    for j,y in enumerate([1, 0]):    # rows from the top
+        for i,x in enumerate([0, 1, 2]):
+            assert list(pixels[j,i]) == [int(100*x), int(200*y), 0, 128]
+
+def test_animated_field(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    field = lambda x, y: ((lambda t: "#{:02X}0000".format(int(200*t))), 0.25)
+    code = rasterize(field, xdim=(0,2,2), ydim=(0,1,1), bitmap=True).svg(None, time=(0,1), duration=1)
+    frames = images(code)
+    assert len(frames) == code.count("<image") == 5    # one per keyframe
+    for t,pixels in zip([0, 0.25, 0.5, 0.75, 1], frames):
+        assert (pixels == [int(200*t), 0, 0, 255]).all()
@@ -0,0 +1,47 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import re
+import pytest
+from pytoon import path, animated, util, profiler, renderers
+
+
+
+def test_keyframes_of_different_lengths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wave = lambda _t_: [(x, 10*_t_*(x%2)) for x in range(10 + int(10*_t_))]    # more points as time goes on
+    code = path(points=animated(wave, Dt=0.25), lstyle=("black",1)).svg(None, time=(0,1), duration=1, simplify=0.5)
+    values = re.search(r'attributeName="d".*?values="([^"]*)"', code, re.S).group(1).split(";")
+    assert [len(re.findall(r"-?[0-9.]+", d))//2 for d in values] == [2, 12, 15, 17, 20]    # the first is flat
+
+def test_simplified_to_the_raster_resolution(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pixel = renderers.raster(None, dpi=150, image_format="png").resolution
+    for wiggle,kept in [(pixel/20, 2), (pixel/5, 21)]:    # simplify=True allows a tenth of a pixel
+        profile = profiler()
+        path(points=[(x, wiggle*(x%2)) for x in range(21)]).png(None, simplify=True, profile=profile)
+        assert profile.totals()[1]["points"] == kept
+    with pytest.raises(ValueError):  path(points=[(0,0), (1,1)]).svg(None, simplify=True)    # no fixed resolution
+
+def test_simplified_each_keyframe_on_its_own():
+    line, zigzag = [(x,0) for x in range(5)], [(x,x%2) for x in range(7)]
+    assert util.simplified_points([line, zigzag], 0.1) == [[(0,0), (4,0)], zigzag]
+
+def test_arcs_in_any_keyframe_are_kept():
+    arc = util.struct(curve="arc", rx=1, ry=1, skew=0)
+    frames = [[(0,0), (1,0), (2,0), (3,0), (4,0)], [(0,0), (1,0), (2,0), (3,0,arc), (4,0)]]    # the arc (and the point before it) only in the second
+    assert [len(points) for points in util.simplified_points(frames, 0.1)] == [4, 4]
@@ -0,0 +1,82 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from pytoon import composite, circle, spatial
+
+
+
+def grid_boxes():
+    # unit boxes at the even points of a 3x3 grid (positions 0-8, row by row)
+    return [(2*i, 2*j, 2*i+1, 2*j+1) for j in range(3) for i in range(3)]
+
+def test_region_and_point():
+    index = spatial.index(grid_boxes())
+    assert index.bounds == (0, 0, 5, 5)
+    assert index.region(0, 0, 5, 5) == list(range(9))
+    assert index.region(0.5, 0.5, 2.5, 2.5) == [0, 1, 3, 4]
+    assert index.region(1.2, 1.2, 1.8, 1.8) == []    # between the boxes, though in their cells
+    assert index.point(4.5, 2.5) == [5]
+    assert index.point(3, 3) == [4]                   # corners touch
+    assert index.point(1.5, 0.5) == []
+
+def test_outside_the_grid():
+    index = spatial.index(grid_boxes())
+    assert index.region(10, 10, 20, 20) == []
+    assert index.region(-5, -5, -1, 10) == []
+    assert index.point(-1, -1) == []
+    assert index.region(-10, -10, 0.5, 0.5) == [0]    # partly outside
+
+def test_unknown_and_large_boxes():
+    boxes = grid_boxes()
+    boxes[4] = None                                   # always found
+    boxes += [(-1, -1, 6, 6)]                         # covers every cell, so checked on its own
+    index = spatial.index(boxes)
+    assert index.bounds is None
+    assert index._unlisted == [4, 9]
+    assert index.region(0, 0, 0.5, 0.5) == [0, 4, 9]
+    assert index.point(1.5, 1.5) == [4, 9]
+    assert index.region(10, 10, 20, 20) == [4]
+    assert spatial.index([None, None]).region(0, 0, 1, 1) == [0, 1]
+    assert spatial.index([]).region(0, 0, 1, 1) == []
+
+def test_subindex():
+    inner = spatial.index(grid_boxes())
+    outer = spatial.index([inner.bounds, (10, 10, 11, 11)], [inner, None])
+    assert outer.point(4.5, 4.5) == [0]
+    assert outer.subindex(0).point(4.5, 4.5) == [8]
+    assert outer.subindex(1) is None
+    assert outer.point(10.5, 10.5) == [1]
+
+def scene():
+    rows = [composite([circle(center=(10*i,10*j), radius=3) for i in range(5)]) for j in range(5)]
+    return composite([*rows, circle(center=(20,20), radius=100, fstyle="none")])    # the last is large
+
+def test_composite_index():
+    index = scene().index()
+    assert index.bounds == (-82, -82, 122, 122)    # with the stroke
+    assert index.point(10, 20) == [2, 5]
+    assert index.subindex(2).point(10, 20) == [1]
+    assert index.subindex(5) is None
+
+def test_cropped_rerender(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    image, viewport = scene(), (5, 5, 25, 17)
+    first = image.svg(None, viewport=viewport)
+    assert len(image._indices) == 1                   # left by the first render, used by the second
+    assert image.svg(None, viewport=viewport) == first
+    assert scene().svg(None, viewport=viewport) == first
+    assert first.count("<circle") < scene().svg(None).count("<circle")
@@ -0,0 +1,88 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import io
+import gzip
+import pytest
+from pytoon import composite, circle, polygon, rotate
+
+
+
+def three_circles():
+    return composite([circle(radius=1), circle(radius=2, fstyle="red"), circle(radius=3, fstyle="red")])
+
+def test_compressed_output(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    compressed = three_circles().svg(None, compress=True)
+    assert gzip.decompress(compressed).decode() == three_circles().svg(None)
+    assert three_circles().svg(None, compress=True) == compressed    # no time stamp
+    assert len(three_circles().svg(None, compress=1)) >= len(compressed)
+    assert three_circles().svg("drawing", compress=True) is None
+    with open("drawing.svgz", "rb") as svgz:  assert svgz.read() == compressed
+
+def test_streamed_output(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for options in ({"time":0}, {"time":(0,1), "duration":1}):
+        spinning = three_circles()(transform=rotate(rad=lambda _t_: _t_).animated(Dt=0.25))
+        text = io.StringIO()
+        assert spinning.svg(stream=text, **options) is None
+        assert text.getvalue() == spinning.svg(None, **options)
+        binary = io.BytesIO()
+        assert spinning.svg(stream=binary, compress=True, **options) is None
+        assert gzip.decompress(binary.getvalue()).decode() == text.getvalue()
+
+def test_compression_level():
+    for compress in (10, -1, 1.5, "yes"):
+        with pytest.raises(ValueError):  three_circles().svg(None, compress=compress)
+
+def test_style_used_once_is_inline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    code = circle(radius=1).svg(None)
+    assert "<style>" not in code
+    assert '<circle stroke="#000000" stroke-width="1" fill="none" r="1" cx="0" cy="0"/>' in code
+
+def test_shared_styles_become_classes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    image = composite([
+        circle(center=(0,0), radius=1, fstyle="red"),
+        polygon(points=[(0,0),(1,0),(0,1)], lstyle=("blue",1)),
+        circle(center=(1,0), radius=1),
+        circle(center=(2,0), radius=1, fstyle="red"),
+        circle(center=(3,0), radius=1, fstyle="red"),
+    ])
+    code = image.svg(None)
+    assert ".s0{stroke:#000000;stroke-width:1;fill:#FF0000}" in code
+    assert ".s1" not in code
+    assert code.count('class="s0"') == 3    # including the first one, held back until its style was shared
+    assert code.count('<path stroke="#0000FF" stroke-width="1" fill="none" d=') == 1
+    assert code.count('<circle stroke="#000000" stroke-width="1" fill="none"') == 1
+    assert "pytoon held shape" not in code
+    assert code.index('cx="0"') < code.index("<path") < code.index('cx="1"') < code.index('cx="2"')    # in drawing order
+
+def test_animated_styles(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    image = composite([
+        circle(center=(1,0), radius=1, fstyle="red"),
+        circle(center=(5,0), radius=1, fstyle="red"),
+        circle(center=(9,0), radius=1),
+    ])(transform=rotate(rad=lambda _t_: _t_).animated(Dt=0.25))
+    code = image.svg(None, time=(0,1), duration=1)
+    assert ".s0{stroke:#000000;stroke-width:1;fill:#FF0000}" in code
+    assert ".s1" not in code
+    assert code.count('class="s0"') == 2
+    assert code.count('stroke="#000000" stroke-width="1" fill="none"') == 1
+    assert code.count('attributeName="cx"') == 3
@@ -0,0 +1,34 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from pytoon import util, translate, rotate, scale, stretch, polygon
+from pytoon.line_art import _sampled_transform
+
+
+
+points = [(0,0), (1,2), (-3,0.5)]
+
+def test_map_points_matches_the_mapping():
+    for chain in (translate(1,2).nest(rotate(30)).nest(scale(2)), stretch(2).nest(translate(1,0))):
+        sampled = _sampled_transform(chain.resolve(util.echo, util.echo), lambda t: (0,0))
+        absolute, _, _ = sampled.mappings(None)
+        assert sampled.map_points(points, None) == [absolute(point) for point in points]
+
+def test_static_points_are_mapped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    code, _ = polygon(points=[(0,0), (1,0), (0,1)]).T(10,0).S(2).svg_raw()
+    assert "M 20 0 L 22 0 L 20 -2" in code    # scaled about the origin after translating
@@ -0,0 +1,73 @@
+#  (C) Copyright 2020 Anthony D. Dutoi
+#
+#  This file is part of PyToon.
+#
+#  PyToon is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from pytoon import circle, util
+
+
+
+def test_shared_plans_stay_bounded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    molecule = circle(radius="r")
+    for i in range(100):
+        assert 'r="{}"'.format(i+1) in molecule(r=i+1).svg_raw(time=0)[0]    # the copies share the plan of the template
+    assert len(molecule._plan._compiled) <= util.substitution_plan._cached
+
+def test_plans_are_reused():
+    plan = util.substitution_plan(("x", "y"), fixed=True)
+    varval = util.variable_evaluator({"x":1, "y":2})
+    assert plan(varval) == plan(varval) == (1, 2)
+    assert len(plan._compiled) == 1
+
+def picky(a=None, b=None):
+    # takes a or b, but only if non-negative
+    if (a is not None) and (a<0):  raise ValueError
+    if (b is not None) and (b<0):  raise ValueError
+    return "a" if (b is None) else "b"
+
+class offset(object):
+    def __call__(self, x):
+        return x+0.5
+
+def test_plans_match_the_evaluator():
+    objects = [
+        "x",
+        lambda x: 2*x,
+        lambda z: z,
+        picky,
+        offset(),
+        util.struct(a="x", b=(1, "y", [lambda y: -y, "z"])),
+        {"p": "y", "q": util.struct(r=lambda x: x)},
+        ((("x",), "y"), (lambda _t_: _t_, 3.5)),
+    ]
+    dictionaries = [({"x":1, "y":2, "a":1, "b":-1}, {"z":"x"}), ({"x":3, "y":"x", "a":2, "b":-2}, {"z":4}), ({"x":5, "y":6, "a":1, "b":1}, {"z":"y"})]
+    varvals  = [util.variable_evaluator(outer) for outer,_ in dictionaries]
+    varvals += [util.variable_evaluator(outer, inner=util.variable_evaluator(inner)) for outer,inner in dictionaries]
+    for obj in objects:
+        plan = util.substitution_plan(obj)
+        for varval in varvals:
+            expected, planned = varval(obj), plan(varval)
+            if callable(expected) and not isinstance(expected, util.struct):
+                assert planned is expected
+            else:
+                assert repr(planned) == repr(expected)
+        assert len(plan._compiled) == 2    # one per shape of chain
+
+def test_other_keys_are_rechecked():
+    plan = util.substitution_plan(picky)
+    assert plan(util.variable_evaluator({"a":1, "b":-1})) == "a"
+    assert plan(util.variable_evaluator({"a":1, "b":1}))  is picky    # both match, so neither is taken
+    assert plan(util.variable_evaluator({"a":-1, "b":1})) == "b"